@@ -1,18 +1,41 @@
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI, Depends, HTTPException, Header
 from fastapi.middleware.cors import CORSMiddleware
-from database import engine, Base
+from database import engine, async_engine, pool_metrics, async_pool_metrics, get_async_db
+from models import StressForecast
 from auth_simple import router as auth_router, get_current_user
 from users import router as users_router
 from mood import router as mood_router
 from fitbit import router as fitbit_router
 from pydantic import BaseModel
+from typing import Dict, List
+from functools import partial
+from contextlib import asynccontextmanager
+from inference import inference_pool, db_write_pool, password_pool, PoolSaturatedError
+from batching import MicroBatcher, MICRO_BATCH_ENABLED
+from prediction_log import prediction_log_writer, prediction_records
+from fitbit_client import close_http_client
+from fitbit_sync import fitbit_sync_service, FITBIT_SYNC_ENABLED
+from fitbit_backfill import fitbit_backfill_service
+from session_store import session_sweeper, SESSION_SWEEP_ENABLED
+from migrations import check_schema_version
+from forecasting import forecast_service, FORECAST_ENABLED, HIGH_STRESS_THRESHOLD
+from feature_store import feature_store, feature_store_refresher, FEATURE_STORE_ENABLED
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import date
+import asyncio
+import secrets
 import os
 
-# Import the ML model
+# Import the ML model (the artifact itself is loaded lazily on first prediction)
 try:
-    from stress_model import predict_stress
-    ML_MODEL_AVAILABLE = True
-    print("✅ ML stress model loaded successfully")
+    from stress_model import predict_stress, predict_stress_batch, cached_stress_prediction, remember_results, registry as model_registry
+    from prediction_cache import prediction_cache, lookup_tables
+    ML_MODEL_AVAILABLE = model_registry.is_available()
+    if ML_MODEL_AVAILABLE:
+        print(f"✅ ML stress model found at {model_registry.path}")
+    else:
+        print(f"❌ ML model not available: {model_registry.path} not found")
 except ImportError as e:
     print(f"❌ ML model not available: {e}")
     ML_MODEL_AVAILABLE = False
@@ -20,10 +43,26 @@ except Exception as e:
     print(f"❌ Error loading ML model: {e}")
     ML_MODEL_AVAILABLE = False
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+# Shared secret for model admin endpoints; they are disabled when unset
+MODEL_ADMIN_TOKEN = os.getenv("MODEL_ADMIN_TOKEN")
+
+# Coalesces concurrent single predictions into one vectorized model call
+stress_batcher = (
+    MicroBatcher(partial(predict_stress_batch, include_probabilities=True)) if ML_MODEL_AVAILABLE else None
+)
+
+# Schema changes are applied by `python -m migrations`; startup only checks the recorded version
+SCHEMA_VERSION_CHECK = os.getenv("SCHEMA_VERSION_CHECK", "true").lower() in ("1", "true", "yes")
 
-app = FastAPI(title="CalmCast API", description="Stress Forecasting App", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await start_background_workers()
+    try:
+        yield
+    finally:
+        await shutdown_worker_pools()
+
+app = FastAPI(title="CalmCast API", description="Stress Forecasting App", version="1.0.0", lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -50,6 +89,38 @@ class StressPredictionResponse(BaseModel):
     prediction: str
     confidence: float = None
     method: str
+    probabilities: Dict[str, float] = None
+
+class StressBatchPredictionRequest(BaseModel):
+    rows: List[StressPredictionRequest]
+
+class StressBatchPredictionResponse(BaseModel):
+    status: str
+    results: List[StressPredictionResponse]
+
+# Upper bound on rows scored by a single batch request
+STRESS_BATCH_MAX_ROWS = int(os.getenv("STRESS_BATCH_MAX_ROWS", "5000"))
+
+def heuristic_stress_prediction(data: StressPredictionRequest) -> StressPredictionResponse:
+    """Rule-based fallback used when the ML model is unavailable"""
+    stress_score = (data.heart_rate - 60) / 20 + (8 - data.sleep_hours) + (10000 - data.steps) / 5000
+    prediction = "High" if stress_score > 2 else "Low"
+    confidence = min(abs(stress_score - 2) / 3, 0.95)  # Simple confidence based on distance from threshold
+    
+    return StressPredictionResponse(
+        status="success",
+        prediction=prediction,
+        confidence=round(confidence, 2),
+        method="heuristic"
+    )
+
+def inference_unavailable(e: PoolSaturatedError) -> HTTPException:
+    print(f"⚠️ {e}")
+    return HTTPException(
+        status_code=503,
+        detail="Prediction service is busy, please retry shortly",
+        headers={"Retry-After": "1"}
+    )
 
 @app.post("/api/stress/predict", response_model=StressPredictionResponse)
 async def predict_stress_level(
@@ -63,71 +134,215 @@ async def predict_stress_level(
     # Try ML model first
     if ML_MODEL_AVAILABLE:
         try:
-            ml_result = predict_stress({
+            features = {
                 "heart_rate": data.heart_rate,
                 "sleep_hours": data.sleep_hours,
                 "steps": data.steps
-            })
+            }
+            # Repeated inputs are answered on the loop without touching the pools
+            ml_result = cached_stress_prediction(features, include_probabilities=True)
+            if ml_result is None:
+                if MICRO_BATCH_ENABLED:
+                    ml_result = await stress_batcher.submit(features)
+                else:
+                    ml_result = await inference_pool.run(partial(predict_stress, include_probabilities=True), features)
+                if inference_pool.kind == "process":
+                    # Scored in a worker process; keep the answer in this process's cache too
+                    remember_results([features], [ml_result])
             
             if ml_result["status"] == "success":
-                # Log the prediction to database
-                from database import SessionLocal
-                from models import StressPrediction
-                from datetime import datetime
-                
-                db = SessionLocal()
-                try:
-                    stress_pred = StressPrediction(
-                        user_id=current_user.id,
-                        prediction=ml_result["prediction"],
-                        confidence=ml_result.get("confidence", 0.8),
-                        heart_rate=data.heart_rate,
-                        sleep_hours=data.sleep_hours,
-                        steps=data.steps,
-                        created_at=datetime.now()
-                    )
-                    db.add(stress_pred)
-                    db.commit()
-                except Exception as e:
-                    print(f"❌ Failed to log prediction: {e}")
-                    db.rollback()
-                finally:
-                    db.close()
+                # Queue the prediction for the write-behind audit log
+                await prediction_log_writer.submit(prediction_records(current_user.id, [data], [ml_result]))
                 
                 return StressPredictionResponse(
                     status="success",
                     prediction=ml_result["prediction"],
                     confidence=ml_result.get("confidence"),
-                    method="ml_model"
+                    method="ml_model",
+                    probabilities=ml_result.get("probabilities")
                 )
             else:
                 print(f"❌ ML model prediction failed: {ml_result.get('message')}")
                 # Fall through to heuristic
+        except PoolSaturatedError as e:
+            raise inference_unavailable(e)
         except Exception as e:
             print(f"❌ ML model error: {e}")
             # Fall through to heuristic
     
     # Fallback to heuristic method
     print("🔄 Using heuristic fallback for stress prediction")
-    stress_score = (data.heart_rate - 60) / 20 + (8 - data.sleep_hours) + (10000 - data.steps) / 5000
-    prediction = "High" if stress_score > 2 else "Low"
-    confidence = min(abs(stress_score - 2) / 3, 0.95)  # Simple confidence based on distance from threshold
+    return heuristic_stress_prediction(data)
+
+@app.post("/api/stress/predict/batch", response_model=StressBatchPredictionResponse)
+async def predict_stress_level_batch(
+    data: StressBatchPredictionRequest,
+    current_user = Depends(get_current_user)
+):
+    """
+    Predict stress levels for many rows at once (e.g. backfilling history).
+    All rows are scored with one model call and logged with one bulk insert;
+    results are returned in input order.
+    """
+    if len(data.rows) > STRESS_BATCH_MAX_ROWS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch too large: {len(data.rows)} rows (max {STRESS_BATCH_MAX_ROWS})"
+        )
     
-    return StressPredictionResponse(
+    if not data.rows:
+        return StressBatchPredictionResponse(status="success", results=[])
+    
+    ml_results = None
+    if ML_MODEL_AVAILABLE:
+        try:
+            rows = [
+                {"heart_rate": row.heart_rate, "sleep_hours": row.sleep_hours, "steps": row.steps}
+                for row in data.rows
+            ]
+            ml_results = await inference_pool.run(partial(predict_stress_batch, include_probabilities=True), rows)
+            if inference_pool.kind == "process":
+                remember_results(rows, ml_results)
+            if any(result["status"] != "success" for result in ml_results):
+                print(f"❌ ML batch prediction failed: {ml_results[0].get('message')}")
+                ml_results = None
+        except PoolSaturatedError as e:
+            raise inference_unavailable(e)
+        except Exception as e:
+            print(f"❌ ML model error: {e}")
+            ml_results = None
+    
+    if ml_results is None:
+        print("🔄 Using heuristic fallback for batch stress prediction")
+        return StressBatchPredictionResponse(
+            status="success",
+            results=[heuristic_stress_prediction(row) for row in data.rows]
+        )
+    
+    # Queue every prediction for the write-behind audit log (flushed in bulk)
+    await prediction_log_writer.submit(prediction_records(current_user.id, data.rows, ml_results))
+    
+    return StressBatchPredictionResponse(
         status="success",
-        prediction=prediction,
-        confidence=round(confidence, 2),
-        method="heuristic"
+        results=[
+            StressPredictionResponse(
+                status="success",
+                prediction=result["prediction"],
+                confidence=result.get("confidence"),
+                method="ml_model",
+                probabilities=result.get("probabilities")
+            )
+            for result in ml_results
+        ]
     )
 
+@app.get("/api/stress/forecast")
+async def get_stress_forecast(
+    current_user = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Stress probability for the coming days. Forecasts are precomputed for all
+    users by forecast_service; this only reads the stored rows.
+    """
+    forecasts = (await db.scalars(
+        select(StressForecast)
+        .where(StressForecast.user_id == current_user.id, StressForecast.forecast_date >= date.today())
+        .order_by(StressForecast.forecast_date)
+    )).all()
+    
+    if not forecasts:
+        return {"status": "pending", "generated_at": None, "method": None, "days": []}
+    
+    return {
+        "status": "success",
+        "generated_at": forecasts[0].generated_at.isoformat(),
+        "method": forecasts[0].method,
+        "days": [
+            {
+                "date": forecast.forecast_date.isoformat(),
+                "horizon_days": forecast.horizon_days,
+                "stress_probability": forecast.stress_probability,
+                "prediction": "High" if forecast.stress_probability >= HIGH_STRESS_THRESHOLD else "Low"
+            }
+            for forecast in forecasts
+        ]
+    }
+
 @app.get("/api/stress/model-status")
 async def get_model_status():
     """Check if ML model is available"""
     return {
         "ml_model_available": ML_MODEL_AVAILABLE,
-        "method": "ml_model" if ML_MODEL_AVAILABLE else "heuristic"
+        "method": "ml_model" if ML_MODEL_AVAILABLE else "heuristic",
+        "model": model_registry.status() if ML_MODEL_AVAILABLE else None,
+        "inference_pool": inference_pool.stats(),
+        "db_write_pool": db_write_pool.stats(),
+        "prediction_log": prediction_log_writer.stats(),
+        "micro_batcher": stress_batcher.metrics() if stress_batcher else None,
+        "prediction_cache": prediction_cache.stats() if ML_MODEL_AVAILABLE else None,
+        "lookup_table": lookup_tables.stats() if ML_MODEL_AVAILABLE else None
     }
 
+@app.post("/api/stress/model/reload")
+async def reload_stress_model(x_admin_token: str = Header(None)):
+    """
+    Load the model artifact again and swap it in without dropping in-flight
+    predictions. With INFERENCE_EXECUTOR=process, worker processes pick up new
+    artifacts through their own file watcher (STRESS_MODEL_WATCH_INTERVAL).
+    """
+    if not MODEL_ADMIN_TOKEN or not secrets.compare_digest(x_admin_token or "", MODEL_ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Model admin access denied")
+    if not ML_MODEL_AVAILABLE:
+        raise HTTPException(status_code=404, detail="No ML model configured")
+    
+    try:
+        loaded = await asyncio.to_thread(model_registry.reload, True)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Model reload failed: {str(e)}")
+    
+    return {"status": "success", "version": loaded.version, "loaded_at": loaded.loaded_at.isoformat()}
+
+async def start_background_workers():
+    if SCHEMA_VERSION_CHECK:
+        # Raises SchemaVersionError, failing startup, when migrations are pending
+        version = await asyncio.to_thread(check_schema_version, engine)
+        print(f"✅ Database schema at version {version}")
+    prediction_log_writer.start()
+    if ML_MODEL_AVAILABLE and inference_pool.kind == "process":
+        # Workers load their own copies; this one serves the cache fast path and model status
+        await asyncio.to_thread(model_registry.get)
+    if SESSION_SWEEP_ENABLED:
+        session_sweeper.start()
+    if FITBIT_SYNC_ENABLED:
+        fitbit_sync_service.start()
+    if FORECAST_ENABLED:
+        forecast_service.start()
+    if FEATURE_STORE_ENABLED:
+        feature_store_refresher.start()
+    try:
+        await fitbit_backfill_service.resume_unfinished()
+    except Exception as e:
+        print(f"❌ Could not resume Fitbit backfills: {e}")
+
+async def shutdown_worker_pools():
+    if stress_batcher:
+        await stress_batcher.stop()
+    await fitbit_sync_service.stop()
+    await fitbit_backfill_service.stop()
+    await forecast_service.stop()
+    await feature_store_refresher.stop()
+    await asyncio.to_thread(session_sweeper.stop)
+    # Flush buffered prediction rows before the pools go away
+    await asyncio.to_thread(prediction_log_writer.stop)
+    await close_http_client()
+    inference_pool.shutdown()
+    db_write_pool.shutdown()
+    password_pool.shutdown()
+    await async_engine.dispose()
+    if ML_MODEL_AVAILABLE:
+        model_registry.stop_watcher()
+
 @app.get("/")
 async def read_root():
     return {"message": "CalmCast API is running!"}
@@ -136,6 +351,20 @@ async def read_root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/api/metrics")
+async def get_metrics():
+    """Database connection pool and worker pool telemetry"""
+    return {
+        "db_pool": pool_metrics.stats(),
+        "async_db_pool": async_pool_metrics.stats(),
+        "inference_pool": inference_pool.stats(),
+        "db_write_pool": db_write_pool.stats(),
+        "password_pool": password_pool.stats(),
+        "sessions": session_sweeper.stats(),
+        "forecasts": forecast_service.stats(),
+        "feature_store": feature_store.stats(),
+    }
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -1,34 +1,161 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
-from database import get_db
-from models import User, UserSession
-import secrets
-import uuid
+from passlib.context import CryptContext
+from database import get_async_db
+from models import User
+from jwt_keys import JWTKeyRing
+from session_store import session_store
+from inference import password_pool, PoolSaturatedError
 import hashlib
+import hmac
+import secrets
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
 
-# Security
-SECRET_KEY = secrets.token_urlsafe(32)
+# Security: signing keys come from JWT_SIGNING_KEYS / JWT_SECRET_KEY so every worker shares them
+key_ring = JWTKeyRing.from_env()
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# bcrypt cost factor; every +1 doubles the CPU time of a hash or login
+PASSWORD_BCRYPT_ROUNDS = int(os.getenv("PASSWORD_BCRYPT_ROUNDS", "12"))
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=PASSWORD_BCRYPT_ROUNDS)
+# Hashes written before bcrypt: bare unsalted SHA-256 hex digests
+LEGACY_SHA256_HASH = re.compile(r"^[0-9a-f]{64}$")
+
+# Resolved users are cached per token subject so authenticated requests skip the users lookup
+AUTH_PRINCIPAL_CACHE_TTL = float(os.getenv("AUTH_PRINCIPAL_CACHE_TTL", "60"))
+AUTH_PRINCIPAL_CACHE_SIZE = int(os.getenv("AUTH_PRINCIPAL_CACHE_SIZE", "10000"))
+
 router = APIRouter()
 
-# Simple password hashing without bcrypt
+class PrincipalCache:
+    """users rows keyed by JWT subject (username), with LRU eviction and a TTL"""
+
+    def __init__(self, ttl: float = AUTH_PRINCIPAL_CACHE_TTL, max_size: int = AUTH_PRINCIPAL_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, subject: str):
+        with self._lock:
+            entry = self._entries.get(subject)
+            if entry is None or entry[1] < time.monotonic():
+                self._entries.pop(subject, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(subject)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, subject: str, user: User):
+        # Invalidation is per-process, so another worker may have changed the
+        # password; password checks read the hash from the database instead
+        columns = {
+            column.key: getattr(user, column.key)
+            for column in User.__table__.columns
+            if column.key != "password_hash"
+        }
+        with self._lock:
+            self._entries[subject] = (columns, time.monotonic() + self.ttl)
+            self._entries.move_to_end(subject)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *subjects: str):
+        with self._lock:
+            for subject in subjects:
+                if self._entries.pop(subject, None) is not None:
+                    self.invalidations += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0,
+            "invalidations": self.invalidations,
+        }
+
+principal_cache = PrincipalCache()
+
+async def attach_cached_user(db: AsyncSession, columns: dict) -> User:
+    """Rebuild a cached user as a persistent object of this request's session, without a SELECT"""
+    user = User(**columns)
+    make_transient_to_detached(user)
+    return await db.merge(user, load=False)
+
+# Password hashing. These are CPU-heavy and blocking; request handlers use the
+# async hash_password / check_password, which run them on password_pool.
 def get_password_hash(password: str) -> str:
-    return hashlib.sha256(password.encode()).hexdigest()
+    return pwd_context.hash(password)
+
+def verify_and_update_password(plain_password: str, hashed_password: str):
+    """(matches, new_hash); new_hash is set when the stored hash should be upgraded"""
+    if LEGACY_SHA256_HASH.match(hashed_password):
+        legacy = hashlib.sha256(plain_password.encode()).hexdigest()
+        if not hmac.compare_digest(legacy, hashed_password):
+            return False, None
+        return True, pwd_context.hash(plain_password)
+    try:
+        return pwd_context.verify_and_update(plain_password, hashed_password)
+    except ValueError:
+        return False, None
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return get_password_hash(plain_password) == hashed_password
+    return verify_and_update_password(plain_password, hashed_password)[0]
+
+def password_pool_busy(e: PoolSaturatedError) -> HTTPException:
+    return HTTPException(status_code=503, detail=f"Server busy, please retry: {e}", headers={"Retry-After": "1"})
 
-def authenticate_user(db: Session, username: str, password: str):
-    user = db.query(User).filter(User.username == username).first()
-    if not user or not verify_password(password, user.password_hash):
+async def hash_password(password: str) -> str:
+    try:
+        return await password_pool.run(get_password_hash, password)
+    except PoolSaturatedError as e:
+        raise password_pool_busy(e)
+
+async def check_password(plain_password: str, hashed_password: str):
+    try:
+        return await password_pool.run(verify_and_update_password, plain_password, hashed_password)
+    except PoolSaturatedError as e:
+        raise password_pool_busy(e)
+
+_dummy_hash = None
+
+async def authenticate_user(db: AsyncSession, username: str, password: str):
+    global _dummy_hash
+    user = await db.scalar(select(User).where(User.username == username))
+    if not user:
+        # Spend the same time as a real check so response times don't reveal usernames
+        if _dummy_hash is None:
+            _dummy_hash = await hash_password(secrets.token_urlsafe(16))
+        await check_password(password, _dummy_hash)
+        return False
+    
+    matches, new_hash = await check_password(password, user.password_hash)
+    if not matches:
         return False
+    if new_hash:
+        # Transparent upgrade of SHA-256 (or lower-cost) hashes on successful login
+        user.password_hash = new_hash
+        await db.commit()
+        principal_cache.invalidate(user.username)
     return user
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
@@ -38,38 +165,30 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    kid, secret = key_ring.signing_key()
+    encoded_jwt = jwt.encode(to_encode, secret, algorithm=ALGORITHM, headers={"kid": kid})
     return encoded_jwt
 
 @router.post("/token")
 async def login_for_access_token(
     username: str,
     password: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    user = authenticate_user(db, username, password)
+    user = await authenticate_user(db, username, password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
         )
     
+    # Create session; the access token carries its id so logout revokes the token too
+    session_token, expires_at = await db.run_sync(lambda session: session_store.create(user.id, db=session))
+    
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
-    )
-    
-    # Create session
-    session_token = str(uuid.uuid4())
-    expires_at = datetime.utcnow() + timedelta(days=7)
-    
-    user_session = UserSession(
-        user_id=user.id,
-        session_token=session_token,
-        expires_at=expires_at
+        data={"sub": user.username, "sid": session_token}, expires_delta=access_token_expires
     )
-    db.add(user_session)
-    db.commit()
     
     return {
         "access_token": access_token,
@@ -84,23 +203,47 @@ async def login_for_access_token(
         }
     }
 
+@router.post("/logout")
+async def logout(session_token: str, db: AsyncSession = Depends(get_async_db)):
+    await db.run_sync(lambda session: session_store.revoke(session_token, db=session))
+    return {"message": "Logged out"}
+
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
+    # FastAPI caches dependencies per request, so this is the same session the
+    # handler gets from Depends(get_async_db) and the returned user stays attached to it
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, key_ring.key_for(token), algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
     
-    user = db.query(User).filter(User.username == username).first()
-    if user is None:
+    # Tokens issued at login name their session, which must still be live (not logged out or expired)
+    session_token = payload.get("sid")
+    session_user_id = None
+    if session_token is not None:
+        session_user_id = await db.run_sync(lambda session: session_store.get_user_id(session_token, db=session))
+        if session_user_id is None:
+            raise credentials_exception
+    
+    if AUTH_PRINCIPAL_CACHE_TTL > 0:
+        columns = principal_cache.get(username)
+        if columns is not None:
+            if session_user_id is not None and columns["id"] != session_user_id:
+                raise credentials_exception
+            return await attach_cached_user(db, columns)
+    
+    user = await db.scalar(select(User).where(User.username == username))
+    if user is None or (session_user_id is not None and user.id != session_user_id):
         raise credentials_exception
+    if AUTH_PRINCIPAL_CACHE_TTL > 0:
+        principal_cache.put(username, user)
     return user
\ No newline at end of file
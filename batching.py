@@ -0,0 +1,170 @@
+"""
+Micro-batching scheduler for single-row stress predictions.
+
+Concurrent /api/stress/predict calls usually arrive within a few milliseconds
+of each other. Instead of paying sklearn's per-call overhead for every row,
+MicroBatcher collects rows for up to max_wait_ms (or until max_batch_size rows
+are waiting), scores them with one vectorized call on the inference pool and
+hands each waiting coroutine its own result.
+"""
+import asyncio
+import os
+import time
+
+from inference import inference_pool, PoolSaturatedError, INFERENCE_WORKERS
+
+MICRO_BATCH_ENABLED = os.getenv("MICRO_BATCH_ENABLED", "true").lower() in ("1", "true", "yes")
+MICRO_BATCH_MAX_WAIT_MS = float(os.getenv("MICRO_BATCH_MAX_WAIT_MS", "2"))
+MICRO_BATCH_MAX_SIZE = int(os.getenv("MICRO_BATCH_MAX_SIZE", "64"))
+MICRO_BATCH_MAX_QUEUE = int(os.getenv("MICRO_BATCH_MAX_QUEUE", "1024"))
+MICRO_BATCH_MAX_CONCURRENT = int(os.getenv("MICRO_BATCH_MAX_CONCURRENT", str(INFERENCE_WORKERS)))
+# Print one line per dispatched batch (size, wait, inference time)
+MICRO_BATCH_LOG_METRICS = os.getenv("MICRO_BATCH_LOG_METRICS", "false").lower() in ("1", "true", "yes")
+
+
+class MicroBatcher:
+    def __init__(
+        self,
+        predict_batch_fn,
+        max_batch_size: int = MICRO_BATCH_MAX_SIZE,
+        max_wait_ms: float = MICRO_BATCH_MAX_WAIT_MS,
+        max_queue: int = MICRO_BATCH_MAX_QUEUE,
+        max_concurrent_batches: int = MICRO_BATCH_MAX_CONCURRENT,
+        executor=inference_pool,
+        log_metrics: bool = MICRO_BATCH_LOG_METRICS,
+    ):
+        self.predict_batch_fn = predict_batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.max_queue = max_queue
+        self.max_concurrent_batches = max_concurrent_batches
+        self.executor = executor
+        self.log_metrics = log_metrics
+
+        self._loop = None
+        self._queue = None
+        self._worker = None
+        self._batch_slots = None
+        self._inflight = set()
+
+        self.batches = 0
+        self.rows = 0
+        self.max_observed_batch = 0
+        self.total_wait_ms = 0.0
+        self.total_inference_ms = 0.0
+        self.rejected = 0
+
+    def _ensure_started(self):
+        # Bound to the loop that submits work (the uvicorn loop in production);
+        # restarted if a new loop shows up, e.g. per-request loops in TestClient
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._batch_slots = asyncio.Semaphore(self.max_concurrent_batches)
+            self._inflight = set()
+            self._worker = loop.create_task(self._run())
+
+    async def submit(self, row: dict):
+        """Queue one row and wait for its prediction result"""
+        self._ensure_started()
+        if self._queue.qsize() >= self.max_queue:
+            self.rejected += 1
+            raise PoolSaturatedError(
+                f"micro-batch queue full ({self._queue.qsize()}/{self.max_queue})"
+            )
+
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((row, future, time.perf_counter()))
+        return await future
+
+    async def _run(self):
+        while True:
+            first = await self._queue.get()
+            batch = [first]
+            deadline = time.perf_counter() + self.max_wait_ms / 1000
+
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            await self._batch_slots.acquire()
+            task = asyncio.get_running_loop().create_task(self._dispatch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, batch):
+        try:
+            dispatched_at = time.perf_counter()
+            rows = [row for row, _, _ in batch]
+            try:
+                results = await self.executor.run(self.predict_batch_fn, rows)
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+            finished_at = time.perf_counter()
+            for (_, future, _), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+            wait_ms = sum(dispatched_at - queued_at for _, _, queued_at in batch) * 1000
+            inference_ms = (finished_at - dispatched_at) * 1000
+            self.batches += 1
+            self.rows += len(batch)
+            self.max_observed_batch = max(self.max_observed_batch, len(batch))
+            self.total_wait_ms += wait_ms
+            self.total_inference_ms += inference_ms
+
+            if self.log_metrics:
+                print(
+                    f"📦 Micro-batch: {len(batch)} rows, "
+                    f"avg wait {wait_ms / len(batch):.2f} ms, inference {inference_ms:.2f} ms"
+                )
+        finally:
+            self._batch_slots.release()
+
+    def metrics(self) -> dict:
+        return {
+            "enabled": MICRO_BATCH_ENABLED,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self.batches,
+            "rows": self.rows,
+            "avg_batch_size": round(self.rows / self.batches, 2) if self.batches else 0,
+            "max_observed_batch": self.max_observed_batch,
+            "avg_wait_ms": round(self.total_wait_ms / self.rows, 3) if self.rows else 0,
+            "avg_inference_ms": round(self.total_inference_ms / self.batches, 3) if self.batches else 0,
+            "rejected": self.rejected,
+        }
+
+    async def stop(self):
+        """Cancel the collector and fail anything still waiting"""
+        if self._loop is not asyncio.get_running_loop():
+            # Never started on this loop; nothing here can be awaited
+            self._worker = None
+            return
+
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+
+        while self._queue is not None and not self._queue.empty():
+            _, future, _ = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Micro-batcher stopped"))
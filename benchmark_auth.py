@@ -0,0 +1,72 @@
+"""
+Throughput benchmark for access token validation.
+
+Measures raw JWT signature checks through the key ring and the full
+get_current_user dependency (with and without the principal cache) against an
+in-memory SQLite users table.
+
+Usage: python benchmark_auth.py [iterations]
+"""
+import asyncio
+import sys
+import time
+
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import auth_simple
+from database import Base
+from models import User
+
+
+def throughput(label, fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<44} {iterations / elapsed:>10,.0f} validations/s   {elapsed / iterations * 1e6:8.1f} µs each")
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+    loop = asyncio.new_event_loop()
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    session_factory = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+    async def setup():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with session_factory() as db:
+            db.add(User(name="Bench", username="bench", email="bench@example.com", password_hash="x"))
+            await db.commit()
+
+    loop.run_until_complete(setup())
+
+    token = auth_simple.create_access_token({"sub": "bench"})
+    kid, _ = auth_simple.key_ring.signing_key()
+    print(f"🔑 HS256 tokens signed with kid {kid!r}, {len(auth_simple.key_ring.keys)} key(s) configured\n")
+
+    throughput("jwt.decode via key ring", lambda: auth_simple.jwt.decode(
+        token, auth_simple.key_ring.key_for(token), algorithms=[auth_simple.ALGORITHM]
+    ), iterations)
+
+    async def resolve_once():
+        async with session_factory() as session:
+            await auth_simple.get_current_user(token=token, db=session)
+
+    def resolve():
+        loop.run_until_complete(resolve_once())
+
+    ttl = auth_simple.AUTH_PRINCIPAL_CACHE_TTL
+    auth_simple.AUTH_PRINCIPAL_CACHE_TTL = 0
+    throughput("get_current_user, principal cache off", resolve, iterations)
+    auth_simple.AUTH_PRINCIPAL_CACHE_TTL = ttl or 60
+    throughput("get_current_user, principal cache on", resolve, iterations)
+    auth_simple.AUTH_PRINCIPAL_CACHE_TTL = ttl
+    loop.run_until_complete(engine.dispose())
+    loop.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Latency benchmark for the stress model inference engines.
+
+Usage: python benchmark_inference.py [iterations]
+"""
+import sys
+import time
+import warnings
+
+import joblib
+import numpy as np
+import pandas as pd
+
+import stress_model
+from compiled_forest import CompiledForest
+
+warnings.filterwarnings("ignore", message="X does not have valid feature names")
+
+
+def time_calls(fn, iterations):
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return np.array(timings)
+
+
+def legacy_predict_stress(model, data):
+    """predict_stress as it was before the single-pass rework: predict, then predict_proba"""
+    features = np.array([data["heart_rate"], data["sleep_hours"], data["steps"]]).reshape(1, -1)
+    prediction = model.predict(features)
+    stress_level = "High" if prediction[0] == 1 else "Low"
+    probabilities = model.predict_proba(features)[0]
+    return {"status": "success", "prediction": stress_level, "confidence": round(max(probabilities), 2)}
+
+
+def report(label, timings, rows=1):
+    p50, p99 = np.percentile(timings, [50, 99])
+    print(f"{label:<38} p50 {p50:8.3f} ms   p99 {p99:8.3f} ms   {rows / (p50 / 1000):>12,.0f} rows/s")
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+
+    model = joblib.load("stress_model.pkl")
+    compiled = CompiledForest.from_sklearn(model)
+    X = pd.read_csv("fitbit_data.csv")[["heart_rate", "sleep_hours", "steps"]].to_numpy(dtype=float)
+    row = X[:1]
+
+    print(f"🌲 {compiled.n_trees} trees, max depth {compiled.max_depth}, "
+          f"{len(compiled.feature)} nodes, {compiled.nbytes / 1024:.0f} KB compiled\n")
+
+    sample = {"heart_rate": 90, "sleep_hours": 5.5, "steps": 4000}
+    sample_features = np.array([[sample["heart_rate"], sample["sleep_hours"], sample["steps"]]], dtype=float)
+    loaded = stress_model.registry.get()
+    print(f"predict_stress (shipped model, {stress_model.registry.engine} engine)")
+    report("  before: predict + predict_proba", time_calls(lambda: legacy_predict_stress(loaded.model, sample), iterations))
+    # Scored through the model every call; the prediction cache would answer repeats
+    report("  after: single predict_proba pass",
+           time_calls(lambda: stress_model.score_features(sample_features, loaded)[0].to_dict(), iterations))
+    if stress_model.PREDICTION_CACHE_ENABLED:
+        stress_model.predict_stress(sample)
+        report("  prediction cache hit", time_calls(lambda: stress_model.predict_stress(sample), iterations))
+
+    print("\nSingle row")
+    report("  sklearn predict_proba", time_calls(lambda: model.predict_proba(row), iterations))
+    report("  compiled predict_proba", time_calls(lambda: compiled.predict_proba(row), iterations))
+
+    for size in (64, 256, 1000):
+        batch = np.resize(X, (size, 3))
+        batch_iterations = max(iterations // 10, 1)
+        print(f"\nBatch of {size} rows")
+        report("  sklearn predict_proba", time_calls(lambda: model.predict_proba(batch), batch_iterations), size)
+        report("  compiled predict_proba", time_calls(lambda: compiled.predict_proba(batch), batch_iterations), size)
+
+
+if __name__ == "__main__":
+    main()
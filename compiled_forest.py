@@ -0,0 +1,109 @@
+"""
+Array-based evaluator for a trained RandomForestClassifier.
+
+All trees are flattened into one set of contiguous NumPy arrays (feature,
+threshold, left/right child and per-node class probabilities) with each tree's
+nodes stored at its own offset. Prediction walks every (row, tree) pair one
+level per step with vectorized indexing, so scoring needs neither sklearn nor
+its per-call input validation at request time.
+"""
+import numpy as np
+
+
+class CompiledForest:
+    def __init__(self, feature, threshold, left, right, value, roots, classes, max_depth):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        # Per-class leaf probabilities as separate contiguous columns; gathering
+        # and averaging 1-D arrays is much cheaper than reducing (rows, trees, classes)
+        self._class_values = [np.ascontiguousarray(value[:, k]) for k in range(value.shape[1])]
+        self.roots = roots
+        self.classes_ = classes
+        self.max_depth = max_depth
+        self.n_features_in_ = int(feature.max()) + 1 if len(feature) else 0
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """Flatten the fitted estimators of a RandomForestClassifier"""
+        if getattr(model, "n_outputs_", 1) != 1:
+            raise ValueError("Only single-output forests can be compiled")
+
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            is_leaf = tree.children_left == -1
+            node_ids = np.arange(tree.node_count)
+
+            # Leaves point at themselves, so extra traversal steps are no-ops
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+            lefts.append(np.where(is_leaf, node_ids, tree.children_left) + offset)
+            rights.append(np.where(is_leaf, node_ids, tree.children_right) + offset)
+
+            node_values = tree.value[:, 0, :]
+            totals = node_values.sum(axis=1, keepdims=True)
+            totals[totals == 0] = 1.0
+            values.append(node_values / totals)
+
+            roots.append(offset)
+            offset += tree.node_count
+            max_depth = max(max_depth, tree.max_depth)
+
+        return cls(
+            feature=np.ascontiguousarray(np.concatenate(features), dtype=np.intp),
+            threshold=np.ascontiguousarray(np.concatenate(thresholds), dtype=np.float64),
+            left=np.ascontiguousarray(np.concatenate(lefts), dtype=np.intp),
+            right=np.ascontiguousarray(np.concatenate(rights), dtype=np.intp),
+            value=np.ascontiguousarray(np.concatenate(values), dtype=np.float64),
+            roots=np.asarray(roots, dtype=np.intp),
+            classes=np.asarray(model.classes_),
+            max_depth=max_depth,
+        )
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(
+            array.nbytes
+            for array in (self.feature, self.threshold, self.left, self.right, self.value, self.roots)
+        )
+
+    def apply(self, X) -> np.ndarray:
+        """Return the flat leaf index reached by every (row, tree) pair"""
+        # sklearn compares float32 inputs against float64 thresholds; cast the
+        # same way so rows sitting exactly on a split go the same direction
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+
+        n_samples, n_features = X.shape
+        values = X.ravel()
+        nodes = np.tile(self.roots, n_samples)
+        row_offsets = np.repeat(np.arange(n_samples) * n_features, self.n_trees)
+
+        # Only pairs that have not reached a leaf are advanced at each level
+        active = np.arange(nodes.size)
+        for _ in range(self.max_depth):
+            current = nodes[active]
+            internal = self.left[current] != current
+            active, current = active[internal], current[internal]
+            if not active.size:
+                break
+            go_left = values[row_offsets[active] + self.feature[current]] <= self.threshold[current]
+            nodes[active] = np.where(go_left, self.left[current], self.right[current])
+        return nodes.reshape(n_samples, self.n_trees)
+
+    def predict_proba(self, X) -> np.ndarray:
+        leaves = self.apply(X)
+        return np.column_stack([column[leaves].mean(axis=1) for column in self._class_values])
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
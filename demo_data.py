@@ -2,6 +2,7 @@
 from database import SessionLocal
 from models import User, FitbitData, StressPrediction, MoodEntry
 from auth_simple import get_password_hash
+from mood_rollup import rebuild_mood_rollup
 from datetime import datetime, date, timedelta
 import random
 
@@ -105,7 +106,7 @@ def create_demo_user_data(db, user, stress_profile):
             steps=random.randint(steps_range[0], steps_range[1]),
             calories_burned=random.randint(1800, 2500),
             data_date=data_date,
-            recorded_at=datetime.now() - timedelta(days=days_ago)
+            recorded_at=datetime.utcnow() - timedelta(days=days_ago)
         )
         db.add(fitbit_data)
         
@@ -115,7 +116,7 @@ def create_demo_user_data(db, user, stress_profile):
             rating=random.randint(mood_range[0], mood_range[1]),
             notes=f"Demo mood entry for {data_date}",
             entry_date=data_date,
-            created_at=datetime.now() - timedelta(days=days_ago)
+            created_at=datetime.utcnow() - timedelta(days=days_ago)
         )
         db.add(mood_entry)
         
@@ -133,10 +134,11 @@ def create_demo_user_data(db, user, stress_profile):
             heart_rate=fitbit_data.heart_rate,
             sleep_hours=fitbit_data.sleep_hours,
             steps=fitbit_data.steps,
-            created_at=datetime.now() - timedelta(days=days_ago)
+            created_at=datetime.utcnow() - timedelta(days=days_ago)
         )
         db.add(stress_pred)
     
+    rebuild_mood_rollup(db, user.id)
     db.commit()
     print(f"   📊 Created demo data for {user.name} ({stress_profile})")
 
@@ -0,0 +1,446 @@
+"""
+Columnar per-user feature store.
+
+Daily features for every user are derived from fitbit_data, mood_entries and
+stress_predictions and kept as Parquet files under FEATURE_STORE_DIR:
+
+    manifest.json                   change watermarks of the last refresh
+    features/part-NNNNN.parquet     one row per (user_id, day) that has data;
+                                    FEATURE_STORE_USERS_PER_PARTITION users per file
+    latest.parquet                  the newest row of every user
+
+refresh() is incremental. It asks each table which (user, day) pairs changed
+since the stored watermarks (recorded_at / created_at, all stamped in UTC by
+their writers, as are the manifest's times). It then re-reads
+those users' rows from the earliest changed day of their partition and
+recomputes features from that day on, using stored history for the rolling
+windows and lags; days no longer in the database are dropped. Only the
+partitions holding those users are rewritten. The first refresh, or
+refresh(rebuild=True), builds everything.
+
+Deleted rows leave no timestamp behind, and a row stamped before the
+watermark is never seen as changed, so every
+FEATURE_STORE_RECONCILE_INTERVAL_SECONDS the daily raw values are also
+re-read in full and compared with the stored ones; days that differ are
+refreshed like any other change.
+
+Training reads partitions in bulk with scan(). Online inference uses
+latest(user_id), a dict lookup into the newest rows held in memory.
+
+Usage: python feature_store.py [--rebuild]
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import case, func, select
+
+from database import SessionLocal
+from models import FitbitData, MoodEntry, StressPrediction
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+FEATURE_STORE_ENABLED = os.getenv("FEATURE_STORE_ENABLED", "true").lower() in ("1", "true", "yes")
+FEATURE_STORE_DIR = os.getenv("FEATURE_STORE_DIR", os.path.join(BASE_DIR, "feature_store"))
+FEATURE_STORE_REFRESH_INTERVAL_SECONDS = float(os.getenv("FEATURE_STORE_REFRESH_INTERVAL_SECONDS", "900"))
+FEATURE_STORE_USERS_PER_PARTITION = int(os.getenv("FEATURE_STORE_USERS_PER_PARTITION", "1000"))
+# Changes are looked up from this long before the last watermark to catch rows
+# committed late (stamped before a commit that landed after the last refresh)
+FEATURE_STORE_CHANGE_OVERLAP_MINUTES = float(os.getenv("FEATURE_STORE_CHANGE_OVERLAP_MINUTES", "15"))
+# Seconds between full comparisons against the database, which catch deletes
+# and changes the watermarks miss; 0 compares on every refresh
+FEATURE_STORE_RECONCILE_INTERVAL_SECONDS = float(os.getenv("FEATURE_STORE_RECONCILE_INTERVAL_SECONDS", "3600"))
+# Users per IN (...) list when re-reading changed rows
+FEATURE_STORE_QUERY_BATCH_USERS = int(os.getenv("FEATURE_STORE_QUERY_BATCH_USERS", "500"))
+
+SIGNALS = ["heart_rate", "sleep_hours", "steps", "mood"]
+RAW_COLUMNS = SIGNALS + ["is_manual_edit", "mood_entries", "predictions", "high_stress_share"]
+WINDOWS = (7, 28)
+MOOD_LAGS = (1, 2, 7)
+# Stored days needed before a changed day to recompute its windows and lags
+HISTORY_DAYS = max(max(WINDOWS), max(MOOD_LAGS))
+MANIFEST_FORMAT = 1
+
+
+def load_raw_days(db, user_ids: list = None, since: date = None) -> pd.DataFrame:
+    """Daily raw values per (user_id, day) from the three source tables"""
+    prediction_day = func.date(StressPrediction.created_at)
+    queries = {
+        "fitbit": select(
+            FitbitData.user_id, FitbitData.data_date, FitbitData.heart_rate, FitbitData.sleep_hours,
+            FitbitData.steps, FitbitData.is_manual_edit
+        ),
+        "mood": select(
+            MoodEntry.user_id, MoodEntry.entry_date, func.avg(MoodEntry.rating), func.count(MoodEntry.id)
+        ).group_by(MoodEntry.user_id, MoodEntry.entry_date),
+        "stress": select(
+            StressPrediction.user_id, prediction_day, func.count(StressPrediction.id),
+            func.avg(case((StressPrediction.prediction == "High", 1.0), else_=0.0))
+        ).group_by(StressPrediction.user_id, prediction_day),
+    }
+    if since is not None:
+        queries["fitbit"] = queries["fitbit"].where(FitbitData.data_date >= since)
+        queries["mood"] = queries["mood"].where(MoodEntry.entry_date >= since)
+        queries["stress"] = queries["stress"].where(
+            StressPrediction.created_at >= datetime(since.year, since.month, since.day)
+        )
+    user_columns = {"fitbit": FitbitData.user_id, "mood": MoodEntry.user_id, "stress": StressPrediction.user_id}
+    columns = {
+        "fitbit": ["heart_rate", "sleep_hours", "steps", "is_manual_edit"],
+        "mood": ["mood", "mood_entries"],
+        "stress": ["predictions", "high_stress_share"],
+    }
+
+    frames = []
+    for name, query in queries.items():
+        if user_ids is None:
+            rows = db.execute(query).all()
+        else:
+            rows = []
+            for start in range(0, len(user_ids), FEATURE_STORE_QUERY_BATCH_USERS):
+                batch = user_ids[start:start + FEATURE_STORE_QUERY_BATCH_USERS]
+                rows += db.execute(query.where(user_columns[name].in_(batch))).all()
+        frame = pd.DataFrame(rows, columns=["user_id", "day", *columns[name]])
+        frame["user_id"] = frame["user_id"].astype("int64")
+        frame["day"] = pd.to_datetime(frame["day"])
+        frames.append(frame.set_index(["user_id", "day"]).astype(float))
+
+    raw = pd.concat(frames, axis=1).reindex(columns=RAW_COLUMNS)
+    raw["heart_rate"] = raw["heart_rate"].where(raw["heart_rate"] > 0)  # 0 means no reading
+    return raw.sort_index()
+
+
+def compute_features(raw: pd.DataFrame) -> pd.DataFrame:
+    """Raw columns plus calendar, rolling, delta and lag features for each (user_id, day)"""
+    raw = raw.sort_index()
+    users = raw.index.get_level_values("user_id")
+    days = raw.index.get_level_values("day")
+    features = raw.copy()
+    features["weekday"] = days.dayofweek.astype("int64")
+    features["is_weekend"] = (days.dayofweek >= 5).astype(float)
+
+    def days_before(column: str, offset: int) -> np.ndarray:
+        """Value of the same user `offset` calendar days earlier (NaN when that day has no row)"""
+        lookup = pd.MultiIndex.from_arrays([users, days - pd.Timedelta(days=offset)], names=raw.index.names)
+        return raw[column].reindex(lookup).to_numpy()
+
+    # Time-based windows over each user's days; days without data do not count
+    by_user = raw[SIGNALS + ["high_stress_share"]].reset_index(level="user_id").groupby("user_id", sort=False)
+    for window in WINDOWS:
+        means = by_user.rolling(f"{window}D").mean()
+        for signal in SIGNALS:
+            features[f"{signal}_mean{window}"] = means[signal]
+    features["high_stress_share_mean7"] = by_user.rolling("7D")["high_stress_share"].mean()
+
+    for signal in SIGNALS:
+        features[f"{signal}_delta1"] = raw[signal].to_numpy() - days_before(signal, 1)
+        features[f"{signal}_delta7"] = features[signal] - features[f"{signal}_mean7"]
+    for lag in MOOD_LAGS:
+        features[f"mood_lag{lag}"] = days_before("mood", lag)
+    return features
+
+
+def changed_days(db, watermarks: dict):
+    """(user_id, day) pairs touched since the watermarks, and the advanced watermarks"""
+    sources = {
+        "fitbit_data": (FitbitData.recorded_at, FitbitData.user_id, FitbitData.data_date),
+        "mood_entries": (MoodEntry.created_at, MoodEntry.user_id, MoodEntry.entry_date),
+        "stress_predictions": (StressPrediction.created_at, StressPrediction.user_id, func.date(StressPrediction.created_at)),
+    }
+    overlap = timedelta(minutes=FEATURE_STORE_CHANGE_OVERLAP_MINUTES)
+    frames = []
+    advanced = {}
+    for name, (stamp, user_id, day) in sources.items():
+        watermark = datetime.fromisoformat(watermarks[name]) if watermarks.get(name) else None
+        query = select(user_id, day, func.max(stamp)).group_by(user_id, day)
+        if watermark is not None:
+            query = query.where(stamp > watermark - overlap)
+        rows = db.execute(query).all()
+        stamps = [row[2] for row in rows if row[2] is not None]
+        latest = max(stamps + ([watermark] if watermark else []), default=None)
+        advanced[name] = latest.isoformat() if latest else None
+        frames.append(pd.DataFrame([row[:2] for row in rows], columns=["user_id", "day"]))
+
+    changes = pd.concat(frames, ignore_index=True)
+    changes["user_id"] = changes["user_id"].astype("int64")
+    changes["day"] = pd.to_datetime(changes["day"])
+    return changes.drop_duplicates(), advanced
+
+
+def stale_days(stored: pd.DataFrame, source: pd.DataFrame) -> pd.DataFrame:
+    """(user_id, day) pairs whose raw values differ, or that exist on only one side"""
+    index = stored.index.union(source.index)
+    stored = stored.reindex(index=index, columns=RAW_COLUMNS)
+    source = source.reindex(index=index, columns=RAW_COLUMNS)
+    same = (stored == source) | (stored.isna() & source.isna())
+    return index[~same.all(axis=1)].to_frame(index=False)
+
+
+def latest_rows(features: pd.DataFrame) -> pd.DataFrame:
+    """The newest row of each user, indexed by user_id with the day as a column"""
+    newest = features.groupby(level="user_id", sort=False).tail(1)
+    return newest.reset_index(level="day")
+
+
+class FeatureStore:
+    def __init__(self, directory: str = FEATURE_STORE_DIR, users_per_partition: int = FEATURE_STORE_USERS_PER_PARTITION):
+        self.directory = directory
+        self.users_per_partition = users_per_partition
+
+        # In-memory copy of latest.parquet for online lookups
+        self._latest_positions = {}   # user_id -> row in _latest_values
+        self._latest_values = None
+        self._latest_columns = []
+        self._latest_mtime = None
+
+        self.refreshes = 0
+        self.lookups = 0
+        self.last_refresh = None
+
+    # Paths and file IO
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.directory, "manifest.json")
+
+    @property
+    def latest_path(self) -> str:
+        return os.path.join(self.directory, "latest.parquet")
+
+    def partition_path(self, partition: int) -> str:
+        return os.path.join(self.directory, "features", f"part-{partition:05d}.parquet")
+
+    def partition_of(self, user_ids):
+        return np.asarray(user_ids, dtype=np.int64) // self.users_per_partition
+
+    def partitions(self) -> list:
+        folder = os.path.join(self.directory, "features")
+        if not os.path.isdir(folder):
+            return []
+        return sorted(int(name[5:10]) for name in os.listdir(folder) if name.endswith(".parquet"))
+
+    @staticmethod
+    def _write(frame: pd.DataFrame, path: str):
+        """Write beside the target and swap it in, so readers never see a partial file"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f"{path}.tmp"
+        frame.to_parquet(temporary)
+        os.replace(temporary, path)
+
+    def _read_partition(self, partition: int):
+        path = self.partition_path(partition)
+        return pd.read_parquet(path) if os.path.exists(path) else None
+
+    def read_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return None
+        with open(self.manifest_path) as f:
+            manifest = json.load(f)
+        if manifest.get("format") != MANIFEST_FORMAT or manifest.get("users_per_partition") != self.users_per_partition:
+            return None  # layout changed; rebuild
+        return manifest
+
+    def _write_manifest(self, watermarks: dict, reconciled_at: str):
+        manifest = {
+            "format": MANIFEST_FORMAT,
+            "users_per_partition": self.users_per_partition,
+            "watermarks": watermarks,
+            "reconciled_at": reconciled_at,
+            "refreshed_at": datetime.utcnow().isoformat(),
+        }
+        temporary = f"{self.manifest_path}.tmp"
+        with open(temporary, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(temporary, self.manifest_path)
+
+    # Maintenance
+
+    def refresh(self, session_factory=SessionLocal, rebuild: bool = False) -> dict:
+        """Bring the store up to date with the database; returns a summary of the run"""
+        started = time.perf_counter()
+        manifest = None if rebuild else self.read_manifest()
+
+        db = session_factory()
+        try:
+            if manifest is None:
+                # Watermarks first, so rows written during the build are picked up next time
+                reconciled_at = datetime.utcnow().isoformat()
+                _, watermarks = changed_days(db, {})
+                written = self._rebuild(load_raw_days(db))
+                mode = "rebuild"
+            else:
+                reconciled_at = manifest.get("reconciled_at")
+                changes, watermarks = changed_days(db, manifest["watermarks"])
+                mode = "incremental"
+                if self._reconcile_due(reconciled_at):
+                    reconciled_at = datetime.utcnow().isoformat()
+                    stale = stale_days(self.scan(columns=RAW_COLUMNS), load_raw_days(db))
+                    changes = pd.concat([changes, stale], ignore_index=True).drop_duplicates()
+                    mode = "reconcile"
+                written = self._update(db, changes)
+        finally:
+            db.close()
+
+        self._write_manifest(watermarks, reconciled_at)
+        self.refreshes += 1
+        self.last_refresh = {
+            "mode": mode,
+            "partitions_written": written,
+            "refreshed_at": datetime.utcnow().isoformat(),
+            "seconds": round(time.perf_counter() - started, 2),
+        }
+        if written:
+            print(f"🧮 Feature store {mode}: {written} partition(s) written in {self.last_refresh['seconds']}s")
+        return self.last_refresh
+
+    @staticmethod
+    def _reconcile_due(reconciled_at: str) -> bool:
+        if not reconciled_at:
+            return True
+        elapsed = datetime.utcnow() - datetime.fromisoformat(reconciled_at)
+        return elapsed.total_seconds() >= FEATURE_STORE_RECONCILE_INTERVAL_SECONDS
+
+    def _rebuild(self, raw: pd.DataFrame) -> int:
+        features = compute_features(raw)
+        for partition in self.partitions():
+            os.remove(self.partition_path(partition))
+        partition_ids = self.partition_of(features.index.get_level_values("user_id"))
+        for partition, frame in features.groupby(partition_ids, sort=True):
+            self._write(frame, self.partition_path(int(partition)))
+        self._write(latest_rows(features), self.latest_path)
+        return int(len(np.unique(partition_ids)))
+
+    def _update(self, db, changes: pd.DataFrame) -> int:
+        if changes.empty:
+            return 0
+        changes["partition"] = self.partition_of(changes["user_id"])
+        newest = []
+        for partition, changed in changes.groupby("partition", sort=True):
+            user_ids = sorted(int(user_id) for user_id in changed["user_id"].unique())
+            since = changed["day"].min()
+            raw = load_raw_days(db, user_ids, since.date())
+            newest.append(self._update_partition(int(partition), user_ids, since, raw))
+
+        latest = pd.concat(newest)
+        if os.path.exists(self.latest_path):
+            # Users whose rows were all deleted have no new latest row; drop their old one too
+            stored = pd.read_parquet(self.latest_path)
+            touched = stored.index.isin(changes["user_id"]) | stored.index.isin(latest.index)
+            latest = pd.concat([stored[~touched], latest]).sort_index()
+        self._write(latest, self.latest_path)
+        return len(newest)
+
+    def _update_partition(self, partition: int, user_ids: list, since: pd.Timestamp, raw: pd.DataFrame) -> pd.DataFrame:
+        """Recompute the users' rows from `since` on; returns their newest rows"""
+        stored = self._read_partition(partition)
+        history = raw.iloc[:0]
+        if stored is not None:
+            days = stored.index.get_level_values("day")
+            changed_users = stored.index.get_level_values("user_id").isin(user_ids)
+            replaced = changed_users & (days >= since)
+            history = stored.loc[changed_users & ~replaced & (days >= since - pd.Timedelta(days=HISTORY_DAYS)), RAW_COLUMNS]
+            stored = stored.loc[~replaced]
+
+        recomputed = compute_features(pd.concat([history, raw]))
+        recomputed = recomputed[recomputed.index.get_level_values("day") >= since]
+        frame = pd.concat([stored, recomputed]).sort_index() if stored is not None else recomputed
+        self._write(frame, self.partition_path(partition))
+        return latest_rows(frame[frame.index.get_level_values("user_id").isin(user_ids)])
+
+    # Reads
+
+    def scan(self, columns: list = None, user_ids: list = None) -> pd.DataFrame:
+        """Bulk read for training: every (user_id, day) row, optionally narrowed to columns and users"""
+        partitions = self.partitions()
+        if user_ids is not None:
+            partitions = sorted(set(self.partition_of(user_ids).tolist()) & set(partitions))
+        frames = [pd.read_parquet(self.partition_path(partition), columns=columns) for partition in partitions]
+        if not frames:
+            return pd.DataFrame()
+        frame = pd.concat(frames)
+        if user_ids is not None:
+            frame = frame[frame.index.get_level_values("user_id").isin(user_ids)]
+        return frame
+
+    def _load_latest(self):
+        try:
+            mtime = os.stat(self.latest_path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._latest_mtime:
+            return
+        latest = pd.read_parquet(self.latest_path)
+        self._latest_columns = list(latest.columns)
+        self._latest_values = latest.to_numpy(dtype=object)
+        self._latest_positions = {int(user_id): position for position, user_id in enumerate(latest.index)}
+        self._latest_mtime = mtime
+
+    def latest(self, user_id: int):
+        """Newest feature row of one user for online inference, or None"""
+        self._load_latest()
+        position = self._latest_positions.get(user_id)
+        if position is None:
+            return None
+        self.lookups += 1
+        row = dict(zip(self._latest_columns, self._latest_values[position]))
+        row["day"] = row["day"].date().isoformat()
+        return {key: None if isinstance(value, float) and np.isnan(value) else value for key, value in row.items()}
+
+    def stats(self) -> dict:
+        manifest = self.read_manifest()
+        return {
+            "enabled": FEATURE_STORE_ENABLED,
+            "directory": self.directory,
+            "partitions": len(self.partitions()),
+            "users": len(self._latest_positions),
+            "refreshes": self.refreshes,
+            "lookups": self.lookups,
+            "refreshed_at": manifest["refreshed_at"] if manifest else None,
+            "reconciled_at": manifest.get("reconciled_at") if manifest else None,
+            "last_refresh": self.last_refresh,
+        }
+
+
+class FeatureStoreRefresher:
+    """Runs feature_store.refresh in the background on a fixed interval"""
+
+    def __init__(self, store: FeatureStore, interval_seconds: float = FEATURE_STORE_REFRESH_INTERVAL_SECONDS):
+        self.store = store
+        self.interval_seconds = interval_seconds
+        self._task = None
+        self.failures = 0
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.store.refresh)
+            except Exception as e:
+                self.failures += 1
+                print(f"❌ Feature store refresh failed: {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+
+feature_store = FeatureStore()
+feature_store_refresher = FeatureStoreRefresher(feature_store)
+
+
+if __name__ == "__main__":
+    print(feature_store.refresh(rebuild="--rebuild" in sys.argv[1:]))
@@ -1,16 +1,22 @@
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import HTMLResponse
-from sqlalchemy.orm import Session
-from database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
 from models import FitbitData, FitbitConnection, User, FitbitAuthSession
 from auth_simple import get_current_user
 from datetime import datetime, date, timedelta
 from pydantic import BaseModel
-import requests
+from fitbit_client import fetch_daily_summary, fitbit_token_request
+from fitbit_cache import fitbit_response_cache
+from fitbit_ratelimit import fitbit_rate_limiter
+from fitbit_sync import fitbit_sync_service, store_daily_summary, FITBIT_SYNC_ENABLED
+from fitbit_backfill import fitbit_backfill_service, FITBIT_BACKFILL_DAYS, FITBIT_BACKFILL_ON_CONNECT
+from fitbit_tokens import fitbit_token_manager
+import asyncio
 import os
 from dotenv import load_dotenv
 import secrets
-import base64
 
 load_dotenv()
 
@@ -29,7 +35,7 @@ class ManualDataRequest(BaseModel):
     notes: str = None
 
 @router.get("/fitbit/login")
-async def fitbit_login(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def fitbit_login(current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
     if not FITBIT_CLIENT_ID or not FITBIT_CLIENT_SECRET:
         raise HTTPException(
             status_code=400, 
@@ -49,7 +55,7 @@ async def fitbit_login(current_user: User = Depends(get_current_user), db: Sessi
     )
     
     db.add(auth_session)
-    db.commit()
+    await db.commit()
     
     print(f"🔐 Stored auth session for user {current_user.name} (ID: {current_user.id}) with state: {state_token}")
     
@@ -73,7 +79,7 @@ async def fitbit_callback(
     code: str,
     state: str = None,
     error: str = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     if error:
         html_content = f"""
@@ -140,15 +146,18 @@ async def fitbit_callback(
         """
         return HTMLResponse(content=html_content)
     
+    auth_session = None
+    # Set once the commit that deletes auth_session succeeds; later failures must not touch it again
+    auth_session_consumed = False
     try:
         print(f"🔐 Processing callback with state: {state}")
         print(f"🔐 Authorization code: {code[:10]}...")
         
         # Find the auth session by state token
-        auth_session = db.query(FitbitAuthSession).filter(
+        auth_session = await db.scalar(select(FitbitAuthSession).where(
             FitbitAuthSession.state_token == state,
             FitbitAuthSession.expires_at > datetime.now()
-        ).first()
+        ))
         
         if not auth_session:
             print(f"❌ No valid auth session found for state: {state}")
@@ -173,7 +182,7 @@ async def fitbit_callback(
             return HTMLResponse(content=html_content)
         
         # Get the user from the auth session
-        user = db.query(User).filter(User.id == auth_session.user_id).first()
+        user = await db.get(User, auth_session.user_id)
         if not user:
             print(f"❌ User not found for ID: {auth_session.user_id}")
             html_content = """
@@ -199,11 +208,6 @@ async def fitbit_callback(
         print(f"✅ Found user: {user.name} (ID: {user.id})")
         
         # Exchange code for tokens
-        token_url = "https://api.fitbit.com/oauth2/token"
-        
-        # Create Basic Auth header
-        auth_str = base64.b64encode(f"{FITBIT_CLIENT_ID}:{FITBIT_CLIENT_SECRET}".encode()).decode()
-        
         data = {
             "grant_type": "authorization_code",
             "client_id": FITBIT_CLIENT_ID,
@@ -213,14 +217,7 @@ async def fitbit_callback(
         
         print(f"📤 Making token request to Fitbit...")
         
-        response = requests.post(
-            token_url,
-            headers={
-                "Authorization": f"Basic {auth_str}",
-                "Content-Type": "application/x-www-form-urlencoded"
-            },
-            data=data
-        )
+        response = await fitbit_token_request(data)
         
         print(f"📥 Token response status: {response.status_code}")
         
@@ -230,8 +227,8 @@ async def fitbit_callback(
             print(f"❌ Fitbit API error: {error_detail}")
             
             # Clean up the auth session
-            db.delete(auth_session)
-            db.commit()
+            await db.delete(auth_session)
+            await db.commit()
             
             raise HTTPException(
                 status_code=400, 
@@ -243,7 +240,7 @@ async def fitbit_callback(
         print(f"✅ Token exchange successful for Fitbit user: {fitbit_user_id}")
         
         # Update or create Fitbit connection
-        fitbit_conn = db.query(FitbitConnection).filter(FitbitConnection.user_id == user.id).first()
+        fitbit_conn = await db.scalar(select(FitbitConnection).where(FitbitConnection.user_id == user.id))
         if not fitbit_conn:
             fitbit_conn = FitbitConnection(user_id=user.id)
         
@@ -256,15 +253,24 @@ async def fitbit_callback(
         fitbit_conn.refresh_token = token_data["refresh_token"]
         fitbit_conn.token_expires_at = expires_at
         fitbit_conn.connected_at = current_time
-        fitbit_conn.last_sync_at = current_time
+        fitbit_conn.last_sync_at = datetime.utcnow()
         
         db.add(fitbit_conn)
         
         # Clean up the auth session
-        db.delete(auth_session)
-        db.commit()
+        await db.delete(auth_session)
+        await db.commit()
+        auth_session_consumed = True
         
         print(f"✅ Fitbit connection saved to database for user {user.name}")
+        fitbit_token_manager.store(
+            user.id, fitbit_user_id, token_data["access_token"], token_data["refresh_token"], expires_at
+        )
+
+        if FITBIT_BACKFILL_ON_CONNECT:
+            # Pull the user's history in the background so forecasts have something to work with
+            job = await asyncio.to_thread(fitbit_backfill_service.create_job, user.id)
+            fitbit_backfill_service.start(job["job_id"])
         
         # Return success page with the ACTUAL user's name
         html_content = f"""
@@ -302,10 +308,14 @@ async def fitbit_callback(
     except Exception as e:
         print(f"❌ Fitbit connection error: {e}")
         
-        # Clean up any auth session if it exists
-        if 'auth_session' in locals():
-            db.delete(auth_session)
-            db.commit()
+        # Clean up the auth session unless the successful commit already removed it
+        if auth_session is not None and not auth_session_consumed:
+            try:
+                await db.rollback()
+                await db.delete(auth_session)
+                await db.commit()
+            except Exception as cleanup_error:
+                print(f"❌ Failed to clean up Fitbit auth session: {cleanup_error}")
         
         # Return error page
         html_content = f"""
@@ -340,7 +350,7 @@ async def fitbit_callback(
 async def get_historical_data(
     date: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get historical data for a specific date (for demo users)
@@ -350,10 +360,10 @@ async def get_historical_data(
         target_date = datetime.strptime(date, "%Y-%m-%d").date()
         
         # Get data for this date
-        fitbit_data = db.query(FitbitData).filter(
+        fitbit_data = await db.scalar(select(FitbitData).where(
             FitbitData.user_id == current_user.id,
             FitbitData.data_date == target_date
-        ).first()
+        ))
         
         if fitbit_data:
             return {
@@ -367,9 +377,31 @@ async def get_historical_data(
                     "source": "historical_database"
                 }
             }
-        else:
-            # Return default based on user ID (for demo)
-            return get_demo_data_for_user(current_user.id, target_date)
+        
+        # Not stored yet: ask Fitbit for that day (closed days come from the response cache)
+        fitbit_conn = await db.scalar(select(FitbitConnection).where(FitbitConnection.user_id == current_user.id))
+        if fitbit_conn and fitbit_conn.access_token and target_date <= datetime.now().date():
+            summary = await fitbit_token_manager.call(
+                current_user.id,
+                lambda fitbit_user_id, access_token: fetch_daily_summary(fitbit_user_id, access_token, date)
+            )
+            if summary["steps"] or summary["sleep_hours"] or summary["heart_rate"]:
+                await db.run_sync(store_daily_summary, current_user.id, target_date, summary)
+                await db.commit()
+                return {
+                    "status": "success",
+                    "data": {
+                        "sleep_hours": summary["sleep_hours"],
+                        "steps": summary["steps"],
+                        "heart_rate": summary["heart_rate"],
+                        "calories_burned": summary["steps"] * 0.04,
+                        "data_date": target_date.isoformat(),
+                        "source": "fitbit"
+                    }
+                }
+        
+        # Return default based on user ID (for demo)
+        return get_demo_data_for_user(current_user.id, target_date)
             
     except Exception as e:
         print(f"❌ Error getting historical data: {e}")
@@ -445,7 +477,7 @@ def get_demo_data_for_user(user_id: int, date: date):
 @router.get("/fitbit/data")
 async def get_fitbit_data(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get Fitbit data - always returns manual data if it exists for today
@@ -455,11 +487,11 @@ async def get_fitbit_data(
         
         # FIRST: Check for manual data from today
         today = date.today()
-        manual_data = db.query(FitbitData).filter(
+        manual_data = await db.scalar(select(FitbitData).where(
             FitbitData.user_id == current_user.id,
             FitbitData.data_date == today,
             FitbitData.is_manual_edit == True
-        ).first()
+        ))
         
         if manual_data:
             print(f"✅ Returning manual data for {current_user.name}")
@@ -475,7 +507,7 @@ async def get_fitbit_data(
             }
         
         # SECOND: If no manual data, check Fitbit connection
-        fitbit_conn = db.query(FitbitConnection).filter(FitbitConnection.user_id == current_user.id).first()
+        fitbit_conn = await db.scalar(select(FitbitConnection).where(FitbitConnection.user_id == current_user.id))
         
         if not fitbit_conn or not fitbit_conn.access_token:
             # If no Fitbit connection, return default/empty data
@@ -491,87 +523,60 @@ async def get_fitbit_data(
                 "source": "none"
             }
         
-        # THIRD: Fetch from Fitbit API
+        # THIRD: Serve the latest stored row; the background sync service keeps it fresh
+        if FITBIT_SYNC_ENABLED:
+            fitbit_sync_service.mark_active(current_user.id)
+            latest_data = await db.scalar(select(FitbitData).where(
+                FitbitData.user_id == current_user.id
+            ).order_by(FitbitData.data_date.desc()).limit(1))
+            
+            if (latest_data is None or latest_data.data_date != today
+                    or fitbit_sync_service.is_stale(current_user.id, fitbit_conn.last_sync_at)):
+                fitbit_sync_service.request_sync(current_user.id)
+            
+            if latest_data:
+                return {
+                    "steps": latest_data.steps,
+                    "sleep_hours": float(latest_data.sleep_hours) if latest_data.sleep_hours else 0,
+                    "heart_rate": latest_data.heart_rate,
+                    "calories_burned": latest_data.calories_burned if latest_data.calories_burned else 0,
+                    "last_sync": fitbit_conn.last_sync_at.isoformat() if fitbit_conn.last_sync_at else None,
+                    "data_date": latest_data.data_date.isoformat(),
+                    "is_simulated": False,
+                    "is_manual_edit": bool(latest_data.is_manual_edit),
+                    "source": "manual" if latest_data.is_manual_edit else "fitbit"
+                }
+            
+            print(f"ℹ️ No synced Fitbit data yet for {current_user.name}, sync requested")
+            return {
+                "steps": 0,
+                "sleep_hours": 0.0,
+                "heart_rate": 0,
+                "calories_burned": 0,
+                "last_sync": None,
+                "is_simulated": True,
+                "is_manual_edit": False,
+                "source": "pending_sync"
+            }
+        
+        # Without the sync service, fetch from the Fitbit API on the request
         print(f"📡 Fetching Fitbit data for {current_user.name}")
         today_str = today.isoformat()
-        headers = {
-            "Authorization": f"Bearer {fitbit_conn.access_token}",
-            "Accept": "application/json"
-        }
-        
-        # Get steps data
-        steps = 0
-        try:
-            steps_response = requests.get(
-                f"https://api.fitbit.com/1/user/{fitbit_conn.fitbit_user_id}/activities/steps/date/{today_str}/1d.json",
-                headers=headers
-            )
-            if steps_response.status_code == 200:
-                steps_data = steps_response.json()
-                if steps_data["activities-steps"]:
-                    steps = int(steps_data["activities-steps"][0]["value"])
-        except Exception as e:
-            print(f"❌ Error fetching steps: {e}")
-        
-        # Get sleep data
-        sleep_hours = 0.0
-        try:
-            sleep_response = requests.get(
-                f"https://api.fitbit.com/1.2/user/{fitbit_conn.fitbit_user_id}/sleep/date/{today_str}.json",
-                headers=headers
-            )
-            if sleep_response.status_code == 200:
-                sleep_data = sleep_response.json()
-                if sleep_data["sleep"]:
-                    total_minutes = sum(sleep["minutesAsleep"] for sleep in sleep_data["sleep"])
-                    sleep_hours = round(total_minutes / 60, 1)
-        except Exception as e:
-            print(f"❌ Error fetching sleep: {e}")
-        
-        # Get heart rate data
-        heart_rate = 0
-        try:
-            heart_response = requests.get(
-                f"https://api.fitbit.com/1/user/{fitbit_conn.fitbit_user_id}/activities/heart/date/{today_str}/1d.json",
-                headers=headers
-            )
-            if heart_response.status_code == 200:
-                heart_data = heart_response.json()
-                if heart_data["activities-heart"]:
-                    resting_heart_rate = heart_data["activities-heart"][0]["value"].get("restingHeartRate")
-                    if resting_heart_rate:
-                        heart_rate = resting_heart_rate
-        except Exception as e:
-            print(f"❌ Error fetching heart rate: {e}")
+        # Steps, sleep and heart rate are requested concurrently over the pooled client
+        summary = await fitbit_token_manager.call(
+            current_user.id,
+            lambda fitbit_user_id, access_token: fetch_daily_summary(fitbit_user_id, access_token, today_str)
+        )
+        steps = summary["steps"]
+        sleep_hours = summary["sleep_hours"]
+        heart_rate = summary["heart_rate"]
         
         # Save Fitbit data to database
-        existing_fitbit_data = db.query(FitbitData).filter(
-            FitbitData.user_id == current_user.id,
-            FitbitData.data_date == today,
-            FitbitData.is_manual_edit == False
-        ).first()
-        
-        if existing_fitbit_data:
-            existing_fitbit_data.heart_rate = heart_rate
-            existing_fitbit_data.sleep_hours = sleep_hours
-            existing_fitbit_data.steps = steps
-            existing_fitbit_data.calories_burned = steps * 0.04
-            existing_fitbit_data.recorded_at = datetime.now()
-        else:
-            fitbit_data = FitbitData(
-                user_id=current_user.id,
-                heart_rate=heart_rate,
-                sleep_hours=sleep_hours,
-                steps=steps,
-                calories_burned=steps * 0.04,
-                data_date=today,
-                is_manual_edit=False
-            )
-            db.add(fitbit_data)
+        await db.run_sync(store_daily_summary, current_user.id, today, summary)
         
         # Update last sync time
-        fitbit_conn.last_sync_at = datetime.now()
-        db.commit()
+        fitbit_conn.last_sync_at = datetime.utcnow()
+        await db.commit()
         
         print(f"✅ Fitbit data fetched: {steps} steps, {sleep_hours} hrs sleep, {heart_rate} bpm")
         
@@ -600,11 +605,53 @@ async def get_fitbit_data(
             "source": "error"
         }
         
+@router.get("/fitbit/sync/status")
+async def get_fitbit_sync_status(current_user: User = Depends(get_current_user)):
+    """
+    Background Fitbit sync service counters
+    """
+    return {
+        **fitbit_sync_service.stats(),
+        "tokens": fitbit_token_manager.stats(),
+        "response_cache": fitbit_response_cache.stats(),
+        "rate_limiter": fitbit_rate_limiter.stats()
+    }
+
+@router.post("/fitbit/backfill")
+async def start_fitbit_backfill(
+    days: int = FITBIT_BACKFILL_DAYS,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Import historical Fitbit data, resuming the user's unfinished backfill if there is one
+    """
+    if days < 1 or days > 3650:
+        raise HTTPException(status_code=400, detail="days must be between 1 and 3650")
+
+    fitbit_conn = await db.scalar(select(FitbitConnection).where(FitbitConnection.user_id == current_user.id))
+    if not fitbit_conn or not fitbit_conn.access_token:
+        raise HTTPException(status_code=400, detail="Fitbit is not connected")
+
+    job = await asyncio.to_thread(fitbit_backfill_service.create_job, current_user.id, days)
+    fitbit_backfill_service.start(job["job_id"])
+    return job
+
+@router.get("/fitbit/backfill")
+async def get_fitbit_backfill(current_user: User = Depends(get_current_user)):
+    """
+    Progress of the user's most recent historical backfill
+    """
+    job = await asyncio.to_thread(fitbit_backfill_service.latest_progress, current_user.id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="No Fitbit backfill found")
+    return job
+
 @router.post("/fitbit/manual-data")
 async def save_manual_data(
     data: ManualDataRequest,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Save manually edited health data
@@ -624,10 +671,10 @@ async def save_manual_data(
             raise HTTPException(status_code=400, detail="Heart rate must be between 40 and 120 bpm")
         
         # Check if data already exists for today
-        existing_data = db.query(FitbitData).filter(
+        existing_data = await db.scalar(select(FitbitData).where(
             FitbitData.user_id == current_user.id,
             FitbitData.data_date == date.today()
-        ).first()
+        ))
 
         if existing_data:
             # UPDATE existing record
@@ -635,7 +682,7 @@ async def save_manual_data(
             existing_data.sleep_hours = data.sleep_hours
             existing_data.steps = data.steps
             existing_data.calories_burned = data.steps * 0.04
-            existing_data.recorded_at = datetime.now()
+            existing_data.recorded_at = datetime.utcnow()
             existing_data.is_manual_edit = True
             action = "updated"
         else:
@@ -647,13 +694,13 @@ async def save_manual_data(
                 steps=data.steps,
                 calories_burned=data.steps * 0.04,
                 data_date=date.today(),
-                recorded_at=datetime.now(),
+                recorded_at=datetime.utcnow(),
                 is_manual_edit=True
             )
             db.add(fitbit_data)
             action = "created"
 
-        db.commit()
+        await db.commit()
         
         print(f"✅ Manual data {action} successfully for user {current_user.name}")
         
@@ -672,7 +719,7 @@ async def save_manual_data(
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f"❌ Failed to save manual data: {e}")
         raise HTTPException(
             status_code=500, 
@@ -682,7 +729,7 @@ async def save_manual_data(
 @router.get("/fitbit/manual-data/history")
 async def get_manual_data_history(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get history of manual data edits
@@ -691,11 +738,11 @@ async def get_manual_data_history(
         # Get manual data entries (last 30 days)
         thirty_days_ago = datetime.now() - timedelta(days=30)
         
-        manual_data = db.query(FitbitData).filter(
+        manual_data = (await db.scalars(select(FitbitData).where(
             FitbitData.user_id == current_user.id,
             FitbitData.is_manual_edit == True,
             FitbitData.data_date >= thirty_days_ago.date()
-        ).order_by(FitbitData.recorded_at.desc()).all()
+        ).order_by(FitbitData.recorded_at.desc()))).all()
         
         return {
             "manual_entries": [
@@ -721,17 +768,17 @@ async def get_manual_data_history(
 @router.get("/fitbit/current-data")
 async def get_current_fitbit_data(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get the most recent Fitbit data (either from Fitbit or manual entry)
     """
     try:
         # Get the most recent data for today
-        today_data = db.query(FitbitData).filter(
+        today_data = await db.scalar(select(FitbitData).where(
             FitbitData.user_id == current_user.id,
             FitbitData.data_date == date.today()
-        ).first()
+        ))
         
         if today_data:
             return {
@@ -763,22 +810,22 @@ async def get_current_fitbit_data(
 @router.delete("/fitbit/manual-data/today")
 async def delete_today_manual_data(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Delete today's manual data entry (allow re-entry)
     """
     try:
         # Find today's manual data
-        today_manual_data = db.query(FitbitData).filter(
+        today_manual_data = await db.scalar(select(FitbitData).where(
             FitbitData.user_id == current_user.id,
             FitbitData.data_date == date.today(),
             FitbitData.is_manual_edit == True
-        ).first()
+        ))
         
         if today_manual_data:
-            db.delete(today_manual_data)
-            db.commit()
+            await db.delete(today_manual_data)
+            await db.commit()
             return {
                 "status": "success",
                 "message": "Today's manual data deleted successfully"
@@ -792,7 +839,7 @@ async def delete_today_manual_data(
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f"❌ Failed to delete manual data: {e}")
         raise HTTPException(
             status_code=500, 
@@ -0,0 +1,311 @@
+"""
+Historical Fitbit backfill.
+
+A newly connected user only has whatever the daily sync has written since they
+connected. FitbitBackfillService pulls steps, sleep and resting heart rate for
+the past FITBIT_BACKFILL_DAYS using Fitbit's date-range endpoints, one chunk of
+up to FITBIT_BACKFILL_CHUNK_DAYS at a time (100 days is the sleep endpoint's
+maximum range). The three series are merged by date and each chunk is written
+with a single multi-row upsert on the user_date unique key. Rows the user
+edited by hand (is_manual_edit) are never overwritten.
+
+Progress is kept in fitbit_backfill_jobs and committed in the same transaction
+as each chunk's rows, so an interrupted job resumes from the first unwritten day.
+"""
+import asyncio
+import os
+from datetime import datetime, date, timedelta
+
+from sqlalchemy import case, func
+
+from database import SessionLocal
+from models import FitbitBackfillJob, FitbitData
+from fitbit_client import (
+    fetch_steps_range,
+    fetch_sleep_hours_range,
+    fetch_resting_heart_rate_range,
+    FitbitRateLimitError,
+)
+from fitbit_sync import store_daily_summary
+from fitbit_tokens import fitbit_token_manager
+from fitbit_ratelimit import background_priority
+
+FITBIT_BACKFILL_DAYS = int(os.getenv("FITBIT_BACKFILL_DAYS", "365"))
+FITBIT_BACKFILL_CHUNK_DAYS = int(os.getenv("FITBIT_BACKFILL_CHUNK_DAYS", "100"))
+FITBIT_BACKFILL_CONCURRENCY = int(os.getenv("FITBIT_BACKFILL_CONCURRENCY", "2"))
+FITBIT_BACKFILL_ON_CONNECT = os.getenv("FITBIT_BACKFILL_ON_CONNECT", "true").lower() in ("1", "true", "yes")
+
+UNFINISHED_STATUSES = ("pending", "running", "rate_limited")
+# A failed job is not restarted automatically, but asking for a backfill again resumes it
+RESUMABLE_STATUSES = UNFINISHED_STATUSES + ("failed",)
+UPSERT_COLUMNS = ("heart_rate", "sleep_hours", "steps", "calories_burned", "recorded_at", "source")
+
+
+def merge_daily_series(start: date, end: date, steps: dict, sleep_hours: dict, heart_rate: dict) -> list:
+    """One fitbit_data row per day that has data in any of the three series"""
+    recorded_at = datetime.utcnow()
+    rows = []
+    day = start
+    while day <= end:
+        key = day.isoformat()
+        day_steps = steps.get(key, 0)
+        day_sleep = sleep_hours.get(key, 0.0)
+        day_heart = heart_rate.get(key, 0)
+        if day_steps or day_sleep or day_heart:
+            rows.append({
+                "data_date": day,
+                "steps": day_steps,
+                "sleep_hours": day_sleep,
+                "heart_rate": day_heart,
+                "calories_burned": day_steps * 0.04,
+                "recorded_at": recorded_at,
+                "is_manual_edit": False,
+                "source": "fitbit",
+            })
+        day += timedelta(days=1)
+    return rows
+
+
+def upsert_fitbit_rows(db, user_id: int, rows: list) -> int:
+    """Insert or update rows on (user_id, data_date) in one statement, skipping manual edits"""
+    if not rows:
+        return 0
+    values = [dict(row, user_id=user_id) for row in rows]
+    dialect = db.get_bind().dialect.name
+    keep_manual = func.coalesce(FitbitData.is_manual_edit, False)
+
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+        stmt = mysql_insert(FitbitData).values(values)
+        # ON DUPLICATE KEY UPDATE has no WHERE clause, so keep the stored
+        # value column by column when the existing row is a manual edit
+        stmt = stmt.on_duplicate_key_update({
+            column: case((keep_manual, getattr(FitbitData, column)), else_=stmt.inserted[column])
+            for column in UPSERT_COLUMNS
+        })
+    elif dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+
+        stmt = dialect_insert(FitbitData).values(values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[FitbitData.user_id, FitbitData.data_date],
+            set_={column: stmt.excluded[column] for column in UPSERT_COLUMNS},
+            where=keep_manual == False,  # noqa: E712
+        )
+    else:
+        for row in rows:
+            store_daily_summary(db, user_id, row["data_date"], row)
+        return len(rows)
+
+    db.execute(stmt)
+    return len(rows)
+
+
+def job_progress(job: FitbitBackfillJob) -> dict:
+    days_total = (job.end_date - job.start_date).days + 1
+    return {
+        "job_id": job.id,
+        "user_id": job.user_id,
+        "status": job.status,
+        "start_date": job.start_date.isoformat(),
+        "end_date": job.end_date.isoformat(),
+        "next_date": job.next_date.isoformat(),
+        "days_total": days_total,
+        "days_done": job.days_done,
+        "percent": round(100 * job.days_done / days_total, 1) if days_total else 100.0,
+        "rows_written": job.rows_written,
+        "error": job.error,
+        "updated_at": job.updated_at.isoformat() if job.updated_at else None,
+    }
+
+
+class FitbitBackfillService:
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        chunk_days: int = FITBIT_BACKFILL_CHUNK_DAYS,
+        concurrency: int = FITBIT_BACKFILL_CONCURRENCY,
+        token_manager=None,
+    ):
+        self.session_factory = session_factory
+        self.token_manager = token_manager or fitbit_token_manager
+        self.chunk_days = chunk_days
+        self.concurrency = concurrency
+        self._tasks = {}  # job_id -> asyncio.Task
+        self._slots = None
+
+    def create_job(self, user_id: int, days: int = FITBIT_BACKFILL_DAYS) -> dict:
+        """Queue a backfill of the last `days` days, or return the user's unfinished job (blocking)"""
+        db = self.session_factory()
+        try:
+            job = db.query(FitbitBackfillJob).filter(
+                FitbitBackfillJob.user_id == user_id,
+                FitbitBackfillJob.status.in_(RESUMABLE_STATUSES)
+            ).order_by(FitbitBackfillJob.id.desc()).first()
+
+            if job is None:
+                end_date = date.today() - timedelta(days=1)  # today belongs to the daily sync
+                start_date = end_date - timedelta(days=max(days, 1) - 1)
+                job = FitbitBackfillJob(
+                    user_id=user_id,
+                    start_date=start_date,
+                    end_date=end_date,
+                    next_date=start_date,
+                    status="pending",
+                    days_done=0,
+                    rows_written=0,
+                    updated_at=datetime.now()
+                )
+                db.add(job)
+                db.commit()
+                db.refresh(job)
+            return job_progress(job)
+        finally:
+            db.close()
+
+    def latest_progress(self, user_id: int):
+        """Progress of the user's most recent backfill job, or None (blocking)"""
+        db = self.session_factory()
+        try:
+            job = db.query(FitbitBackfillJob).filter(
+                FitbitBackfillJob.user_id == user_id
+            ).order_by(FitbitBackfillJob.id.desc()).first()
+            return job_progress(job) if job else None
+        finally:
+            db.close()
+
+    def start(self, job_id: int):
+        """Run the job in the background, waiting out rate limits, unless it is already running"""
+        task = self._tasks.get(job_id)
+        if task is None or task.done():
+            self._tasks[job_id] = asyncio.get_running_loop().create_task(self._drive(job_id))
+
+    async def resume_unfinished(self):
+        """Restart jobs that were interrupted, e.g. by a server restart"""
+        job_ids = await asyncio.to_thread(self._unfinished_job_ids)
+        for job_id in job_ids:
+            self.start(job_id)
+        if job_ids:
+            print(f"🔄 Resuming {len(job_ids)} Fitbit backfill job(s)")
+
+    async def stop(self):
+        """Cancel running jobs; they keep their progress and resume on the next start"""
+        tasks = [task for task in self._tasks.values() if not task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    async def _drive(self, job_id: int):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+        while True:
+            async with self._slots:
+                with background_priority():
+                    progress = await self.run_job(job_id)
+            if progress is None or progress["status"] != "rate_limited":
+                return
+            await asyncio.sleep(progress["retry_after"])
+
+    async def run_job(self, job_id: int):
+        """Fetch and write the remaining chunks of a job; returns its final progress"""
+        loaded = await asyncio.to_thread(self._load_job, job_id)
+        if loaded is None:
+            return None
+        progress = loaded
+        if progress["status"] == "completed":
+            return progress
+
+        next_date = date.fromisoformat(progress["next_date"])
+        end_date = date.fromisoformat(progress["end_date"])
+        while next_date <= end_date:
+            chunk_end = min(next_date + timedelta(days=self.chunk_days - 1), end_date)
+            start, end = next_date.isoformat(), chunk_end.isoformat()
+            try:
+                steps, sleep_hours, heart_rate = await self.token_manager.call(
+                    progress["user_id"],
+                    lambda fitbit_user_id, access_token: asyncio.gather(
+                        fetch_steps_range(fitbit_user_id, access_token, start, end),
+                        fetch_sleep_hours_range(fitbit_user_id, access_token, start, end),
+                        fetch_resting_heart_rate_range(fitbit_user_id, access_token, start, end),
+                    )
+                )
+                rows = merge_daily_series(next_date, chunk_end, steps, sleep_hours, heart_rate)
+                progress = await asyncio.to_thread(self._write_chunk, job_id, rows, chunk_end)
+            except FitbitRateLimitError as e:
+                print(f"⏳ Fitbit backfill {job_id} rate limited, resuming in {e.retry_after:.0f}s")
+                progress = await asyncio.to_thread(self._set_status, job_id, "rate_limited", str(e))
+                progress["retry_after"] = e.retry_after
+                return progress
+            except Exception as e:
+                print(f"❌ Fitbit backfill {job_id} failed at {start}: {e}")
+                return await asyncio.to_thread(self._set_status, job_id, "failed", str(e))
+
+            print(f"📥 Fitbit backfill {job_id}: {progress['days_done']}/{progress['days_total']} days "
+                  f"({progress['percent']}%), {progress['rows_written']} rows")
+            next_date = chunk_end + timedelta(days=1)
+
+        return progress
+
+    def _unfinished_job_ids(self) -> list:
+        db = self.session_factory()
+        try:
+            return [row.id for row in db.query(FitbitBackfillJob.id).filter(
+                FitbitBackfillJob.status.in_(UNFINISHED_STATUSES)
+            ).all()]
+        finally:
+            db.close()
+
+    def _load_job(self, job_id: int):
+        db = self.session_factory()
+        try:
+            job = db.query(FitbitBackfillJob).filter(FitbitBackfillJob.id == job_id).first()
+            if job is None:
+                return None
+            if job.status != "completed":
+                job.status = "running"
+                job.updated_at = datetime.now()
+                db.commit()
+            return job_progress(job)
+        finally:
+            db.close()
+
+    def _write_chunk(self, job_id: int, rows: list, chunk_end: date) -> dict:
+        # Rows and the job's resume point are committed together
+        db = self.session_factory()
+        try:
+            job = db.query(FitbitBackfillJob).filter(FitbitBackfillJob.id == job_id).first()
+            written = upsert_fitbit_rows(db, job.user_id, rows)
+            job.next_date = chunk_end + timedelta(days=1)
+            job.days_done = (chunk_end - job.start_date).days + 1
+            job.rows_written += written
+            job.error = None
+            job.updated_at = datetime.now()
+            if job.next_date > job.end_date:
+                job.status = "completed"
+            db.commit()
+            return job_progress(job)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _set_status(self, job_id: int, status: str, error: str = None) -> dict:
+        db = self.session_factory()
+        try:
+            job = db.query(FitbitBackfillJob).filter(FitbitBackfillJob.id == job_id).first()
+            job.status = status
+            job.error = error
+            job.updated_at = datetime.now()
+            db.commit()
+            return job_progress(job)
+        finally:
+            db.close()
+
+
+fitbit_backfill_service = FitbitBackfillService()
@@ -0,0 +1,179 @@
+"""
+Response cache under the Fitbit client.
+
+Daily summaries for a day that is over do not change, and today's change at
+most every few minutes, so successful GET responses are cached keyed by the
+request path, which carries the Fitbit user, the resource and the date(s).
+
+* Responses whose last date is at least FITBIT_CACHE_SETTLE_DAYS old never
+  expire. Trackers sync late, so the most recent day(s) are not treated as
+  closed straight away.
+* Anything newer lives for FITBIT_CACHE_TODAY_TTL_SECONDS. Once that runs
+  out, the entry is revalidated with If-None-Match / If-Modified-Since when
+  Fitbit sent an ETag or Last-Modified. A 304 keeps the cached body.
+
+Entries are held in an in-process LRU. If FITBIT_CACHE_DIR is set, closed-day
+entries are also written to a SQLite file there, so they survive restarts and
+are shared between worker processes.
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+
+FITBIT_CACHE_ENABLED = os.getenv("FITBIT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+FITBIT_CACHE_TODAY_TTL_SECONDS = float(os.getenv("FITBIT_CACHE_TODAY_TTL_SECONDS", "300"))
+FITBIT_CACHE_SETTLE_DAYS = int(os.getenv("FITBIT_CACHE_SETTLE_DAYS", "1"))
+FITBIT_CACHE_MAX_ENTRIES = int(os.getenv("FITBIT_CACHE_MAX_ENTRIES", "20000"))
+FITBIT_CACHE_DIR = os.getenv("FITBIT_CACHE_DIR") or None
+
+ISO_DATE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+class CachedResponse:
+    __slots__ = ("body", "content_type", "etag", "last_modified", "expires_at")
+
+    def __init__(self, body: bytes, content_type: str, etag=None, last_modified=None, expires_at=None):
+        self.body = body
+        self.content_type = content_type
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires_at = expires_at  # monotonic deadline; None for closed days
+
+    def expired(self) -> bool:
+        return self.expires_at is not None and self.expires_at < time.monotonic()
+
+    def validators(self) -> dict:
+        """Conditional request headers for revalidating this entry"""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class FitbitResponseCache:
+    def __init__(
+        self,
+        max_entries: int = FITBIT_CACHE_MAX_ENTRIES,
+        today_ttl: float = FITBIT_CACHE_TODAY_TTL_SECONDS,
+        settle_days: int = FITBIT_CACHE_SETTLE_DAYS,
+        cache_dir: str = FITBIT_CACHE_DIR,
+    ):
+        self.max_entries = max_entries
+        self.today_ttl = today_ttl
+        self.settle_days = settle_days
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = None
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self._disk = sqlite3.connect(os.path.join(cache_dir, "fitbit_responses.sqlite3"), check_same_thread=False)
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS responses (path TEXT PRIMARY KEY, body BLOB, content_type TEXT)"
+            )
+            self._disk.commit()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.revalidated = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def is_closed(self, path: str) -> bool:
+        """True when every date in the path is old enough that its data will not change"""
+        dates = ISO_DATE.findall(path)
+        if not dates:
+            return False
+        return max(date.fromisoformat(day) for day in dates) <= date.today() - timedelta(days=self.settle_days)
+
+    def get(self, path: str):
+        """The cached entry for a path (possibly expired, for revalidation), or None"""
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None:
+                self._entries.move_to_end(path)
+        if entry is None and self._disk is not None:
+            entry = self._disk_get(path)
+            if entry is not None:
+                self._remember(path, entry)
+                self.disk_hits += 1
+                return entry
+        if entry is None or entry.expired():
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def put(self, path: str, body: bytes, content_type: str, etag=None, last_modified=None):
+        closed = self.is_closed(path)
+        entry = CachedResponse(
+            body, content_type, etag, last_modified,
+            expires_at=None if closed else time.monotonic() + self.today_ttl
+        )
+        self._remember(path, entry)
+        self.stores += 1
+        if closed and self._disk is not None:
+            self._disk_put(path, entry)
+
+    def revalidated_entry(self, entry: CachedResponse):
+        """A 304 confirmed the entry; keep serving it for another TTL"""
+        self.revalidated += 1
+        entry.expires_at = time.monotonic() + self.today_ttl
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _remember(self, path: str, entry: CachedResponse):
+        with self._lock:
+            self._entries[path] = entry
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _disk_get(self, path: str):
+        with self._lock:
+            row = self._disk.execute(
+                "SELECT body, content_type FROM responses WHERE path = ?", (path,)
+            ).fetchone()
+        return CachedResponse(row[0], row[1]) if row else None
+
+    def _disk_put(self, path: str, entry: CachedResponse):
+        try:
+            with self._lock:
+                self._disk.execute(
+                    "INSERT OR REPLACE INTO responses (path, body, content_type) VALUES (?, ?, ?)",
+                    (path, entry.body, entry.content_type)
+                )
+                self._disk.commit()
+        except sqlite3.Error as e:
+            print(f"❌ Fitbit cache disk write failed: {e}")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "enabled": FITBIT_CACHE_ENABLED,
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "today_ttl_seconds": self.today_ttl,
+            "disk": self._disk is not None,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0,
+            "revalidations": self.revalidations,
+            "revalidated": self.revalidated,
+            "stores": self.stores,
+            "evictions": self.evictions,
+        }
+
+
+fitbit_response_cache = FitbitResponseCache()
@@ -0,0 +1,275 @@
+"""
+Shared asynchronous HTTP client for the Fitbit Web API.
+
+One connection-pooled httpx.AsyncClient is reused for every call, so Fitbit
+requests no longer block the event loop or pay a fresh TCP/TLS handshake each
+time. FITBIT_API_BASE_URL (or set_http_client) points the client at a local
+stub server for tests and benchmarks; see fitbit_stub.py. Successful GETs go
+through the response cache in fitbit_cache.py.
+"""
+import asyncio
+import base64
+import os
+
+import httpx
+from dotenv import load_dotenv
+
+from fitbit_cache import fitbit_response_cache, FITBIT_CACHE_ENABLED
+from fitbit_ratelimit import fitbit_rate_limiter, backoff_delay, FitbitRateLimitError
+
+load_dotenv()
+
+FITBIT_CLIENT_ID = os.getenv("FITBIT_CLIENT_ID")
+FITBIT_CLIENT_SECRET = os.getenv("FITBIT_CLIENT_SECRET")
+
+FITBIT_API_BASE_URL = os.getenv("FITBIT_API_BASE_URL", "https://api.fitbit.com")
+FITBIT_HTTP_TIMEOUT = float(os.getenv("FITBIT_HTTP_TIMEOUT", "10"))
+FITBIT_HTTP_CONNECT_TIMEOUT = float(os.getenv("FITBIT_HTTP_CONNECT_TIMEOUT", "5"))
+FITBIT_HTTP_MAX_CONNECTIONS = int(os.getenv("FITBIT_HTTP_MAX_CONNECTIONS", "50"))
+FITBIT_HTTP_MAX_KEEPALIVE = int(os.getenv("FITBIT_HTTP_MAX_KEEPALIVE", "20"))
+
+_http_client = None
+
+
+class FitbitAuthError(Exception):
+    """Fitbit rejected the access token (401); it needs refreshing"""
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """The shared client, created on first use"""
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            base_url=FITBIT_API_BASE_URL,
+            timeout=httpx.Timeout(FITBIT_HTTP_TIMEOUT, connect=FITBIT_HTTP_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=FITBIT_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=FITBIT_HTTP_MAX_KEEPALIVE,
+            ),
+        )
+    return _http_client
+
+
+def set_http_client(client: httpx.AsyncClient):
+    """Swap in another client, e.g. one bound to a stub server or MockTransport"""
+    global _http_client
+    _http_client = client
+    # Cached responses and quota state belong to whatever the previous client pointed at
+    fitbit_response_cache.clear()
+    fitbit_rate_limiter.reset()
+
+
+async def close_http_client():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+def auth_headers(access_token: str) -> dict:
+    return {
+        "Authorization": f"Bearer {access_token}",
+        "Accept": "application/json"
+    }
+
+
+async def fitbit_get(path: str, access_token: str, timeout: float = None, use_cache: bool = True) -> httpx.Response:
+    """GET a Fitbit API path with the user's bearer token, through the response cache"""
+    use_cache = use_cache and FITBIT_CACHE_ENABLED
+    cached = fitbit_response_cache.get(path) if use_cache else None
+    if cached is not None and not cached.expired():
+        return cached_response(path, cached)
+
+    headers = auth_headers(access_token)
+    if cached is not None and cached.validators():
+        headers.update(cached.validators())
+        fitbit_response_cache.revalidations += 1
+
+    for attempt in range(fitbit_rate_limiter.retry_attempts + 1):
+        # Queues for the user's and the global token bucket, or sheds the call
+        await fitbit_rate_limiter.acquire(path)
+        last_attempt = attempt == fitbit_rate_limiter.retry_attempts
+        try:
+            response = await get_http_client().get(
+                path,
+                headers=headers,
+                timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT,
+            )
+        except httpx.TransportError:
+            if last_attempt:
+                raise
+            fitbit_rate_limiter.retries += 1
+            await asyncio.sleep(backoff_delay(attempt))
+            continue
+
+        fitbit_rate_limiter.observe(path, response.headers)
+        if response.status_code == 429:
+            retry_after = retry_after_seconds(response)
+            fitbit_rate_limiter.blocked(path, retry_after)
+            if last_attempt or not fitbit_rate_limiter.enabled or retry_after > fitbit_rate_limiter.max_wait():
+                raise FitbitRateLimitError(retry_after)
+            # The next acquire() waits out the reset
+            fitbit_rate_limiter.retries += 1
+            continue
+        if response.status_code >= 500 and not last_attempt:
+            fitbit_rate_limiter.retries += 1
+            await asyncio.sleep(backoff_delay(attempt))
+            continue
+        break
+
+    if response.status_code == 401:
+        raise FitbitAuthError(f"Fitbit rejected the access token for {path}")
+    if cached is not None and response.status_code == 304:
+        fitbit_response_cache.revalidated_entry(cached)
+        return cached_response(path, cached)
+    if use_cache and response.status_code == 200:
+        fitbit_response_cache.put(
+            path,
+            response.content,
+            response.headers.get("content-type", "application/json"),
+            etag=response.headers.get("etag"),
+            last_modified=response.headers.get("last-modified"),
+        )
+    return response
+
+
+def cached_response(path: str, entry) -> httpx.Response:
+    return httpx.Response(
+        200,
+        content=entry.body,
+        headers={"content-type": entry.content_type, "x-cache": "hit"},
+        request=httpx.Request("GET", get_http_client().base_url.join(path)),
+    )
+
+
+def retry_after_seconds(response: httpx.Response, default: float = 60) -> float:
+    """Seconds until Fitbit will accept requests again, from the response headers"""
+    for header in ("Retry-After", "Fitbit-Rate-Limit-Reset"):
+        value = response.headers.get(header)
+        if value is not None:
+            try:
+                return max(float(value), 0)
+            except ValueError:
+                pass
+    return default
+
+
+async def fitbit_token_request(form: dict) -> httpx.Response:
+    """POST to the OAuth token endpoint with the app's Basic credentials"""
+    auth_str = base64.b64encode(f"{FITBIT_CLIENT_ID}:{FITBIT_CLIENT_SECRET}".encode()).decode()
+    return await get_http_client().post(
+        "/oauth2/token",
+        headers={
+            "Authorization": f"Basic {auth_str}",
+            "Content-Type": "application/x-www-form-urlencoded"
+        },
+        data=form,
+    )
+
+
+async def fetch_steps(fitbit_user_id: str, access_token: str, day: str) -> int:
+    try:
+        response = await fitbit_get(
+            f"/1/user/{fitbit_user_id}/activities/steps/date/{day}/1d.json", access_token
+        )
+        if response.status_code == 200:
+            steps_data = response.json()
+            if steps_data["activities-steps"]:
+                return int(steps_data["activities-steps"][0]["value"])
+        else:
+            print(f"❌ Fitbit steps request failed: {response.status_code}")
+    except (FitbitRateLimitError, FitbitAuthError):
+        raise
+    except Exception as e:
+        print(f"❌ Error fetching steps: {e}")
+    return 0
+
+
+async def fetch_sleep_hours(fitbit_user_id: str, access_token: str, day: str) -> float:
+    try:
+        response = await fitbit_get(
+            f"/1.2/user/{fitbit_user_id}/sleep/date/{day}.json", access_token
+        )
+        if response.status_code == 200:
+            sleep_data = response.json()
+            if sleep_data["sleep"]:
+                total_minutes = sum(sleep["minutesAsleep"] for sleep in sleep_data["sleep"])
+                return round(total_minutes / 60, 1)
+        else:
+            print(f"❌ Fitbit sleep request failed: {response.status_code}")
+    except (FitbitRateLimitError, FitbitAuthError):
+        raise
+    except Exception as e:
+        print(f"❌ Error fetching sleep: {e}")
+    return 0.0
+
+
+async def fetch_resting_heart_rate(fitbit_user_id: str, access_token: str, day: str) -> int:
+    try:
+        response = await fitbit_get(
+            f"/1/user/{fitbit_user_id}/activities/heart/date/{day}/1d.json", access_token
+        )
+        if response.status_code == 200:
+            heart_data = response.json()
+            if heart_data["activities-heart"]:
+                resting_heart_rate = heart_data["activities-heart"][0]["value"].get("restingHeartRate")
+                if resting_heart_rate:
+                    return resting_heart_rate
+        else:
+            print(f"❌ Fitbit heart rate request failed: {response.status_code}")
+    except (FitbitRateLimitError, FitbitAuthError):
+        raise
+    except Exception as e:
+        print(f"❌ Error fetching heart rate: {e}")
+    return 0
+
+
+async def fetch_daily_summary(fitbit_user_id: str, access_token: str, day: str) -> dict:
+    """Steps, sleep and resting heart rate for one day, fetched concurrently"""
+    steps, sleep_hours, heart_rate = await asyncio.gather(
+        fetch_steps(fitbit_user_id, access_token, day),
+        fetch_sleep_hours(fitbit_user_id, access_token, day),
+        fetch_resting_heart_rate(fitbit_user_id, access_token, day),
+    )
+    return {"steps": steps, "sleep_hours": sleep_hours, "heart_rate": heart_rate}
+
+
+# Range (time series) fetchers used by the historical backfill. Unlike the
+# single-day fetchers above they raise on any failed call instead of returning
+# zeros, so a failed chunk is retried rather than written as empty days.
+
+async def fetch_steps_range(fitbit_user_id: str, access_token: str, start: str, end: str) -> dict:
+    """Daily steps keyed by ISO date"""
+    response = await fitbit_get(
+        f"/1/user/{fitbit_user_id}/activities/steps/date/{start}/{end}.json", access_token
+    )
+    response.raise_for_status()
+    return {
+        entry["dateTime"]: int(entry["value"])
+        for entry in response.json().get("activities-steps", [])
+    }
+
+
+async def fetch_sleep_hours_range(fitbit_user_id: str, access_token: str, start: str, end: str) -> dict:
+    """Hours asleep keyed by ISO date, summing every sleep log of the day"""
+    response = await fitbit_get(
+        f"/1.2/user/{fitbit_user_id}/sleep/date/{start}/{end}.json", access_token
+    )
+    response.raise_for_status()
+    minutes = {}
+    for sleep in response.json().get("sleep", []):
+        minutes[sleep["dateOfSleep"]] = minutes.get(sleep["dateOfSleep"], 0) + sleep["minutesAsleep"]
+    return {day: round(total / 60, 1) for day, total in minutes.items()}
+
+
+async def fetch_resting_heart_rate_range(fitbit_user_id: str, access_token: str, start: str, end: str) -> dict:
+    """Resting heart rate keyed by ISO date, for days where Fitbit reports one"""
+    response = await fitbit_get(
+        f"/1/user/{fitbit_user_id}/activities/heart/date/{start}/{end}.json", access_token
+    )
+    response.raise_for_status()
+    return {
+        entry["dateTime"]: entry["value"]["restingHeartRate"]
+        for entry in response.json().get("activities-heart", [])
+        if entry.get("value", {}).get("restingHeartRate")
+    }
@@ -0,0 +1,246 @@
+"""
+Client-side rate limiting for Fitbit API calls.
+
+Fitbit allows each user about 150 calls an hour and reports what is left in
+Fitbit-Rate-Limit-Limit / -Remaining / -Reset headers. FitbitRateLimiter keeps
+a token bucket per Fitbit user plus a global bucket for the whole app, and
+re-syncs each user's bucket from those headers. Before a call goes out it waits
+for a token, and it sheds the call (raising FitbitRateLimitError) when the wait
+would exceed the caller's budget. The quota is therefore spent deliberately
+instead of being burned on 429s.
+
+Calls are either foreground (dashboard requests, the default) or background
+(sync and backfill, marked with background_priority()). Background calls
+leave FITBIT_RATE_LIMIT_FOREGROUND_RESERVE of each user's bucket untouched and
+step aside while any foreground call is waiting for the global bucket.
+"""
+import asyncio
+import contextvars
+import os
+import random
+import re
+import time
+from contextlib import contextmanager
+
+FITBIT_RATE_LIMIT_ENABLED = os.getenv("FITBIT_RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+FITBIT_RATE_LIMIT_PER_USER_HOURLY = float(os.getenv("FITBIT_RATE_LIMIT_PER_USER_HOURLY", "150"))
+FITBIT_RATE_LIMIT_GLOBAL_PER_SECOND = float(os.getenv("FITBIT_RATE_LIMIT_GLOBAL_PER_SECOND", "20"))
+FITBIT_RATE_LIMIT_GLOBAL_BURST = float(os.getenv("FITBIT_RATE_LIMIT_GLOBAL_BURST", "40"))
+# Share of each user's hourly quota that only foreground calls may use
+FITBIT_RATE_LIMIT_FOREGROUND_RESERVE = float(os.getenv("FITBIT_RATE_LIMIT_FOREGROUND_RESERVE", "0.2"))
+# How long a call may queue for a token before it is shed
+FITBIT_RATE_LIMIT_FOREGROUND_MAX_WAIT = float(os.getenv("FITBIT_RATE_LIMIT_FOREGROUND_MAX_WAIT", "2"))
+FITBIT_RATE_LIMIT_BACKGROUND_MAX_WAIT = float(os.getenv("FITBIT_RATE_LIMIT_BACKGROUND_MAX_WAIT", "30"))
+# Retries of 429 / 5xx / transport errors, with full-jitter exponential backoff
+FITBIT_RETRY_ATTEMPTS = int(os.getenv("FITBIT_RETRY_ATTEMPTS", "3"))
+FITBIT_RETRY_BASE_SECONDS = float(os.getenv("FITBIT_RETRY_BASE_SECONDS", "0.5"))
+FITBIT_RETRY_MAX_SECONDS = float(os.getenv("FITBIT_RETRY_MAX_SECONDS", "8"))
+
+FOREGROUND = "foreground"
+BACKGROUND = "background"
+
+
+class FitbitRateLimitError(Exception):
+    """Fitbit answered 429, or the call was shed locally; retry_after is how many seconds to wait"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Fitbit rate limit hit, retry after {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+_priority = contextvars.ContextVar("fitbit_priority", default=FOREGROUND)
+USER_IN_PATH = re.compile(r"/user/([^/]+)/")
+
+
+@contextmanager
+def background_priority():
+    """Mark Fitbit calls made inside this block (and tasks it spawns) as background traffic"""
+    token = _priority.set(BACKGROUND)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+def backoff_delay(attempt: int, base: float = FITBIT_RETRY_BASE_SECONDS, cap: float = FITBIT_RETRY_MAX_SECONDS) -> float:
+    """Full-jitter exponential backoff for retry number `attempt` (0-based)"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def user_key(path: str):
+    match = USER_IN_PATH.search(path)
+    return match.group(1) if match else None
+
+
+class TokenBucket:
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0  # set when Fitbit says the quota is exhausted
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_per_second)
+        self.updated = now
+
+    def wait_time(self, reserve: float = 0.0) -> float:
+        """Seconds until a token is available while keeping `reserve` tokens back"""
+        now = time.monotonic()
+        self._refill(now)
+        if self.blocked_until > now:
+            return self.blocked_until - now
+        if self.tokens - reserve >= 1:
+            return 0.0
+        if self.refill_per_second <= 0:
+            return float("inf")
+        return (1 + reserve - self.tokens) / self.refill_per_second
+
+    def take(self):
+        self.tokens -= 1
+
+    def sync(self, limit: float, remaining: float, reset_seconds: float):
+        """Adopt the quota Fitbit reports, which also accounts for calls made elsewhere"""
+        now = time.monotonic()
+        self._refill(now)
+        if limit > 0:
+            self.capacity = limit
+            if reset_seconds > 0:
+                # Refill what is missing by the time the window resets
+                self.refill_per_second = max(limit - remaining, 1) / reset_seconds
+        self.tokens = min(self.tokens, remaining)
+        self.blocked_until = now + reset_seconds if remaining < 1 else 0.0
+
+    def block_for(self, seconds: float):
+        # Fitbit's window resets after `seconds`; until then nothing goes out
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class FitbitRateLimiter:
+    def __init__(
+        self,
+        per_user_hourly: float = FITBIT_RATE_LIMIT_PER_USER_HOURLY,
+        global_per_second: float = FITBIT_RATE_LIMIT_GLOBAL_PER_SECOND,
+        global_burst: float = FITBIT_RATE_LIMIT_GLOBAL_BURST,
+        foreground_reserve: float = FITBIT_RATE_LIMIT_FOREGROUND_RESERVE,
+        enabled: bool = FITBIT_RATE_LIMIT_ENABLED,
+    ):
+        self.per_user_hourly = per_user_hourly
+        self.foreground_reserve = foreground_reserve
+        self.enabled = enabled
+        self._global = TokenBucket(global_burst, global_per_second)
+        self._users = {}
+        self._foreground_waiting = 0
+
+        self.acquired = {FOREGROUND: 0, BACKGROUND: 0}
+        self.queued = {FOREGROUND: 0, BACKGROUND: 0}
+        self.shed = {FOREGROUND: 0, BACKGROUND: 0}
+        self.wait_seconds = {FOREGROUND: 0.0, BACKGROUND: 0.0}
+        self.header_syncs = 0
+        self.retries = 0
+        self.retry_attempts = FITBIT_RETRY_ATTEMPTS
+
+    def max_wait(self, priority: str = None) -> float:
+        """How long a call of this priority may queue before it is shed"""
+        if (priority or current_priority()) == FOREGROUND:
+            return FITBIT_RATE_LIMIT_FOREGROUND_MAX_WAIT
+        return FITBIT_RATE_LIMIT_BACKGROUND_MAX_WAIT
+
+    def reset(self):
+        """Forget all per-user state, e.g. when pointing the client at another server"""
+        self._users.clear()
+
+    def bucket_for(self, key: str) -> TokenBucket:
+        bucket = self._users.get(key)
+        if bucket is None:
+            bucket = TokenBucket(self.per_user_hourly, self.per_user_hourly / 3600)
+            self._users[key] = bucket
+        return bucket
+
+    def _wait_time(self, key, priority: str) -> float:
+        user_bucket = self.bucket_for(key) if key else None
+        if priority == BACKGROUND:
+            if self._foreground_waiting:
+                return 0.05
+            user_wait = user_bucket.wait_time(user_bucket.capacity * self.foreground_reserve) if user_bucket else 0.0
+        else:
+            user_wait = user_bucket.wait_time() if user_bucket else 0.0
+        return max(user_wait, self._global.wait_time())
+
+    async def acquire(self, path: str, priority: str = None, max_wait: float = None):
+        """Wait for a token for this call, or raise FitbitRateLimitError if it would take too long"""
+        if not self.enabled:
+            return
+        priority = priority or current_priority()
+        if max_wait is None:
+            max_wait = self.max_wait(priority)
+        key = user_key(path)
+        started = time.monotonic()
+        waiting = False
+        try:
+            while True:
+                wait = self._wait_time(key, priority)
+                if wait <= 0:
+                    if key:
+                        self.bucket_for(key).take()
+                    self._global.take()
+                    self.acquired[priority] += 1
+                    self.wait_seconds[priority] += time.monotonic() - started
+                    return
+                remaining_budget = max_wait - (time.monotonic() - started)
+                if wait > remaining_budget:
+                    self.shed[priority] += 1
+                    raise FitbitRateLimitError(wait)
+                if not waiting:
+                    waiting = True
+                    self.queued[priority] += 1
+                    if priority == FOREGROUND:
+                        self._foreground_waiting += 1
+                # Jittered so callers released by the same refill don't wake in lockstep
+                await asyncio.sleep(min(wait, 0.25) * random.uniform(0.8, 1.2))
+        finally:
+            if waiting and priority == FOREGROUND:
+                self._foreground_waiting -= 1
+
+    def observe(self, path: str, headers):
+        """Update the user's bucket from Fitbit-Rate-Limit-* response headers"""
+        key = user_key(path)
+        if not self.enabled or not key:
+            return
+        try:
+            limit = float(headers["Fitbit-Rate-Limit-Limit"])
+            remaining = float(headers["Fitbit-Rate-Limit-Remaining"])
+            reset_seconds = float(headers["Fitbit-Rate-Limit-Reset"])
+        except (KeyError, TypeError, ValueError):
+            return
+        self.bucket_for(key).sync(limit, remaining, reset_seconds)
+        self.header_syncs += 1
+
+    def blocked(self, path: str, retry_after: float):
+        """Fitbit answered 429: hold back this user's calls until the window resets"""
+        key = user_key(path)
+        if self.enabled and key:
+            self.bucket_for(key).block_for(retry_after)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "enabled": self.enabled,
+            "per_user_hourly": self.per_user_hourly,
+            "tracked_users": len(self._users),
+            "blocked_users": sum(1 for bucket in self._users.values() if bucket.blocked_until > now),
+            "global_tokens": round(self._global.tokens, 2),
+            "acquired": dict(self.acquired),
+            "queued": dict(self.queued),
+            "shed": dict(self.shed),
+            "wait_seconds": {priority: round(seconds, 3) for priority, seconds in self.wait_seconds.items()},
+            "header_syncs": self.header_syncs,
+            "retries": self.retries,
+        }
+
+
+fitbit_rate_limiter = FitbitRateLimiter()
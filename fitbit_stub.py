@@ -0,0 +1,96 @@
+"""
+Local stand-in for the Fitbit Web API, for tests and benchmarks.
+
+Run it with `uvicorn fitbit_stub:app --port 8765` and start the API with
+FITBIT_API_BASE_URL=http://localhost:8765, or mount it in-process with
+httpx.ASGITransport. FITBIT_STUB_LATENCY_MS adds a fixed delay to every call.
+"""
+import asyncio
+import os
+import zlib
+from datetime import date, timedelta
+
+from fastapi import FastAPI, Request
+
+FITBIT_STUB_LATENCY_MS = float(os.getenv("FITBIT_STUB_LATENCY_MS", "0"))
+
+app = FastAPI(title="Fitbit API stub")
+app.state.latency_ms = FITBIT_STUB_LATENCY_MS
+app.state.calls = 0
+app.state.token_refreshes = 0
+
+
+async def simulate_latency():
+    app.state.calls += 1
+    if app.state.latency_ms:
+        await asyncio.sleep(app.state.latency_ms / 1000)
+
+
+@app.get("/1/user/{user_id}/activities/steps/date/{day}/1d.json")
+async def steps(user_id: str, day: str):
+    await simulate_latency()
+    return {"activities-steps": [{"dateTime": day, "value": "8421"}]}
+
+
+@app.get("/1.2/user/{user_id}/sleep/date/{day}.json")
+async def sleep(user_id: str, day: str):
+    await simulate_latency()
+    return {"sleep": [{"dateOfSleep": day, "minutesAsleep": 402}, {"dateOfSleep": day, "minutesAsleep": 35}]}
+
+
+@app.get("/1/user/{user_id}/activities/heart/date/{day}/1d.json")
+async def heart(user_id: str, day: str):
+    await simulate_latency()
+    return {"activities-heart": [{"dateTime": day, "value": {"restingHeartRate": 64}}]}
+
+
+def days_between(start: str, end: str):
+    day, last = date.fromisoformat(start), date.fromisoformat(end)
+    while day <= last:
+        yield day.isoformat()
+        day += timedelta(days=1)
+
+
+def daily_value(user_id: str, day: str, low: int, high: int) -> int:
+    """Deterministic pseudo-random value so range responses are repeatable"""
+    return low + zlib.crc32(f"{user_id}:{day}:{low}".encode()) % (high - low + 1)
+
+
+@app.get("/1/user/{user_id}/activities/steps/date/{start}/{end}.json")
+async def steps_range(user_id: str, start: str, end: str):
+    await simulate_latency()
+    return {"activities-steps": [
+        {"dateTime": day, "value": str(daily_value(user_id, day, 2000, 14000))}
+        for day in days_between(start, end)
+    ]}
+
+
+@app.get("/1.2/user/{user_id}/sleep/date/{start}/{end}.json")
+async def sleep_range(user_id: str, start: str, end: str):
+    await simulate_latency()
+    return {"sleep": [
+        {"dateOfSleep": day, "minutesAsleep": daily_value(user_id, day, 240, 540)}
+        for day in days_between(start, end)
+    ]}
+
+
+@app.get("/1/user/{user_id}/activities/heart/date/{start}/{end}.json")
+async def heart_range(user_id: str, start: str, end: str):
+    await simulate_latency()
+    return {"activities-heart": [
+        {"dateTime": day, "value": {"restingHeartRate": daily_value(user_id, day, 55, 85)}}
+        for day in days_between(start, end)
+    ]}
+
+
+@app.post("/oauth2/token")
+async def token(request: Request):
+    await simulate_latency()
+    app.state.token_refreshes += 1
+    return {
+        "access_token": f"stub-access-{app.state.token_refreshes}",
+        "refresh_token": f"stub-refresh-{app.state.token_refreshes}",
+        "expires_in": 28800,
+        "token_type": "Bearer",
+        "user_id": "ABC123",
+    }
@@ -0,0 +1,252 @@
+"""
+Background Fitbit sync.
+
+Instead of calling Fitbit on every dashboard load, FitbitSyncService walks
+fitbit_connections on a jittered schedule and refreshes today's fitbit_data row
+for users whose data has gone stale. Users who opened the dashboard recently
+use a short staleness threshold, everyone else a long one. Syncs run with
+bounded concurrency, and users who hit Fitbit's rate limit (or keep failing)
+are backed off before they are tried again. /api/fitbit/data then serves the
+latest stored row and only nudges the service when that row is missing or stale.
+"""
+import asyncio
+import os
+import random
+import time
+from datetime import datetime, date, timedelta
+
+from database import SessionLocal
+from models import FitbitConnection, FitbitData
+from fitbit_client import fetch_daily_summary, FitbitRateLimitError
+from fitbit_tokens import fitbit_token_manager
+from fitbit_ratelimit import background_priority
+
+FITBIT_SYNC_ENABLED = os.getenv("FITBIT_SYNC_ENABLED", "true").lower() in ("1", "true", "yes")
+FITBIT_SYNC_INTERVAL_SECONDS = float(os.getenv("FITBIT_SYNC_INTERVAL_SECONDS", "300"))
+FITBIT_SYNC_JITTER_SECONDS = float(os.getenv("FITBIT_SYNC_JITTER_SECONDS", "30"))
+FITBIT_SYNC_CONCURRENCY = int(os.getenv("FITBIT_SYNC_CONCURRENCY", "5"))
+# Staleness thresholds for users seen on the dashboard recently vs. idle users
+FITBIT_SYNC_ACTIVE_STALE_MINUTES = float(os.getenv("FITBIT_SYNC_ACTIVE_STALE_MINUTES", "15"))
+FITBIT_SYNC_IDLE_STALE_MINUTES = float(os.getenv("FITBIT_SYNC_IDLE_STALE_MINUTES", "180"))
+FITBIT_SYNC_ACTIVE_WINDOW_MINUTES = float(os.getenv("FITBIT_SYNC_ACTIVE_WINDOW_MINUTES", "60"))
+FITBIT_SYNC_MAX_BACKOFF_SECONDS = float(os.getenv("FITBIT_SYNC_MAX_BACKOFF_SECONDS", "3600"))
+
+
+def store_daily_summary(db, user_id: int, day: date, summary: dict):
+    """Upsert the (non-manual) fitbit_data row for one day; manual edits are left alone"""
+    existing_fitbit_data = db.query(FitbitData).filter(
+        FitbitData.user_id == user_id,
+        FitbitData.data_date == day
+    ).first()
+
+    if existing_fitbit_data and existing_fitbit_data.is_manual_edit:
+        return existing_fitbit_data
+
+    if existing_fitbit_data:
+        existing_fitbit_data.heart_rate = summary["heart_rate"]
+        existing_fitbit_data.sleep_hours = summary["sleep_hours"]
+        existing_fitbit_data.steps = summary["steps"]
+        existing_fitbit_data.calories_burned = summary["steps"] * 0.04
+        existing_fitbit_data.recorded_at = datetime.utcnow()
+        return existing_fitbit_data
+
+    fitbit_data = FitbitData(
+        user_id=user_id,
+        heart_rate=summary["heart_rate"],
+        sleep_hours=summary["sleep_hours"],
+        steps=summary["steps"],
+        calories_burned=summary["steps"] * 0.04,
+        data_date=day,
+        is_manual_edit=False
+    )
+    db.add(fitbit_data)
+    return fitbit_data
+
+
+class FitbitSyncService:
+    def __init__(
+        self,
+        interval_seconds: float = FITBIT_SYNC_INTERVAL_SECONDS,
+        jitter_seconds: float = FITBIT_SYNC_JITTER_SECONDS,
+        concurrency: int = FITBIT_SYNC_CONCURRENCY,
+    ):
+        self.interval_seconds = interval_seconds
+        self.jitter_seconds = jitter_seconds
+        self.concurrency = concurrency
+
+        self._task = None
+        self._wake = None
+        self._last_seen = {}       # user_id -> monotonic time of last dashboard load
+        self._urgent = set()       # user_ids to sync on the next pass regardless of staleness
+        self._backoff_until = {}   # user_id -> monotonic time before which the user is skipped
+        self._failures = {}        # user_id -> consecutive failures
+
+        self.passes = 0
+        self.synced = 0
+        self.failed = 0
+        self.rate_limited = 0
+        self.last_pass_at = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._wake = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def mark_active(self, user_id: int):
+        """Record a dashboard load so this user gets the short staleness threshold"""
+        self._last_seen[user_id] = time.monotonic()
+
+    def request_sync(self, user_id: int):
+        """Sync this user on the next pass, which is started right away"""
+        self._urgent.add(user_id)
+        if self._wake is not None:
+            self._wake.set()
+
+    def staleness_for(self, user_id: int) -> timedelta:
+        last_seen = self._last_seen.get(user_id)
+        if last_seen is not None and time.monotonic() - last_seen < FITBIT_SYNC_ACTIVE_WINDOW_MINUTES * 60:
+            return timedelta(minutes=FITBIT_SYNC_ACTIVE_STALE_MINUTES)
+        return timedelta(minutes=FITBIT_SYNC_IDLE_STALE_MINUTES)
+
+    def is_stale(self, user_id: int, last_sync_at) -> bool:
+        return last_sync_at is None or datetime.utcnow() - last_sync_at > self.staleness_for(user_id)
+
+    async def _run(self):
+        # Spread the first pass of each worker so restarts don't sync in lockstep
+        await self._sleep(random.uniform(0, self.jitter_seconds))
+        while True:
+            try:
+                # Dashboard requests get first call on each user's Fitbit quota
+                with background_priority():
+                    await self.sync_due_users()
+            except Exception as e:
+                print(f"❌ Fitbit sync pass failed: {e}")
+            await self._sleep(self.interval_seconds + random.uniform(-self.jitter_seconds, self.jitter_seconds))
+
+    async def _sleep(self, seconds: float):
+        try:
+            await asyncio.wait_for(self._wake.wait(), max(seconds, 0))
+        except asyncio.TimeoutError:
+            pass
+        self._wake.clear()
+
+    async def sync_due_users(self):
+        connections = await asyncio.to_thread(self._load_connections)
+        now = time.monotonic()
+        urgent, self._urgent = self._urgent, set()
+
+        due = [
+            connection for connection in connections
+            if self._backoff_until.get(connection["user_id"], 0) <= now
+            and (connection["user_id"] in urgent or self.is_stale(connection["user_id"], connection["last_sync_at"]))
+        ]
+        # Urgent (dashboard-triggered) users go first, then the stalest
+        due.sort(key=lambda c: (c["user_id"] not in urgent, c["last_sync_at"] or datetime.min))
+
+        slots = asyncio.Semaphore(self.concurrency)
+
+        async def sync_with_slot(connection):
+            async with slots:
+                await self.sync_user(connection)
+
+        await asyncio.gather(*(sync_with_slot(connection) for connection in due))
+        self.passes += 1
+        self.last_pass_at = datetime.now()
+        if due:
+            print(f"🔄 Fitbit sync pass: {len(due)} of {len(connections)} connections due")
+
+    @staticmethod
+    def _load_connections() -> list:
+        db = SessionLocal()
+        try:
+            rows = db.query(
+                FitbitConnection.user_id,
+                FitbitConnection.fitbit_user_id,
+                FitbitConnection.access_token,
+                FitbitConnection.last_sync_at
+            ).all()
+            return [
+                {
+                    "user_id": row.user_id,
+                    "fitbit_user_id": row.fitbit_user_id,
+                    "access_token": row.access_token,
+                    "last_sync_at": row.last_sync_at
+                }
+                for row in rows
+                if row.access_token
+            ]
+        finally:
+            db.close()
+
+    async def sync_user(self, connection: dict) -> bool:
+        user_id = connection["user_id"]
+        today = date.today()
+        try:
+            summary = await fitbit_token_manager.call(
+                user_id,
+                lambda fitbit_user_id, access_token: fetch_daily_summary(fitbit_user_id, access_token, today.isoformat())
+            )
+            await asyncio.to_thread(self._save, user_id, today, summary)
+        except FitbitRateLimitError as e:
+            self.rate_limited += 1
+            self._back_off(user_id, e.retry_after)
+            print(f"⏳ Fitbit rate limit for user {user_id}, retrying in {e.retry_after:.0f}s")
+            return False
+        except Exception as e:
+            self.failed += 1
+            failures = self._failures.get(user_id, 0) + 1
+            self._failures[user_id] = failures
+            self._back_off(user_id, min(30 * 2 ** failures, FITBIT_SYNC_MAX_BACKOFF_SECONDS))
+            print(f"❌ Fitbit sync failed for user {user_id}: {e}")
+            return False
+
+        self.synced += 1
+        self._failures.pop(user_id, None)
+        self._backoff_until.pop(user_id, None)
+        return True
+
+    def _back_off(self, user_id: int, seconds: float):
+        jitter = random.uniform(0, min(seconds * 0.1, 60))
+        self._backoff_until[user_id] = time.monotonic() + seconds + jitter
+
+    @staticmethod
+    def _save(user_id: int, day: date, summary: dict):
+        db = SessionLocal()
+        try:
+            store_daily_summary(db, user_id, day, summary)
+            db.query(FitbitConnection).filter(FitbitConnection.user_id == user_id).update(
+                {FitbitConnection.last_sync_at: datetime.utcnow()}
+            )
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "enabled": FITBIT_SYNC_ENABLED,
+            "running": self._task is not None and not self._task.done(),
+            "interval_seconds": self.interval_seconds,
+            "concurrency": self.concurrency,
+            "passes": self.passes,
+            "synced": self.synced,
+            "failed": self.failed,
+            "rate_limited": self.rate_limited,
+            "backed_off_users": sum(1 for until in self._backoff_until.values() if until > now),
+            "last_pass_at": self.last_pass_at.isoformat() if self.last_pass_at else None,
+        }
+
+
+fitbit_sync_service = FitbitSyncService()
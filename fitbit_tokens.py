@@ -0,0 +1,175 @@
+"""
+Fitbit OAuth token manager.
+
+Access tokens are cached in memory per user and refreshed a few minutes before
+they expire instead of being used until Fitbit starts answering 401. Concurrent
+callers for the same user share a single refresh: Fitbit refresh tokens are
+single-use, so two parallel refreshes would invalidate each other. Refreshed
+tokens are written back to fitbit_connections in one transaction.
+"""
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+
+from database import SessionLocal
+from models import FitbitConnection
+from fitbit_client import fitbit_token_request, FitbitAuthError
+
+FITBIT_TOKEN_REFRESH_MARGIN_SECONDS = float(os.getenv("FITBIT_TOKEN_REFRESH_MARGIN_SECONDS", "300"))
+
+
+class FitbitTokenError(Exception):
+    """No usable token for the user: not connected, or Fitbit refused the refresh"""
+
+
+class CachedToken:
+    __slots__ = ("fitbit_user_id", "access_token", "refresh_token", "expires_at")
+
+    def __init__(self, fitbit_user_id, access_token, refresh_token, expires_at):
+        self.fitbit_user_id = fitbit_user_id
+        self.access_token = access_token
+        self.refresh_token = refresh_token
+        self.expires_at = expires_at
+
+    def fresh(self, margin_seconds: float) -> bool:
+        return self.expires_at - timedelta(seconds=margin_seconds) > datetime.now()
+
+
+class FitbitTokenManager:
+    def __init__(self, session_factory=SessionLocal, refresh_margin_seconds: float = FITBIT_TOKEN_REFRESH_MARGIN_SECONDS):
+        self.session_factory = session_factory
+        self.refresh_margin_seconds = refresh_margin_seconds
+        self._tokens = {}    # user_id -> CachedToken
+        self._inflight = {}  # user_id -> (loop, task) of the refresh in progress
+
+        self.hits = 0
+        self.loads = 0
+        self.refreshes = 0
+        self.shared_refreshes = 0
+        self.refresh_failures = 0
+
+    async def get_token(self, user_id: int) -> CachedToken:
+        """A token that stays valid for at least the refresh margin, refreshing it if needed"""
+        token = self._tokens.get(user_id)
+        if token is None:
+            token = await asyncio.to_thread(self._load, user_id)
+            self.loads += 1
+        else:
+            self.hits += 1
+        if token.fresh(self.refresh_margin_seconds):
+            return token
+        return await self.refresh(user_id)
+
+    async def refresh(self, user_id: int, force: bool = False) -> CachedToken:
+        """Refresh the user's token, joining a refresh that is already in flight"""
+        loop = asyncio.get_running_loop()
+        inflight = self._inflight.get(user_id)
+        if inflight is not None and inflight[0] is loop and not inflight[1].done():
+            self.shared_refreshes += 1
+            task = inflight[1]
+        else:
+            task = loop.create_task(self._refresh(user_id, force))
+            self._inflight[user_id] = (loop, task)
+            task.add_done_callback(lambda _: self._forget_inflight(user_id, task))
+        # A cancelled caller must not cancel the refresh other callers are waiting on
+        return await asyncio.shield(task)
+
+    async def call(self, user_id: int, fetch):
+        """Run fetch(fitbit_user_id, access_token), refreshing and retrying once on a 401"""
+        token = await self.get_token(user_id)
+        try:
+            return await fetch(token.fitbit_user_id, token.access_token)
+        except FitbitAuthError:
+            token = await self.refresh(user_id, force=True)
+            return await fetch(token.fitbit_user_id, token.access_token)
+
+    def store(self, user_id: int, fitbit_user_id: str, access_token: str, refresh_token: str, expires_at: datetime):
+        """Prime the cache with tokens that were just saved, e.g. by the OAuth callback"""
+        self._tokens[user_id] = CachedToken(fitbit_user_id, access_token, refresh_token, expires_at)
+
+    def invalidate(self, user_id: int):
+        self._tokens.pop(user_id, None)
+
+    def _forget_inflight(self, user_id: int, task):
+        inflight = self._inflight.get(user_id)
+        if inflight is not None and inflight[1] is task:
+            del self._inflight[user_id]
+
+    async def _refresh(self, user_id: int, force: bool) -> CachedToken:
+        # Another worker process may already have refreshed; its tokens are in the DB
+        cached = self._tokens.get(user_id)
+        token = await asyncio.to_thread(self._load, user_id)
+        if not force and token.fresh(self.refresh_margin_seconds):
+            return token
+        if force and cached is not None and token.access_token != cached.access_token:
+            return token
+
+        started = time.perf_counter()
+        response = await fitbit_token_request({
+            "grant_type": "refresh_token",
+            "refresh_token": token.refresh_token
+        })
+        if response.status_code != 200:
+            self.refresh_failures += 1
+            self.invalidate(user_id)
+            raise FitbitTokenError(f"Fitbit token refresh failed for user {user_id}: {response.status_code}")
+
+        token_data = response.json()
+        refreshed = CachedToken(
+            fitbit_user_id=token.fitbit_user_id,
+            access_token=token_data["access_token"],
+            refresh_token=token_data["refresh_token"],
+            expires_at=datetime.now() + timedelta(seconds=token_data["expires_in"])
+        )
+        await asyncio.to_thread(self._save, user_id, refreshed)
+        self._tokens[user_id] = refreshed
+        self.refreshes += 1
+        print(f"🔑 Refreshed Fitbit token for user {user_id} in {(time.perf_counter() - started) * 1000:.0f} ms")
+        return refreshed
+
+    def _load(self, user_id: int) -> CachedToken:
+        db = self.session_factory()
+        try:
+            connection = db.query(FitbitConnection).filter(FitbitConnection.user_id == user_id).first()
+            if connection is None or not connection.access_token:
+                raise FitbitTokenError(f"User {user_id} has no Fitbit connection")
+            token = CachedToken(
+                connection.fitbit_user_id,
+                connection.access_token,
+                connection.refresh_token,
+                connection.token_expires_at
+            )
+        finally:
+            db.close()
+        self._tokens[user_id] = token
+        return token
+
+    def _save(self, user_id: int, token: CachedToken):
+        db = self.session_factory()
+        try:
+            db.query(FitbitConnection).filter(FitbitConnection.user_id == user_id).update({
+                FitbitConnection.access_token: token.access_token,
+                FitbitConnection.refresh_token: token.refresh_token,
+                FitbitConnection.token_expires_at: token.expires_at
+            })
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def stats(self) -> dict:
+        return {
+            "cached_users": len(self._tokens),
+            "refresh_margin_seconds": self.refresh_margin_seconds,
+            "hits": self.hits,
+            "loads": self.loads,
+            "refreshes": self.refreshes,
+            "shared_refreshes": self.shared_refreshes,
+            "refresh_failures": self.refresh_failures,
+        }
+
+
+fitbit_token_manager = FitbitTokenManager()
@@ -0,0 +1,282 @@
+"""
+Multi-day stress forecasting.
+
+The stress classifier only scores one day's (heart_rate, sleep_hours, steps).
+This module forecasts forward from each user's stored history:
+
+1. load_daily_panel reads the last FORECAST_HISTORY_DAYS of fitbit_data and
+   mood_daily_rollup for every user with two bulk queries and lays them out
+   as one (user_id, day) frame. Every wearable day is scored by the stress
+   classifier in a single predict_proba pass, which gives a daily stress
+   probability series.
+2. build_features derives lags and rolling means of every signal with
+   grouped shifts and rolling windows over all users at once.
+3. One gradient-boosted regressor is trained on all users and horizons (the
+   horizon is a feature) to predict the stress probability h days ahead.
+4. The latest feature row of every user is scored for horizons 1..N in one
+   predict call and written to stress_forecasts.
+
+ForecastService repeats this every FORECAST_REFRESH_INTERVAL_SECONDS, so
+/api/stress/forecast only reads stored rows. While there is too little
+history to train on, each user's recent mean stress is carried forward
+instead (method "rolling_mean").
+
+Usage: python forecasting.py   (one refresh, e.g. from cron)
+"""
+import asyncio
+import os
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import HistGradientBoostingRegressor
+from sqlalchemy import delete, insert, select
+
+from database import SessionLocal
+from models import FitbitData, MoodDailyRollup, StressForecast
+
+FORECAST_ENABLED = os.getenv("FORECAST_ENABLED", "true").lower() in ("1", "true", "yes")
+FORECAST_HORIZON_DAYS = int(os.getenv("FORECAST_HORIZON_DAYS", "7"))
+FORECAST_HISTORY_DAYS = int(os.getenv("FORECAST_HISTORY_DAYS", "120"))
+FORECAST_REFRESH_INTERVAL_SECONDS = float(os.getenv("FORECAST_REFRESH_INTERVAL_SECONDS", "3600"))
+# Training rows are (user, day, horizon) triples; larger sets are sampled down
+FORECAST_MAX_TRAINING_ROWS = int(os.getenv("FORECAST_MAX_TRAINING_ROWS", "200000"))
+# With fewer labelled rows than this the rolling-mean baseline is used instead of a model
+FORECAST_MIN_TRAINING_ROWS = int(os.getenv("FORECAST_MIN_TRAINING_ROWS", "200"))
+# Users whose forecasts are replaced per transaction
+FORECAST_WRITE_BATCH_USERS = int(os.getenv("FORECAST_WRITE_BATCH_USERS", "1000"))
+
+WEARABLE_COLUMNS = ["heart_rate", "sleep_hours", "steps"]
+SIGNALS = ("stress", "heart_rate", "sleep_hours", "steps", "mood")
+# Days before the feature day; 0 is the day itself
+LAGS = (0, 1, 2, 6)
+WINDOWS = (3, 7, 14)
+# At or above this probability a forecast day is labelled High
+HIGH_STRESS_THRESHOLD = 0.5
+
+
+def stress_probabilities(wearables: pd.DataFrame) -> np.ndarray:
+    """P(High) from the stress classifier for every complete row in one pass; NaN elsewhere"""
+    from stress_model import registry
+
+    probabilities = np.full(len(wearables), np.nan)
+    complete = wearables.notna().all(axis=1).to_numpy()
+    if complete.any():
+        loaded = registry.get()
+        high = list(loaded.classes_).index(1)
+        probabilities[complete] = loaded.predict_proba(wearables.to_numpy(dtype=float)[complete])[:, high]
+    return probabilities
+
+
+def load_daily_panel(db, as_of: date, history_days: int = FORECAST_HISTORY_DAYS) -> pd.DataFrame:
+    """One row per (user_id, day) over the window, for every user with data in it"""
+    start = as_of - timedelta(days=history_days - 1)
+    wearables = pd.DataFrame(db.execute(
+        select(FitbitData.user_id, FitbitData.data_date, FitbitData.heart_rate, FitbitData.sleep_hours, FitbitData.steps)
+        .where(FitbitData.data_date.between(start, as_of))
+    ).all(), columns=["user_id", "day", *WEARABLE_COLUMNS])
+    moods = pd.DataFrame(db.execute(
+        select(MoodDailyRollup.user_id, MoodDailyRollup.entry_date, MoodDailyRollup.rating_sum, MoodDailyRollup.rating_count)
+        .where(MoodDailyRollup.entry_date.between(start, as_of))
+    ).all(), columns=["user_id", "day", "rating_sum", "rating_count"])
+
+    users = np.union1d(wearables["user_id"].to_numpy(dtype=np.int64), moods["user_id"].to_numpy(dtype=np.int64))
+    index = pd.MultiIndex.from_product([users, pd.date_range(start, as_of, freq="D")], names=["user_id", "day"])
+
+    wearables["day"] = pd.to_datetime(wearables["day"])
+    wearables = wearables.set_index(["user_id", "day"]).astype(float)
+    wearables["heart_rate"] = wearables["heart_rate"].where(wearables["heart_rate"] > 0)  # 0 means no reading
+    moods["day"] = pd.to_datetime(moods["day"])
+    moods["mood"] = moods["rating_sum"].astype(float) / moods["rating_count"].astype(float)
+    moods = moods.set_index(["user_id", "day"])[["mood"]]
+
+    panel = pd.concat([wearables, moods], axis=1).reindex(index)
+    panel["stress"] = stress_probabilities(panel[WEARABLE_COLUMNS])
+    return panel
+
+
+def build_features(panel: pd.DataFrame) -> pd.DataFrame:
+    """Lagged values and rolling statistics of every signal, per (user_id, day)"""
+    grouped = panel.groupby(level="user_id", sort=False)
+    columns = {}
+    for signal in SIGNALS:
+        for lag in LAGS:
+            columns[f"{signal}_lag{lag}"] = grouped[signal].shift(lag)
+        for window in WINDOWS:
+            columns[f"{signal}_mean{window}"] = grouped[signal].rolling(window, min_periods=1).mean().droplevel(0)
+    columns["stress_std7"] = grouped["stress"].rolling(7, min_periods=2).std().droplevel(0)
+    return pd.DataFrame(columns, index=panel.index)
+
+
+def with_horizon(features: pd.DataFrame, horizon: int) -> pd.DataFrame:
+    """Feature rows for predicting `horizon` days past their day"""
+    rows = features.copy()
+    rows["horizon"] = horizon
+    rows["target_weekday"] = (features.index.get_level_values("day") + pd.Timedelta(days=horizon)).dayofweek
+    return rows
+
+
+def training_set(panel: pd.DataFrame, features: pd.DataFrame, horizon_days: int,
+                 max_rows: int = FORECAST_MAX_TRAINING_ROWS, seed: int = 0):
+    """(X, y) over every user, day and horizon whose target day has a stress reading"""
+    stress = panel.groupby(level="user_id", sort=False)["stress"]
+    parts = []
+    for horizon in range(1, horizon_days + 1):
+        target = stress.shift(-horizon).to_numpy()
+        labelled = ~np.isnan(target)
+        part = with_horizon(features[labelled], horizon)
+        part["target"] = target[labelled]
+        parts.append(part)
+    data = pd.concat(parts, ignore_index=True)
+    if len(data) > max_rows:
+        data = data.sample(max_rows, random_state=seed)
+    return data.drop(columns="target"), data["target"].to_numpy()
+
+
+def fit_forecaster(X: pd.DataFrame, y: np.ndarray) -> HistGradientBoostingRegressor:
+    # Histogram boosting handles the NaNs of missing days and lags natively
+    return HistGradientBoostingRegressor(max_iter=200, learning_rate=0.05, random_state=0).fit(X, y)
+
+
+def forecast_frame(panel: pd.DataFrame, features: pd.DataFrame, as_of: date, horizon_days: int, model=None) -> pd.DataFrame:
+    """Stress probability for each user and horizon 1..horizon_days past as_of"""
+    latest = features[features.index.get_level_values("day") == pd.Timestamp(as_of)]
+    X = pd.concat([with_horizon(latest, horizon) for horizon in range(1, horizon_days + 1)])
+
+    if model is not None:
+        probabilities = model.predict(X)
+    else:
+        population = panel["stress"].mean()
+        fallback = HIGH_STRESS_THRESHOLD if np.isnan(population) else population
+        probabilities = X["stress_mean14"].fillna(fallback).to_numpy()
+
+    return pd.DataFrame({
+        "user_id": X.index.get_level_values("user_id"),
+        "horizon_days": X["horizon"].to_numpy(),
+        "stress_probability": np.clip(probabilities, 0.0, 1.0),
+    })
+
+
+def store_forecasts(session_factory, forecasts: pd.DataFrame, as_of: date, method: str, generated_at: datetime):
+    """Replace each user's stored forecasts, FORECAST_WRITE_BATCH_USERS users per transaction"""
+    user_ids = [int(user_id) for user_id in forecasts["user_id"].unique()]
+    for start in range(0, len(user_ids), FORECAST_WRITE_BATCH_USERS):
+        batch = user_ids[start:start + FORECAST_WRITE_BATCH_USERS]
+        rows = forecasts[forecasts["user_id"].isin(batch)]
+        records = [
+            {
+                "user_id": int(user_id),
+                "forecast_date": as_of + timedelta(days=int(horizon)),
+                "horizon_days": int(horizon),
+                "stress_probability": round(float(probability), 4),
+                "method": method,
+                "generated_at": generated_at,
+            }
+            for user_id, horizon, probability in rows[["user_id", "horizon_days", "stress_probability"]].itertuples(index=False)
+        ]
+        db = session_factory()
+        try:
+            db.execute(delete(StressForecast).where(StressForecast.user_id.in_(batch)))
+            db.execute(insert(StressForecast), records)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    # Users without recent data keep nothing older than today
+    db = session_factory()
+    try:
+        db.execute(delete(StressForecast).where(StressForecast.forecast_date <= as_of))
+        db.commit()
+    finally:
+        db.close()
+
+
+def run_forecast(session_factory=SessionLocal, as_of: date = None, horizon_days: int = FORECAST_HORIZON_DAYS) -> dict:
+    """Rebuild every user's forecast; returns a summary of the run"""
+    started = time.perf_counter()
+    as_of = as_of or date.today()
+
+    db = session_factory()
+    try:
+        panel = load_daily_panel(db, as_of)
+    finally:
+        db.close()
+
+    summary = {"as_of": as_of.isoformat(), "users": 0, "rows": 0, "training_rows": 0, "method": None}
+    if not panel.empty:
+        features = build_features(panel)
+        X, y = training_set(panel, features, horizon_days)
+        model = fit_forecaster(X, y) if len(y) >= FORECAST_MIN_TRAINING_ROWS else None
+        method = "model" if model is not None else "rolling_mean"
+
+        forecasts = forecast_frame(panel, features, as_of, horizon_days, model)
+        store_forecasts(session_factory, forecasts, as_of, method, datetime.now())
+        summary.update(
+            users=int(forecasts["user_id"].nunique()), rows=len(forecasts), training_rows=len(y), method=method
+        )
+
+    summary["seconds"] = round(time.perf_counter() - started, 2)
+    print(
+        f"🔮 Stress forecasts for {summary['users']} users, {horizon_days} days ahead "
+        f"({summary['method']}, {summary['training_rows']} training rows) in {summary['seconds']}s"
+    )
+    return summary
+
+
+class ForecastService:
+    """Refreshes stress_forecasts in the background on a fixed interval"""
+
+    def __init__(self, interval_seconds: float = FORECAST_REFRESH_INTERVAL_SECONDS):
+        self.interval_seconds = interval_seconds
+        self._task = None
+        self.runs = 0
+        self.failures = 0
+        self.last_run_at = None
+        self.last_summary = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                self.last_summary = await asyncio.to_thread(run_forecast)
+                self.runs += 1
+                self.last_run_at = datetime.now()
+            except Exception as e:
+                self.failures += 1
+                print(f"❌ Stress forecast refresh failed: {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": FORECAST_ENABLED,
+            "running": self._task is not None and not self._task.done(),
+            "interval_seconds": self.interval_seconds,
+            "horizon_days": FORECAST_HORIZON_DAYS,
+            "runs": self.runs,
+            "failures": self.failures,
+            "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+            "last_run": self.last_summary,
+        }
+
+
+forecast_service = ForecastService()
+
+
+if __name__ == "__main__":
+    run_forecast()
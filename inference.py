@@ -0,0 +1,104 @@
+"""
+Bounded worker pools that keep blocking work (model inference, prediction
+logging, password hashing) off the asyncio event loop.
+
+Each pool tracks how many jobs are queued or running and rejects new work
+with PoolSaturatedError once that reaches max_pending, so callers can fail
+fast with a 503 instead of piling up latency for everyone else.
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+# "thread" shares the loaded model and is enough because sklearn/numpy release
+# the GIL for most of the work; "process" isolates GIL-bound workloads. In
+# process mode each worker loads its own model; app.py also loads one in the
+# parent and caches worker results there, so cached answers skip the pool.
+INFERENCE_EXECUTOR = os.getenv("INFERENCE_EXECUTOR", "thread")
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "4"))
+INFERENCE_MAX_PENDING = int(os.getenv("INFERENCE_MAX_PENDING", "64"))
+
+DB_WRITE_WORKERS = int(os.getenv("DB_WRITE_WORKERS", "2"))
+DB_WRITE_MAX_PENDING = int(os.getenv("DB_WRITE_MAX_PENDING", "256"))
+
+# bcrypt releases the GIL, so a few threads keep login hashing off the loop
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "32"))
+
+
+class PoolSaturatedError(Exception):
+    """Raised when a pool already has max_pending jobs queued or running"""
+
+
+class BoundedExecutor:
+    def __init__(self, name: str, kind: str, workers: int, max_pending: int):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown executor kind for {name}: {kind}")
+        self.name = name
+        self.kind = kind
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = None
+        self._pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def _get_executor(self):
+        # Created lazily so importing this module never spawns workers
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix=self.name
+                )
+        return self._executor
+
+    async def run(self, fn, *args):
+        """Run fn(*args) on the pool, raising PoolSaturatedError if it is full"""
+        # Only ever touched from the event loop thread, so no lock is needed
+        if self._pending >= self.max_pending:
+            self.rejected += 1
+            raise PoolSaturatedError(
+                f"{self.name} pool saturated ({self._pending}/{self.max_pending} pending)"
+            )
+
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._get_executor(), fn, *args)
+            self.completed += 1
+            return result
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self._pending -= 1
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "pending": self._pending,
+            "max_pending": self.max_pending,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self, wait: bool = True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+
+inference_pool = BoundedExecutor(
+    "inference", INFERENCE_EXECUTOR, INFERENCE_WORKERS, INFERENCE_MAX_PENDING
+)
+db_write_pool = BoundedExecutor(
+    "db_write", "thread", DB_WRITE_WORKERS, DB_WRITE_MAX_PENDING
+)
+password_pool = BoundedExecutor(
+    "password_hashing", "thread", PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING
+)
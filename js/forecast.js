@@ -489,6 +489,9 @@ async function loadForecastData() {
 
         console.log('📡 Loading forecast data...');
         
+        // Precomputed multi-day outlook, independent of today's data source
+        loadStressOutlook();
+        
         // Check if we have manual data for today
         const hasManualData = await checkManualDataForToday();
         const user = userManager.getCurrentUser();
@@ -594,6 +597,38 @@ async function generateForecastFromManualData(manualData, user) {
     return generateForecast(manualData, user, mlPrediction);
 }
 
+// ==================== STRESS OUTLOOK FUNCTIONS ====================
+
+async function loadStressOutlook() {
+    const container = document.getElementById('stress-outlook');
+    const updated = document.getElementById('stress-outlook-updated');
+    if (!container) return;
+    
+    try {
+        // Forecasts are computed in the background; this only reads the stored days
+        const forecast = await userManager.apiCall('/stress/forecast');
+        
+        if (forecast.status !== 'success' || forecast.days.length === 0) {
+            container.innerHTML = '<p class="description">Your outlook is being prepared. Check back soon.</p>';
+            return;
+        }
+        
+        container.innerHTML = forecast.days.map(day => {
+            const probability = Math.round(day.stress_probability * 100);
+            const label = new Date(day.date + 'T00:00:00').toLocaleDateString(undefined, { weekday: 'short', month: 'short', day: 'numeric' });
+            const color = probability >= 70 ? 'mood-low' : probability >= 50 ? 'mood-medium' : 'mood-high';
+            return `<div class="outlook-day ${color}">${label}<span class="outlook-probability">${probability}%</span>${day.prediction} stress</div>`;
+        }).join('');
+        
+        if (updated) {
+            updated.textContent = `Chance of a high-stress day. Updated ${new Date(forecast.generated_at).toLocaleString()}`;
+        }
+    } catch (error) {
+        console.error('❌ Failed to load stress outlook:', error);
+        container.innerHTML = '<p class="description">Stress outlook unavailable right now.</p>';
+    }
+}
+
 // ==================== ML PREDICTION FUNCTIONS ====================
 
 async function getMLPrediction(fitbitData) {
@@ -0,0 +1,70 @@
+"""
+JWT signing keys loaded from configuration.
+
+Every worker reads the same key material, so a token issued by one worker (or
+before a restart) validates on all of them without any shared state.
+Validation stays in-process and stateless.
+
+JWT_SIGNING_KEYS lists keys as "kid:secret" pairs separated by commas. New
+tokens are signed with JWT_ACTIVE_KID, which defaults to the first key, and
+carry that kid in their header. Tokens are validated with the key named by
+their kid.
+
+To rotate, add a new key, make it active, and remove the old key once the
+tokens it signed have expired. JWT_SECRET_KEY is accepted as a single key
+with kid "default".
+"""
+import os
+import secrets
+
+from dotenv import load_dotenv
+from jose import JWTError, jwt
+
+load_dotenv()
+
+DEFAULT_KID = "default"
+
+
+class JWTKeyRing:
+    def __init__(self, keys: dict, active_kid: str = None):
+        if not keys:
+            raise ValueError("JWTKeyRing needs at least one key")
+        self.keys = dict(keys)
+        self.active_kid = active_kid or next(iter(self.keys))
+        if self.active_kid not in self.keys:
+            raise ValueError(f"Active JWT kid {self.active_kid!r} is not among the configured keys")
+
+    @classmethod
+    def from_env(cls) -> "JWTKeyRing":
+        configured = os.getenv("JWT_SIGNING_KEYS")
+        if configured:
+            keys = {}
+            for entry in configured.split(","):
+                kid, sep, secret = entry.strip().partition(":")
+                if not sep or not kid or not secret:
+                    raise ValueError("JWT_SIGNING_KEYS entries must look like kid:secret")
+                keys[kid] = secret
+            return cls(keys, os.getenv("JWT_ACTIVE_KID") or None)
+
+        secret = os.getenv("JWT_SECRET_KEY")
+        if secret:
+            return cls({DEFAULT_KID: secret})
+
+        print("⚠️ No JWT_SIGNING_KEYS or JWT_SECRET_KEY set; using a random per-process key. "
+              "Tokens will not survive restarts or work across workers.")
+        return cls({DEFAULT_KID: secrets.token_urlsafe(32)})
+
+    def signing_key(self):
+        """(kid, secret) to sign new tokens with"""
+        return self.active_kid, self.keys[self.active_kid]
+
+    def key_for(self, token: str) -> str:
+        """Secret that should have signed this token, chosen by its kid header"""
+        kid = jwt.get_unverified_header(token).get("kid")
+        if kid is None:
+            # Tokens issued before kids were added
+            return self.keys[self.active_kid]
+        try:
+            return self.keys[kid]
+        except KeyError:
+            raise JWTError(f"Unknown JWT key id {kid!r}")
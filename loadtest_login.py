@@ -0,0 +1,93 @@
+"""
+Login load test: shows that bcrypt logins don't stall other endpoints.
+
+Measures the latency of a cheap probe endpoint on its own, then again while
+several clients log in as fast as they can. Hashing runs on password_pool, so
+the probe's p99 should stay close to its baseline while logins are CPU-bound.
+
+Usage: python loadtest_login.py [base_url] [seconds] [login_clients]
+       (defaults: http://localhost:8000 10 8; the API must be running)
+"""
+import asyncio
+import sys
+import time
+
+import httpx
+import numpy as np
+
+USERNAME = "loadtest_user"
+PASSWORD = "loadtest-password"
+
+
+async def ensure_user(client):
+    response = await client.post("/api/users/register", json={
+        "username": USERNAME, "email": f"{USERNAME}@example.com", "password": PASSWORD, "name": "Load Test"
+    })
+    if response.status_code not in (200, 400):
+        response.raise_for_status()
+
+
+async def timed_loop(client, request, deadline, timings, errors):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            response = await request(client)
+            if response.status_code >= 400:
+                errors.append(response.status_code)
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+        timings.append((time.perf_counter() - start) * 1000)
+
+
+def probe(client):
+    return client.get("/api/health")
+
+
+def login(client):
+    return client.post("/api/token", params={"username": USERNAME, "password": PASSWORD})
+
+
+def summarize(label, timings, seconds, errors):
+    if not timings:
+        print(f"{label:<28} no requests completed")
+        return None
+    p50, p99 = np.percentile(timings, [50, 99])
+    print(f"{label:<28} {len(timings) / seconds:>8.1f} req/s   p50 {p50:7.1f} ms   p99 {p99:7.1f} ms"
+          f"   errors {len(errors)}")
+    return p99
+
+
+async def run_phase(base_url, seconds, login_clients, probe_clients=4):
+    limits = httpx.Limits(max_connections=login_clients + probe_clients + 4)
+    async with httpx.AsyncClient(base_url=base_url, timeout=30, limits=limits) as client:
+        deadline = time.perf_counter() + seconds
+        probe_timings, probe_errors, login_timings, login_errors = [], [], [], []
+        await asyncio.gather(
+            *(timed_loop(client, probe, deadline, probe_timings, probe_errors) for _ in range(probe_clients)),
+            *(timed_loop(client, login, deadline, login_timings, login_errors) for _ in range(login_clients)),
+        )
+        return probe_timings, probe_errors, login_timings, login_errors
+
+
+async def main():
+    base_url = sys.argv[1] if len(sys.argv) > 1 else "http://localhost:8000"
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+    login_clients = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+        await ensure_user(client)
+
+    print(f"🔐 {base_url}: {seconds:.0f} s per phase, {login_clients} login clients\n")
+    probe_timings, probe_errors, _, _ = await run_phase(base_url, seconds, 0)
+    baseline = summarize("probe alone", probe_timings, seconds, probe_errors)
+
+    probe_timings, probe_errors, login_timings, login_errors = await run_phase(base_url, seconds, login_clients)
+    loaded = summarize("probe during logins", probe_timings, seconds, probe_errors)
+    summarize("logins", login_timings, seconds, login_errors)
+
+    if baseline and loaded:
+        print(f"\nProbe p99 changed by {loaded - baseline:+.1f} ms under login load")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,210 @@
+"""
+Versioned schema migrations.
+
+Each migration is a module migrations/mNNN_<name>.py with an
+upgrade(engine) function, listed in MIGRATIONS in the order it runs. Applied
+versions are recorded in schema_migrations. `python -m migrations` applies
+whatever is pending as an explicit deploy step. App startup only reads the
+recorded version (check_schema_version) and refuses to serve a schema older
+than the code.
+
+Migrations check before they act: a table, column or index that already
+exists is left alone. Databases loaded from CalmCast.sql, built by an older
+create_all, or created from scratch all converge on the same schema.
+
+The helpers below keep changes online on large tables such as fitbit_data
+and stress_predictions:
+
+* add_index builds with ALGORITHM=INPLACE, LOCK=NONE on MySQL
+* add_column uses ALGORITHM=INSTANT where MySQL supports it
+* update_in_batches and for_each_key_range walk the primary key in ranges of
+  MIGRATION_BATCH_SIZE, committing each range separately and pausing
+  MIGRATION_BATCH_PAUSE_MS between them, so no statement holds row locks on
+  the whole table
+"""
+import importlib
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, inspect, select, update
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from sqlalchemy.schema import CreateColumn, CreateIndex
+
+MIGRATION_BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "5000"))
+MIGRATION_BATCH_PAUSE_MS = float(os.getenv("MIGRATION_BATCH_PAUSE_MS", "50"))
+MIGRATION_LOCK_TIMEOUT_SECONDS = int(os.getenv("MIGRATION_LOCK_TIMEOUT_SECONDS", "60"))
+
+MIGRATIONS = [
+    (1, "m001_baseline_schema"),
+    (2, "m002_composite_indexes"),
+    (3, "m003_model_drift"),
+    (4, "m004_fitbit_backfill_jobs"),
+    (5, "m005_mood_daily_rollup"),
+    (6, "m006_stress_forecasts"),
+    (7, "m007_change_feed_indexes"),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+schema_migrations = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("version", Integer, primary_key=True, autoincrement=False),
+    Column("name", String(100), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+class SchemaVersionError(RuntimeError):
+    """The database schema is older than the code expects"""
+
+
+def current_version(engine) -> int:
+    """Highest applied migration; 0 for a database that has never been migrated"""
+    try:
+        with engine.connect() as connection:
+            return connection.scalar(select(func.max(schema_migrations.c.version))) or 0
+    except (OperationalError, ProgrammingError):
+        return 0  # no schema_migrations table yet
+
+
+def check_schema_version(engine) -> int:
+    """Cheap startup check: one SELECT on schema_migrations"""
+    version = current_version(engine)
+    if version < LATEST_VERSION:
+        raise SchemaVersionError(
+            f"Database schema is at version {version} but this code needs {LATEST_VERSION}; "
+            f"run `python -m migrations` first"
+        )
+    if version > LATEST_VERSION:
+        print(f"⚠️ Database schema is at version {version}, newer than this code ({LATEST_VERSION})")
+    return version
+
+
+def pending_migrations(engine) -> list:
+    with engine.connect() as connection:
+        applied = set(connection.scalars(select(schema_migrations.c.version)))
+    return [(version, name) for version, name in MIGRATIONS if version not in applied]
+
+
+@contextmanager
+def migration_lock(engine):
+    """Serialize concurrent deploys; MySQL only, other databases run migrations from one place"""
+    if engine.dialect.name != "mysql":
+        yield
+        return
+    with engine.connect() as connection:
+        if not connection.exec_driver_sql(
+            f"SELECT GET_LOCK('calmcast_migrations', {MIGRATION_LOCK_TIMEOUT_SECONDS})"
+        ).scalar():
+            raise RuntimeError("Another deploy is running migrations")
+        try:
+            yield
+        finally:
+            connection.exec_driver_sql("SELECT RELEASE_LOCK('calmcast_migrations')")
+
+
+def migrate(engine, target: int = None) -> list:
+    """Apply pending migrations up to `target` (default: all); returns the versions applied"""
+    schema_migrations.create(engine, checkfirst=True)
+    applied = []
+    with migration_lock(engine):
+        for version, name in pending_migrations(engine):
+            if target is not None and version > target:
+                break
+            started = time.perf_counter()
+            print(f"⏫ Applying migration {version}: {name}")
+            importlib.import_module(f"migrations.{name}").upgrade(engine)
+            with engine.begin() as connection:
+                connection.execute(schema_migrations.insert().values(
+                    version=version, name=name, applied_at=datetime.now()
+                ))
+            applied.append(version)
+            print(f"✅ Migration {version} applied in {time.perf_counter() - started:.1f}s")
+    return applied
+
+
+# Online schema change helpers
+
+def create_table(engine, table) -> bool:
+    if inspect(engine).has_table(table.name):
+        return False
+    table.create(engine)
+    print(f"📦 Created table {table.name}")
+    return True
+
+
+def add_index(engine, index) -> bool:
+    """Create the index unless an existing key already has the same leading columns"""
+    inspector = inspect(engine)
+    columns = [column.name for column in index.columns]
+    existing = [key["column_names"] for key in inspector.get_indexes(index.table.name)]
+    existing += [key["column_names"] for key in inspector.get_unique_constraints(index.table.name)]
+    if any(key[:len(columns)] == columns for key in existing):
+        return False
+
+    ddl = str(CreateIndex(index).compile(dialect=engine.dialect))
+    if engine.dialect.name == "mysql":
+        ddl += " ALGORITHM=INPLACE LOCK=NONE"
+    with engine.begin() as connection:
+        connection.exec_driver_sql(ddl)
+    print(f"📇 Created index {index.name} on {index.table.name} ({', '.join(columns)})")
+    return True
+
+
+def add_column(engine, column) -> bool:
+    """Add a model column to its table if the table does not have it yet"""
+    table_name = column.table.name
+    if column.name in {existing["name"] for existing in inspect(engine).get_columns(table_name)}:
+        return False
+
+    ddl = f"ALTER TABLE {table_name} ADD COLUMN {CreateColumn(column).compile(dialect=engine.dialect)}"
+    if engine.dialect.name == "mysql":
+        try:
+            with engine.begin() as connection:
+                connection.exec_driver_sql(ddl + ", ALGORITHM=INSTANT")
+        except OperationalError:
+            # Servers before 8.0.12 cannot add columns instantly
+            with engine.begin() as connection:
+                connection.exec_driver_sql(ddl + ", ALGORITHM=INPLACE, LOCK=NONE")
+    else:
+        with engine.begin() as connection:
+            connection.exec_driver_sql(ddl)
+    print(f"➕ Added column {table_name}.{column.name}")
+    return True
+
+
+def for_each_key_range(engine, key_column, fn, batch_size: int = None, pause_ms: float = None) -> int:
+    """Call fn(connection, low, high) for consecutive [low, high) ranges of key_column, one transaction each"""
+    batch_size = batch_size or MIGRATION_BATCH_SIZE
+    pause_ms = MIGRATION_BATCH_PAUSE_MS if pause_ms is None else pause_ms
+    with engine.connect() as connection:
+        low, high = connection.execute(select(func.min(key_column), func.max(key_column))).one()
+    if low is None:
+        return 0
+
+    batches = 0
+    while low <= high:
+        with engine.begin() as connection:
+            fn(connection, low, low + batch_size)
+        batches += 1
+        low += batch_size
+        if pause_ms and low <= high:
+            time.sleep(pause_ms / 1000)
+    return batches
+
+
+def update_in_batches(engine, table, where, values: dict, **batch_options) -> int:
+    """UPDATE table SET values WHERE where, one primary-key range at a time; returns rows updated"""
+    key = table.c.id
+    updated = 0
+
+    def apply(connection, low, high):
+        nonlocal updated
+        updated += connection.execute(
+            update(table).where(key >= low, key < high, where).values(values)
+        ).rowcount
+
+    for_each_key_range(engine, key, apply, **batch_options)
+    return updated
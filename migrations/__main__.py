@@ -0,0 +1,27 @@
+"""
+Usage:
+    python -m migrations           apply pending migrations
+    python -m migrations status    show the schema version and what is pending
+"""
+import sys
+
+from database import engine
+from migrations import LATEST_VERSION, current_version, migrate, pending_migrations, schema_migrations
+
+
+def main(argv):
+    if argv[:1] == ["status"]:
+        schema_migrations.create(engine, checkfirst=True)
+        pending = pending_migrations(engine)
+        print(f"Schema version {current_version(engine)} (code expects {LATEST_VERSION})")
+        for version, name in pending:
+            print(f"  pending {version}: {name}")
+        return 0
+
+    applied = migrate(engine)
+    print(f"✅ Schema at version {current_version(engine)} ({len(applied)} migration(s) applied)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,16 @@
+"""
+Baseline schema: the tables shipped in CalmCast.sql.
+
+Databases imported from the dump already have them and are left untouched;
+a fresh database gets them created from models.py. Tables added after the
+dump come from their own migrations.
+"""
+from migrations import create_table
+from models import FitbitAuthSession, FitbitConnection, FitbitData, MoodEntry, StressPrediction, User, UserSession
+
+BASELINE_MODELS = (User, UserSession, FitbitAuthSession, FitbitConnection, FitbitData, MoodEntry, StressPrediction)
+
+
+def upgrade(engine):
+    for model in BASELINE_MODELS:
+        create_table(engine, model.__table__)
@@ -0,0 +1,28 @@
+"""
+Composite indexes for the per-user hot queries.
+
+CalmCast.sql only has single-column keys. An index is skipped when the table
+already has one with the same leading columns, for example the dump's UNIQUE
+KEY on fitbit_connections.user_id.
+"""
+from migrations import add_index
+from models import FitbitConnection, FitbitData, MoodEntry, StressPrediction
+
+INDEX_NAMES = (
+    "ix_fitbit_connections_user_id",
+    "ix_fitbit_data_user_manual_date",
+    "ix_mood_entries_user_created",
+    "ix_mood_entries_user_date_rating",
+    "ix_stress_predictions_user_created",
+)
+
+
+def declared_indexes():
+    tables = (FitbitConnection.__table__, FitbitData.__table__, MoodEntry.__table__, StressPrediction.__table__)
+    indexes = {index.name: index for table in tables for index in table.indexes}
+    return [indexes[name] for name in INDEX_NAMES]
+
+
+def upgrade(engine):
+    for index in declared_indexes():
+        add_index(engine, index)
@@ -0,0 +1,22 @@
+"""
+Bring CalmCast.sql databases in line with models.py.
+
+* fitbit_data.source: declared on the model, missing from the dump. It is
+  added as a nullable column (instant on MySQL 8), then existing rows are
+  set to "fitbit", the model default, one id range at a time.
+* fitbit_auth_sessions.expires_at: indexed on the model for the expiry
+  sweep, unindexed in the dump.
+"""
+from migrations import add_column, add_index, update_in_batches
+from models import FitbitAuthSession, FitbitData
+
+
+def upgrade(engine):
+    fitbit_data = FitbitData.__table__
+    add_column(engine, fitbit_data.c.source)
+    updated = update_in_batches(engine, fitbit_data, fitbit_data.c.source.is_(None), {"source": "fitbit"})
+    if updated:
+        print(f"🔁 Backfilled fitbit_data.source on {updated} rows")
+
+    auth_sessions = FitbitAuthSession.__table__
+    add_index(engine, next(index for index in auth_sessions.indexes if index.columns.keys() == ["expires_at"]))
@@ -0,0 +1,7 @@
+"""Resumable Fitbit history backfill jobs (fitbit_backfill.py)."""
+from migrations import create_table
+from models import FitbitBackfillJob
+
+
+def upgrade(engine):
+    create_table(engine, FitbitBackfillJob.__table__)
@@ -0,0 +1,26 @@
+"""
+Daily mood rollup (mood_rollup.py).
+
+Creates mood_daily_rollup and fills it from existing mood entries one range
+of user ids at a time, so each batch only locks the entries of those users.
+"""
+from sqlalchemy.orm import Session
+
+from migrations import create_table, for_each_key_range
+from models import MoodDailyRollup, MoodEntry
+from mood_rollup import rebuild_mood_rollup
+
+
+def upgrade(engine):
+    create_table(engine, MoodDailyRollup.__table__)
+    written = 0
+
+    def rebuild(connection, low, high):
+        nonlocal written
+        with Session(bind=connection) as session:
+            written += rebuild_mood_rollup(session, user_ids=(low, high))
+
+    # Users have few entries each, so batch by a smaller slice of ids than the row batches
+    batches = for_each_key_range(engine, MoodEntry.__table__.c.user_id, rebuild, batch_size=500)
+    if batches:
+        print(f"📈 Built mood_daily_rollup from existing entries ({written} user-days, {batches} batches)")
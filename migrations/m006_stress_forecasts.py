@@ -0,0 +1,7 @@
+"""Precomputed multi-day stress forecasts (forecasting.py)."""
+from migrations import create_table
+from models import StressForecast
+
+
+def upgrade(engine):
+    create_table(engine, StressForecast.__table__)
@@ -0,0 +1,17 @@
+"""
+Timestamp indexes that let feature_store.py find rows changed since its last
+refresh without scanning fitbit_data, mood_entries and stress_predictions.
+CalmCast.sql already has stress_predictions.created_at indexed, so that one
+is skipped there.
+"""
+from migrations import add_index
+from models import FitbitData, MoodEntry, StressPrediction
+
+INDEX_NAMES = ("ix_fitbit_data_recorded_at", "ix_mood_entries_created_at", "ix_stress_predictions_created_at")
+
+
+def upgrade(engine):
+    tables = (FitbitData.__table__, MoodEntry.__table__, StressPrediction.__table__)
+    indexes = {index.name: index for table in tables for index in table.indexes}
+    for name in INDEX_NAMES:
+        add_index(engine, indexes[name])
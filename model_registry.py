@@ -0,0 +1,215 @@
+"""
+Lazy, hot-reloadable registry for the stress model artifact.
+
+The pickled forest is loaded on first use instead of at import time. Each
+load produces an immutable LoadedModel; reloading builds the new one off to
+the side and then swaps a single reference, so predictions already holding
+the old LoadedModel finish on it while new ones pick up the new version.
+"""
+import hashlib
+import os
+import threading
+import time
+from datetime import datetime
+
+import joblib
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+STRESS_MODEL_PATH = os.getenv("STRESS_MODEL_PATH", os.path.join(BASE_DIR, "stress_model.pkl"))
+# "sklearn" calls the pickled forest directly; "compiled" evaluates the same
+# trees through the flat-array CompiledForest without sklearn at request time
+STRESS_MODEL_ENGINE = os.getenv("STRESS_MODEL_ENGINE", "sklearn")
+# Level-synchronous NumPy traversal beats sklearn's per-call overhead on small
+# inputs but loses to its Cython tree walk on large bulk batches
+STRESS_COMPILED_MAX_BATCH = int(os.getenv("STRESS_COMPILED_MAX_BATCH", "256"))
+# joblib mmap_mode ("r", "c", ...). sklearn copies tree arrays into its own
+# buffers, so with the compiled engine the flattened arrays are also written
+# to a sidecar file and memory-mapped from there, letting forked workers share pages.
+STRESS_MODEL_MMAP_MODE = os.getenv("STRESS_MODEL_MMAP_MODE") or None
+# Seconds between artifact mtime checks; 0 disables the file watcher
+STRESS_MODEL_WATCH_INTERVAL = float(os.getenv("STRESS_MODEL_WATCH_INTERVAL", "0"))
+
+
+class LoadedModel:
+    """One immutable loaded version of the model artifact"""
+
+    def __init__(self, model, compiled, version, path, mtime, loaded_at, load_seconds):
+        self.model = model
+        self.compiled = compiled
+        self.version = version
+        self.path = path
+        self.mtime = mtime
+        self.loaded_at = loaded_at
+        self.load_seconds = load_seconds
+        self.classes_ = model.classes_
+
+    def predict_proba(self, features):
+        """Class probabilities from the configured inference engine"""
+        if self.compiled is not None and len(features) <= STRESS_COMPILED_MAX_BATCH:
+            return self.compiled.predict_proba(features)
+        return self.model.predict_proba(features)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the forest (and compiled copy, if any)"""
+        total = 0
+        for estimator in getattr(self.model, "estimators_", []):
+            state = estimator.tree_.__getstate__()
+            total += state["nodes"].nbytes + state["values"].nbytes
+        if self.compiled is not None:
+            total += self.compiled.nbytes
+        return total
+
+
+class ModelRegistry:
+    def __init__(self, path, engine="sklearn", mmap_mode=None, watch_interval=0):
+        self.path = path
+        self.engine = engine
+        self.mmap_mode = mmap_mode
+        self.watch_interval = watch_interval
+
+        self._current = None
+        self._load_lock = threading.Lock()
+        self._watcher = None
+        self._watcher_pid = None
+        self._stop_watching = threading.Event()
+        self._reload_callbacks = []
+        self.reloads = 0
+        self.last_error = None
+
+    def is_available(self) -> bool:
+        return self._current is not None or os.path.exists(self.path)
+
+    def get(self) -> LoadedModel:
+        """Current model, loading it on first use"""
+        current = self._current
+        if current is None:
+            with self._load_lock:
+                if self._current is None:
+                    self._current = self._load()
+                current = self._current
+        self._ensure_watcher()
+        return current
+
+    def peek(self):
+        """Current model if one is loaded, without triggering a load"""
+        return self._current
+
+    def reload(self, force: bool = False) -> LoadedModel:
+        """Load the artifact again and atomically swap it in"""
+        with self._load_lock:
+            previous = self._current
+            if not force and previous is not None and self._file_version_unchanged(previous):
+                return previous
+
+            try:
+                loaded = self._load()
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"❌ Stress model reload failed, keeping {previous.version if previous else 'nothing'}: {e}")
+                raise
+
+            self._current = loaded
+            self.reloads += 1
+            self.last_error = None
+
+        print(f"🔄 Stress model reloaded: {previous.version if previous else None} -> {loaded.version}")
+        for callback in list(self._reload_callbacks):
+            try:
+                callback(loaded)
+            except Exception as e:
+                print(f"❌ Model reload callback failed: {e}")
+        return loaded
+
+    def on_reload(self, callback):
+        """Register callback(loaded_model) to run after every successful swap"""
+        self._reload_callbacks.append(callback)
+
+    def status(self) -> dict:
+        current = self._current
+        return {
+            "path": self.path,
+            "engine": self.engine,
+            "mmap_mode": self.mmap_mode,
+            "loaded": current is not None,
+            "version": current.version if current else None,
+            "loaded_at": current.loaded_at.isoformat() if current else None,
+            "load_seconds": round(current.load_seconds, 4) if current else None,
+            "memory_bytes": current.nbytes if current else None,
+            "reloads": self.reloads,
+            "watching": self._watcher is not None and self._watcher.is_alive(),
+            "last_error": self.last_error,
+        }
+
+    def stop_watcher(self):
+        self._stop_watching.set()
+
+    def _file_version_unchanged(self, loaded: LoadedModel) -> bool:
+        try:
+            return os.path.getmtime(self.path) == loaded.mtime
+        except OSError:
+            return True
+
+    def _load(self) -> LoadedModel:
+        started = time.perf_counter()
+        mtime = os.path.getmtime(self.path)
+        with open(self.path, "rb") as f:
+            version = hashlib.sha256(f.read()).hexdigest()[:12]
+
+        model = joblib.load(self.path, mmap_mode=self.mmap_mode)
+        compiled = None
+        if self.engine == "compiled":
+            compiled = self._load_compiled(model, version)
+
+        loaded = LoadedModel(
+            model=model,
+            compiled=compiled,
+            version=version,
+            path=self.path,
+            mtime=mtime,
+            loaded_at=datetime.now(),
+            load_seconds=time.perf_counter() - started,
+        )
+        print(f"✅ Stress model {version} loaded in {loaded.load_seconds * 1000:.0f} ms ({self.engine} engine)")
+        return loaded
+
+    def _load_compiled(self, model, version):
+        from compiled_forest import CompiledForest
+
+        if not self.mmap_mode:
+            return CompiledForest.from_sklearn(model)
+
+        sidecar = f"{self.path}.{version}.compiled"
+        if not os.path.exists(sidecar):
+            tmp_path = f"{sidecar}.{os.getpid()}.tmp"
+            joblib.dump(CompiledForest.from_sklearn(model), tmp_path)
+            os.replace(tmp_path, sidecar)
+        return joblib.load(sidecar, mmap_mode=self.mmap_mode)
+
+    def _ensure_watcher(self):
+        # One watcher thread per process (forked workers don't inherit threads)
+        if self.watch_interval <= 0 or self._watcher_pid == os.getpid():
+            return
+        self._watcher_pid = os.getpid()
+        self._stop_watching.clear()
+        self._watcher = threading.Thread(target=self._watch, name="model-watcher", daemon=True)
+        self._watcher.start()
+
+    def _watch(self):
+        while not self._stop_watching.wait(self.watch_interval):
+            current = self._current
+            if current is None or self._file_version_unchanged(current):
+                continue
+            try:
+                self.reload()
+            except Exception:
+                pass
+
+
+stress_model_registry = ModelRegistry(
+    STRESS_MODEL_PATH,
+    engine=STRESS_MODEL_ENGINE,
+    mmap_mode=STRESS_MODEL_MMAP_MODE,
+    watch_interval=STRESS_MODEL_WATCH_INTERVAL,
+)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, Boolean, Text, Date, Enum, DECIMAL
+from sqlalchemy import Column, Integer, String, DateTime, Float, Boolean, Text, Date, Enum, DECIMAL, UniqueConstraint, Index
 from sqlalchemy.sql import func
 from database import Base
 from datetime import datetime
@@ -17,7 +17,7 @@ class FitbitConnection(Base):
     __tablename__ = "fitbit_connections"
     
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    user_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, nullable=False, index=True)
     fitbit_user_id = Column(String(100), unique=True, nullable=False)
     access_token = Column(Text, nullable=False)
     refresh_token = Column(Text, nullable=False)
@@ -35,10 +35,34 @@ class FitbitData(Base):
     steps = Column(Integer, nullable=True)
     calories_burned = Column(Integer, nullable=True)
     data_date = Column(Date, nullable=False)
+    # UTC on insert and on every update; the feature store's change watermark relies on one clock
     recorded_at = Column(DateTime, default=datetime.utcnow)
     is_manual_edit = Column(Boolean, default=False)
     source = Column(String(20), default="fitbit")
 
+    __table_args__ = (
+        UniqueConstraint("user_id", "data_date", name="user_date"),
+        # Manual-edit history: equality on both flags, range on the date
+        Index("ix_fitbit_data_user_manual_date", "user_id", "is_manual_edit", "data_date"),
+        # Change feed for incremental feature store refreshes
+        Index("ix_fitbit_data_recorded_at", "recorded_at"),
+    )
+
+class FitbitBackfillJob(Base):
+    __tablename__ = "fitbit_backfill_jobs"
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    user_id = Column(Integer, nullable=False, index=True)
+    start_date = Column(Date, nullable=False)
+    end_date = Column(Date, nullable=False)
+    next_date = Column(Date, nullable=False)  # first day not yet written; resume point
+    status = Column(String(20), nullable=False, default="pending")
+    days_done = Column(Integer, nullable=False, default=0)
+    rows_written = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
 class MoodEntry(Base):
     __tablename__ = "mood_entries"
     
@@ -49,6 +73,22 @@ class MoodEntry(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     entry_date = Column(Date, nullable=False)
 
+    __table_args__ = (
+        Index("ix_mood_entries_user_created", "user_id", "created_at"),
+        # Covers the per-day SUM/COUNT that rebuilds mood_daily_rollup
+        Index("ix_mood_entries_user_date_rating", "user_id", "entry_date", "rating"),
+        Index("ix_mood_entries_created_at", "created_at"),
+    )
+
+class MoodDailyRollup(Base):
+    """Per-user, per-day rating sum and count, kept in step with mood_entries"""
+    __tablename__ = "mood_daily_rollup"
+
+    user_id = Column(Integer, primary_key=True, autoincrement=False)
+    entry_date = Column(Date, primary_key=True)
+    rating_sum = Column(Integer, nullable=False, default=0)
+    rating_count = Column(Integer, nullable=False, default=0)
+
 class StressPrediction(Base):
     __tablename__ = "stress_predictions"
     
@@ -61,13 +101,29 @@ class StressPrediction(Base):
     steps = Column(Integer, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        Index("ix_stress_predictions_user_created", "user_id", "created_at"),
+        Index("ix_stress_predictions_created_at", "created_at"),
+    )
+
+class StressForecast(Base):
+    """Precomputed stress probability for one user and future day (forecasting.py)"""
+    __tablename__ = "stress_forecasts"
+
+    user_id = Column(Integer, primary_key=True, autoincrement=False)
+    forecast_date = Column(Date, primary_key=True)
+    horizon_days = Column(Integer, nullable=False)
+    stress_probability = Column(Float, nullable=False)
+    method = Column(String(20), nullable=False)
+    generated_at = Column(DateTime, nullable=False)
+
 class UserSession(Base):
     __tablename__ = "user_sessions"
     
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     user_id = Column(Integer, nullable=False)
     session_token = Column(String(255), unique=True, nullable=False)
-    expires_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
 class FitbitAuthSession(Base):
@@ -77,4 +133,4 @@ class FitbitAuthSession(Base):
     user_id = Column(Integer, nullable=False)
     state_token = Column(String(100), unique=True, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
-    expires_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
@@ -1,7 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from database import get_db
-from models import MoodEntry, User
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
+from models import MoodEntry, MoodDailyRollup, User
+from mood_rollup import add_to_rollup, daily_window
 from auth_simple import get_current_user
 from pydantic import BaseModel
 from datetime import datetime, timedelta, date
@@ -17,7 +19,7 @@ class MoodRating(BaseModel):
 async def add_mood_rating(
     mood_data: MoodRating,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     if not 1 <= mood_data.rating <= 10:
         raise HTTPException(status_code=400, detail="Rating must be between 1 and 10")
@@ -30,21 +32,23 @@ async def add_mood_rating(
         entry_date=date.today()
     )
     db.add(mood_entry)
-    db.commit()
+    # Same transaction as the entry, so the rollup never drifts from mood_entries
+    await db.run_sync(add_to_rollup, current_user.id, mood_entry.entry_date, mood_entry.rating)
+    await db.commit()
     
     return {"message": "Mood rating added successfully"}
 
 @router.get("/mood")
 async def get_mood_data(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Get last 30 days of mood data
     thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    mood_entries = db.query(MoodEntry).filter(
+    mood_entries = (await db.scalars(select(MoodEntry).where(
         MoodEntry.user_id == current_user.id,
         MoodEntry.created_at >= thirty_days_ago
-    ).order_by(MoodEntry.created_at.desc()).all()
+    ).order_by(MoodEntry.created_at.desc()))).all()
     
     return {
         "mood_data": [
@@ -61,36 +65,26 @@ async def get_mood_data(
 @router.get("/mood/weekly")
 async def get_weekly_mood_data(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    # Get last 7 days of mood data
-    week_ago = date.today() - timedelta(days=7)
-    mood_entries = db.query(MoodEntry).filter(
-        MoodEntry.user_id == current_user.id,
-        MoodEntry.entry_date >= week_ago
-    ).order_by(MoodEntry.entry_date).all()
-    
-    # Create daily summary
-    daily_data = {}
-    for entry in mood_entries:
-        date_str = entry.entry_date.isoformat()
-        if date_str not in daily_data:
-            daily_data[date_str] = []
-        daily_data[date_str].append(entry.rating)
+    # Daily averages for the last 7 days, straight from the rollup
+    first_day, today = daily_window(7)
+    rows = await db.execute(select(
+        MoodDailyRollup.entry_date, MoodDailyRollup.rating_sum, MoodDailyRollup.rating_count
+    ).where(
+        MoodDailyRollup.user_id == current_user.id,
+        MoodDailyRollup.entry_date >= first_day
+    ))
+    daily_averages = {
+        row.entry_date: row.rating_sum / row.rating_count for row in rows if row.rating_count
+    }
     
-    # Calculate daily averages
     weekly_data = []
     for i in range(7):
-        day_date = date.today() - timedelta(days=i)
-        day_name = day_date.strftime("%a")
-        avg_rating = None
-        date_str = day_date.isoformat()
-        
-        if date_str in daily_data:
-            avg_rating = sum(daily_data[date_str]) / len(daily_data[date_str])
-        
+        day_date = today - timedelta(days=i)
+        avg_rating = daily_averages.get(day_date)
         weekly_data.append({
-            "date": day_name,
+            "date": day_date.strftime("%a"),
             "rating": round(avg_rating, 1) if avg_rating else None
         })
     
@@ -100,16 +94,18 @@ async def get_weekly_mood_data(
 async def get_average_mood(
     days: int = 7,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    start_date = datetime.utcnow() - timedelta(days=days)
-    mood_entries = db.query(MoodEntry).filter(
-        MoodEntry.user_id == current_user.id,
-        MoodEntry.created_at >= start_date
-    ).all()
+    """Average rating over the last `days` calendar days (including today)"""
+    first_day, _ = daily_window(days)
+    rating_sum, rating_count = (await db.execute(select(
+        func.sum(MoodDailyRollup.rating_sum), func.sum(MoodDailyRollup.rating_count)
+    ).where(
+        MoodDailyRollup.user_id == current_user.id,
+        MoodDailyRollup.entry_date >= first_day
+    ))).one()
     
-    if not mood_entries:
+    if not rating_count:
         return {"average_mood": 5.0, "total_entries": 0}
     
-    avg_mood = sum(entry.rating for entry in mood_entries) / len(mood_entries)
-    return {"average_mood": round(avg_mood, 1), "total_entries": len(mood_entries)}
\ No newline at end of file
+    return {"average_mood": round(float(rating_sum) / int(rating_count), 1), "total_entries": int(rating_count)}
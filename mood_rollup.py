@@ -0,0 +1,92 @@
+"""
+Daily mood rollup.
+
+mood_daily_rollup keeps one row per user and day with the sum and count of
+that day's ratings. POST /mood adds each new rating to it in the same
+transaction as the entry, so averages over any window of days come from a
+short range scan on the (user_id, entry_date) primary key instead of
+reading every mood entry in the window.
+
+Rows written straight into mood_entries (demo data, SQL imports) are folded
+in with rebuild_mood_rollup, which recomputes the rollup with one
+INSERT ... SELECT ... GROUP BY. The table itself and its initial build come
+from migrations/m005_mood_daily_rollup.py.
+"""
+from datetime import date, timedelta
+
+from sqlalchemy import delete, func, insert, select
+
+from models import MoodDailyRollup, MoodEntry
+
+
+def add_to_rollup(db, user_id: int, entry_date: date, rating: int):
+    """Count one rating into the user's rollup row for the day (sync Session)"""
+    dialect = db.get_bind().dialect.name
+    values = {"user_id": user_id, "entry_date": entry_date, "rating_sum": rating, "rating_count": 1}
+
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+        stmt = mysql_insert(MoodDailyRollup).values(values)
+        stmt = stmt.on_duplicate_key_update(
+            rating_sum=MoodDailyRollup.rating_sum + stmt.inserted.rating_sum,
+            rating_count=MoodDailyRollup.rating_count + 1,
+        )
+    elif dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+
+        stmt = dialect_insert(MoodDailyRollup).values(values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[MoodDailyRollup.user_id, MoodDailyRollup.entry_date],
+            set_={
+                "rating_sum": MoodDailyRollup.rating_sum + stmt.excluded.rating_sum,
+                "rating_count": MoodDailyRollup.rating_count + 1,
+            },
+        )
+    else:
+        row = db.get(MoodDailyRollup, (user_id, entry_date), with_for_update=True)
+        if row is None:
+            db.add(MoodDailyRollup(**values))
+        else:
+            row.rating_sum += rating
+            row.rating_count += 1
+        return
+
+    db.execute(stmt)
+
+
+def rebuild_mood_rollup(db, user_id: int = None, user_ids: tuple = None) -> int:
+    """Recompute rollup rows from mood_entries; returns rows written
+
+    Covers one user, a half-open (low, high) range of user ids, or everyone.
+    """
+    clear = delete(MoodDailyRollup)
+    daily = select(
+        MoodEntry.user_id,
+        MoodEntry.entry_date,
+        func.sum(MoodEntry.rating),
+        func.count(MoodEntry.id),
+    ).group_by(MoodEntry.user_id, MoodEntry.entry_date)
+    if user_id is not None:
+        clear = clear.where(MoodDailyRollup.user_id == user_id)
+        daily = daily.where(MoodEntry.user_id == user_id)
+    if user_ids is not None:
+        low, high = user_ids
+        clear = clear.where(MoodDailyRollup.user_id >= low, MoodDailyRollup.user_id < high)
+        daily = daily.where(MoodEntry.user_id >= low, MoodEntry.user_id < high)
+
+    db.flush()  # include entries added in this transaction
+    db.execute(clear)
+    result = db.execute(insert(MoodDailyRollup).from_select(
+        ["user_id", "entry_date", "rating_sum", "rating_count"], daily
+    ))
+    return result.rowcount
+
+
+def daily_window(days: int, today: date = None):
+    """(first_day, today) covering the last `days` calendar days including today"""
+    today = today or date.today()
+    return today - timedelta(days=max(days, 1) - 1), today
@@ -0,0 +1,225 @@
+"""
+Caching for stress predictions.
+
+Prediction inputs are low-cardinality: integer heart rate, sleep hours stored
+as DECIMAL(3,1) and integer steps. Rows are quantized to that resolution and
+looked up in:
+
+* PredictionCache - an in-process LRU with TTL keyed on
+  (model version, heart_rate, sleep_hours, steps)
+* StressLookupTable - an optional table of class probabilities precomputed for
+  every quantized input in the realistic domain, so a prediction is an index
+  lookup. It is built exactly from the forest's split thresholds: inputs
+  falling between the same thresholds of every feature always get the same
+  answer, so only one cell per threshold interval is stored.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+PREDICTION_CACHE_ENABLED = os.getenv("PREDICTION_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "10000"))
+PREDICTION_CACHE_TTL = float(os.getenv("PREDICTION_CACHE_TTL", "3600"))
+PREDICTION_LOOKUP_TABLE = os.getenv("PREDICTION_LOOKUP_TABLE", "false").lower() in ("1", "true", "yes")
+
+# Realistic input domain, matching the manual data validation in fitbit.py
+LOOKUP_HEART_RATE_RANGE = (40, 120)
+LOOKUP_SLEEP_HOURS_RANGE = (0.0, 24.0)
+LOOKUP_STEPS_RANGE = (0, 50000)
+
+
+def quantize_features(heart_rate, sleep_hours, steps):
+    """Round inputs to the resolution they are stored with"""
+    return int(round(heart_rate)), round(float(sleep_hours), 1), int(round(steps))
+
+
+class PredictionCache:
+    def __init__(self, max_size: int = PREDICTION_CACHE_SIZE, ttl: float = PREDICTION_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": PREDICTION_CACHE_ENABLED,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+class StressLookupTable:
+    """Class probabilities for every quantized (heart_rate, sleep_hours, steps) in the domain"""
+
+    def __init__(self, forest, version):
+        self.version = version
+        self.classes_ = forest.classes_
+
+        hr_lo, hr_hi = LOOKUP_HEART_RATE_RANGE
+        steps_lo, steps_hi = LOOKUP_STEPS_RANGE
+        self._sleep_lo = int(round(LOOKUP_SLEEP_HOURS_RANGE[0] * 10))
+        self._sleep_hi = int(round(LOOKUP_SLEEP_HOURS_RANGE[1] * 10))
+        domains = [
+            np.arange(hr_lo, hr_hi + 1, dtype=np.float64),
+            np.arange(self._sleep_lo, self._sleep_hi + 1) / 10,
+            np.arange(steps_lo, steps_hi + 1, dtype=np.float64),
+        ]
+        self._offsets = (hr_lo, self._sleep_lo, steps_lo)
+
+        internal = forest.left != np.arange(len(forest.left))
+        axis_index, axis_buckets = [], []
+        for feature, values in enumerate(domains):
+            thresholds = np.unique(forest.threshold[internal & (forest.feature == feature)])
+            # Interval each domain value falls into, compared the way the forest does (float32 inputs)
+            buckets = np.searchsorted(thresholds, values.astype(np.float32).astype(np.float64), side="left")
+            unique_buckets, index = np.unique(buckets, return_inverse=True)
+            axis_index.append(index.astype(np.int32))
+            axis_buckets.append((thresholds, unique_buckets))
+        self._axis_index = axis_index
+
+        shape = tuple(len(unique_buckets) for _, unique_buckets in axis_buckets)
+        self.table = self._fill(forest, axis_buckets, shape)
+
+    @staticmethod
+    def _fill(forest, axis_buckets, shape):
+        # Walk each tree once, splitting the box of reachable cells at every
+        # node and adding the leaf probabilities to the box it ends up with
+        table = np.zeros(shape + (forest.value.shape[1],))
+        split_points = np.zeros(len(forest.feature), dtype=np.intp)
+        internal = forest.left != np.arange(len(forest.left))
+        for feature, (thresholds, unique_buckets) in enumerate(axis_buckets):
+            nodes = np.flatnonzero(internal & (forest.feature == feature))
+            threshold_index = np.searchsorted(thresholds, forest.threshold[nodes])
+            # Cells go left when their bucket <= the node's threshold index
+            split_points[nodes] = np.searchsorted(unique_buckets, threshold_index, side="right")
+
+        for root in forest.roots:
+            stack = [(root, (0, 0, 0), shape)]
+            while stack:
+                node, lo, hi = stack.pop()
+                if any(l >= h for l, h in zip(lo, hi)):
+                    continue
+                if not internal[node]:
+                    table[lo[0]:hi[0], lo[1]:hi[1], lo[2]:hi[2]] += forest.value[node]
+                    continue
+                feature, split = forest.feature[node], split_points[node]
+                left_hi, right_lo = list(hi), list(lo)
+                left_hi[feature] = min(hi[feature], split)
+                right_lo[feature] = max(lo[feature], split)
+                stack.append((forest.left[node], lo, tuple(left_hi)))
+                stack.append((forest.right[node], tuple(right_lo), hi))
+
+        table /= len(forest.roots)
+        return table
+
+    def lookup(self, heart_rate: int, sleep_hours: float, steps: int):
+        """Probability vector for a quantized row, or None outside the table's domain"""
+        positions = (heart_rate - self._offsets[0], int(round(sleep_hours * 10)) - self._offsets[1],
+                     steps - self._offsets[2])
+        cell = []
+        for position, index in zip(positions, self._axis_index):
+            if not 0 <= position < len(index):
+                return None
+            cell.append(index[position])
+        return self.table[tuple(cell)]
+
+    @property
+    def nbytes(self) -> int:
+        return self.table.nbytes + sum(index.nbytes for index in self._axis_index)
+
+
+class LookupTableHolder:
+    """Builds the lookup table for whichever model version is current"""
+
+    def __init__(self, enabled: bool = PREDICTION_LOOKUP_TABLE):
+        self.enabled = enabled
+        self._table = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.build_seconds = None
+
+    def ready_for(self, loaded) -> bool:
+        """True when get(loaded) would not have to build a table"""
+        table = self._table
+        return self.enabled and table is not None and table.version == loaded.version
+
+    def get(self, loaded):
+        if not self.enabled:
+            return None
+        table = self._table
+        if table is not None and table.version == loaded.version:
+            return table
+
+        with self._lock:
+            if self._table is None or self._table.version != loaded.version:
+                from compiled_forest import CompiledForest
+
+                started = time.perf_counter()
+                forest = loaded.compiled or CompiledForest.from_sklearn(loaded.model)
+                self._table = StressLookupTable(forest, loaded.version)
+                self.build_seconds = time.perf_counter() - started
+                print(f"✅ Stress lookup table built for {loaded.version}: "
+                      f"{self._table.table.shape[:3]} cells in {self.build_seconds:.2f} s")
+            return self._table
+
+    def stats(self) -> dict:
+        table = self._table
+        return {
+            "enabled": self.enabled,
+            "version": table.version if table else None,
+            "cells": int(np.prod(table.table.shape[:3])) if table else 0,
+            "memory_bytes": table.nbytes if table else 0,
+            "build_seconds": round(self.build_seconds, 3) if self.build_seconds else None,
+            "hits": self.hits,
+        }
+
+
+prediction_cache = PredictionCache()
+lookup_tables = LookupTableHolder()
@@ -0,0 +1,176 @@
+"""
+Write-behind buffer for the stress_predictions audit log.
+
+Prediction endpoints hand their records to PredictionLogWriter and respond
+straight away; a background thread flushes the buffer with one bulk INSERT
+every PREDICTION_LOG_FLUSH_ROWS rows or PREDICTION_LOG_FLUSH_MS milliseconds.
+When the buffer is full, producers wait (without blocking the event loop) for
+up to PREDICTION_LOG_BACKPRESSURE_MS and then write their rows directly on the
+DB write pool, so records are never silently dropped because of load.
+"""
+import asyncio
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from inference import db_write_pool, PoolSaturatedError
+
+PREDICTION_LOG_FLUSH_ROWS = int(os.getenv("PREDICTION_LOG_FLUSH_ROWS", "200"))
+PREDICTION_LOG_FLUSH_MS = float(os.getenv("PREDICTION_LOG_FLUSH_MS", "250"))
+PREDICTION_LOG_MAX_QUEUE = int(os.getenv("PREDICTION_LOG_MAX_QUEUE", "10000"))
+PREDICTION_LOG_BACKPRESSURE_MS = float(os.getenv("PREDICTION_LOG_BACKPRESSURE_MS", "100"))
+
+
+def prediction_records(user_id: int, rows, results) -> list:
+    """stress_predictions rows for the scored inputs and their ML results"""
+    # UTC like the column defaults; the feature store compares it with other tables' stamps
+    created_at = datetime.utcnow()
+    return [
+        {
+            "user_id": user_id,
+            "prediction": result["prediction"],
+            "confidence": result.get("confidence", 0.8),
+            "heart_rate": row.heart_rate,
+            "sleep_hours": row.sleep_hours,
+            "steps": row.steps,
+            "created_at": created_at
+        }
+        for row, result in zip(rows, results)
+    ]
+
+
+def insert_prediction_records(records: list):
+    """Write records to stress_predictions with a single bulk insert (blocking)"""
+    from database import SessionLocal
+    from models import StressPrediction
+    from sqlalchemy import insert
+
+    db = SessionLocal()
+    try:
+        db.execute(insert(StressPrediction), records)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+class PredictionLogWriter:
+    def __init__(
+        self,
+        write_fn=insert_prediction_records,
+        flush_rows: int = PREDICTION_LOG_FLUSH_ROWS,
+        flush_ms: float = PREDICTION_LOG_FLUSH_MS,
+        max_queue: int = PREDICTION_LOG_MAX_QUEUE,
+        backpressure_ms: float = PREDICTION_LOG_BACKPRESSURE_MS,
+    ):
+        self.write_fn = write_fn
+        self.flush_rows = flush_rows
+        self.flush_ms = flush_ms
+        self.backpressure_ms = backpressure_ms
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stopping = threading.Event()
+
+        self.enqueued = 0
+        self.flushes = 0
+        self.written = 0
+        self.failed = 0
+        self.overflow_writes = 0
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name="prediction-log", daemon=True)
+                self._thread.start()
+
+    def enqueue_nowait(self, records: list) -> list:
+        """Queue as many records as fit; returns the ones that did not"""
+        self.start()
+        for i, record in enumerate(records):
+            try:
+                self._queue.put_nowait(record)
+            except queue.Full:
+                return records[i:]
+            self.enqueued += 1
+        return []
+
+    async def submit(self, records: list):
+        """Queue records for the next flush, applying backpressure when the buffer is full"""
+        pending = self.enqueue_nowait(records)
+        deadline = time.monotonic() + self.backpressure_ms / 1000
+        while pending and time.monotonic() < deadline:
+            await asyncio.sleep(0.005)
+            pending = self.enqueue_nowait(pending)
+
+        if pending:
+            # Buffer still full: write this request's rows ourselves, off the loop
+            self.overflow_writes += 1
+            try:
+                await db_write_pool.run(self.write_fn, pending)
+                self.written += len(pending)
+            except PoolSaturatedError as e:
+                self.failed += len(pending)
+                print(f"❌ Prediction log overloaded, dropped {len(pending)} rows: {e}")
+            except Exception as e:
+                self.failed += len(pending)
+                print(f"❌ Failed to log predictions: {e}")
+
+    def _run(self):
+        while not (self._stopping.is_set() and self._queue.empty()):
+            try:
+                batch = [self._queue.get(timeout=0.1)]
+            except queue.Empty:
+                continue
+
+            deadline = time.monotonic() + self.flush_ms / 1000
+            while len(batch) < self.flush_rows:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._stopping.is_set():
+                    # On shutdown, drain whatever is already buffered without waiting
+                    remaining = 0
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            self._flush(batch)
+
+    def _flush(self, batch: list):
+        for attempt in (1, 2):
+            try:
+                self.write_fn(batch)
+                self.flushes += 1
+                self.written += len(batch)
+                return
+            except Exception as e:
+                print(f"❌ Prediction log flush of {len(batch)} rows failed (attempt {attempt}): {e}")
+        self.failed += len(batch)
+
+    def stop(self, timeout: float = 10.0):
+        """Flush everything still buffered and stop the writer thread (blocking)"""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "max_queue": self._queue.maxsize,
+            "flush_rows": self.flush_rows,
+            "flush_ms": self.flush_ms,
+            "enqueued": self.enqueued,
+            "flushes": self.flushes,
+            "written": self.written,
+            "failed": self.failed,
+            "overflow_writes": self.overflow_writes,
+        }
+
+
+prediction_log_writer = PredictionLogWriter()
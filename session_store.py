@@ -0,0 +1,242 @@
+"""
+Login session storage and expired-session sweeping.
+
+SessionStore issues, looks up and revokes the session tokens handed out at
+login. Access tokens carry their session token as the "sid" claim and
+auth_simple.get_current_user looks it up on every request, so logging out
+revokes the access token too. The backend is chosen with SESSION_STORE_BACKEND:
+
+* "database" (default) - rows in user_sessions, shared by every worker
+* "memory" - an in-process dict, for single-worker deployments and
+  development where session lookups should never touch the database
+
+SessionSweeper deletes expired user_sessions and fitbit_auth_sessions rows
+(abandoned Fitbit OAuth attempts) in the background. Each table is swept in
+batches of at most SESSION_SWEEP_BATCH_SIZE rows, each batch committed
+separately with a short pause between batches, so no single DELETE holds
+locks on a large range.
+"""
+import os
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete
+
+from database import SessionLocal
+from models import UserSession, FitbitAuthSession
+
+SESSION_STORE_BACKEND = os.getenv("SESSION_STORE_BACKEND", "database")
+SESSION_TTL_DAYS = float(os.getenv("SESSION_TTL_DAYS", "7"))
+SESSION_SWEEP_ENABLED = os.getenv("SESSION_SWEEP_ENABLED", "true").lower() in ("1", "true", "yes")
+SESSION_SWEEP_INTERVAL_SECONDS = float(os.getenv("SESSION_SWEEP_INTERVAL_SECONDS", "300"))
+SESSION_SWEEP_BATCH_SIZE = int(os.getenv("SESSION_SWEEP_BATCH_SIZE", "1000"))
+SESSION_SWEEP_MAX_BATCHES = int(os.getenv("SESSION_SWEEP_MAX_BATCHES", "100"))
+SESSION_SWEEP_PAUSE_MS = float(os.getenv("SESSION_SWEEP_PAUSE_MS", "50"))
+
+
+class DatabaseSessionBackend:
+    name = "database"
+
+    def __init__(self, session_factory=SessionLocal):
+        self.session_factory = session_factory
+
+    def create(self, user_id: int, session_token: str, expires_at: datetime, db=None):
+        # Reuse the caller's session when there is one so the row commits with its transaction
+        own_session = db is None
+        db = db or self.session_factory()
+        try:
+            db.add(UserSession(user_id=user_id, session_token=session_token, expires_at=expires_at))
+            db.commit()
+        finally:
+            if own_session:
+                db.close()
+
+    def get(self, session_token: str, db=None):
+        own_session = db is None
+        db = db or self.session_factory()
+        try:
+            row = db.query(UserSession.user_id).filter(
+                UserSession.session_token == session_token,
+                UserSession.expires_at > datetime.utcnow()
+            ).first()
+            return row.user_id if row else None
+        finally:
+            if own_session:
+                db.close()
+
+    def delete(self, session_token: str, db=None):
+        own_session = db is None
+        db = db or self.session_factory()
+        try:
+            db.execute(delete(UserSession).where(UserSession.session_token == session_token))
+            db.commit()
+        finally:
+            if own_session:
+                db.close()
+
+    def purge_expired(self) -> int:
+        return 0  # expired rows are removed by SessionSweeper
+
+    def size(self):
+        return None
+
+
+class MemorySessionBackend:
+    name = "memory"
+
+    def __init__(self):
+        self._sessions = {}  # session_token -> (user_id, expires_at)
+        self._lock = threading.Lock()
+
+    def create(self, user_id: int, session_token: str, expires_at: datetime, db=None):
+        with self._lock:
+            self._sessions[session_token] = (user_id, expires_at)
+
+    def get(self, session_token: str, db=None):
+        entry = self._sessions.get(session_token)
+        if entry is None or entry[1] <= datetime.utcnow():
+            return None
+        return entry[0]
+
+    def delete(self, session_token: str, db=None):
+        with self._lock:
+            self._sessions.pop(session_token, None)
+
+    def purge_expired(self) -> int:
+        now = datetime.utcnow()
+        with self._lock:
+            expired = [token for token, (_, expires_at) in self._sessions.items() if expires_at <= now]
+            for token in expired:
+                del self._sessions[token]
+        return len(expired)
+
+    def size(self):
+        return len(self._sessions)
+
+
+class SessionStore:
+    def __init__(self, backend, ttl: timedelta = timedelta(days=SESSION_TTL_DAYS)):
+        self.backend = backend
+        self.ttl = ttl
+
+    def create(self, user_id: int, db=None):
+        """Issue a session token for the user; returns (session_token, expires_at)"""
+        session_token = secrets.token_urlsafe(32)
+        expires_at = datetime.utcnow() + self.ttl
+        self.backend.create(user_id, session_token, expires_at, db=db)
+        return session_token, expires_at
+
+    def get_user_id(self, session_token: str, db=None):
+        """User id for a live session token, or None if it is unknown or expired"""
+        return self.backend.get(session_token, db=db)
+
+    def revoke(self, session_token: str, db=None):
+        self.backend.delete(session_token, db=db)
+
+
+def sweep_expired(db, model, now: datetime, batch_size: int, max_batches: int, pause_ms: float = 0) -> int:
+    """Delete rows of `model` whose expires_at is before `now`, batch by batch"""
+    deleted = 0
+    for _ in range(max_batches):
+        # Selecting ids first keeps this portable: MySQL rejects LIMIT inside an IN subquery
+        ids = [row.id for row in db.query(model.id).filter(model.expires_at < now).limit(batch_size).all()]
+        if not ids:
+            break
+        db.execute(delete(model).where(model.id.in_(ids)))
+        db.commit()
+        deleted += len(ids)
+        if len(ids) < batch_size:
+            break
+        if pause_ms:
+            time.sleep(pause_ms / 1000)
+    return deleted
+
+
+class SessionSweeper:
+    def __init__(
+        self,
+        store: SessionStore,
+        session_factory=SessionLocal,
+        interval_seconds: float = SESSION_SWEEP_INTERVAL_SECONDS,
+        batch_size: int = SESSION_SWEEP_BATCH_SIZE,
+        max_batches: int = SESSION_SWEEP_MAX_BATCHES,
+        pause_ms: float = SESSION_SWEEP_PAUSE_MS,
+    ):
+        self.store = store
+        self.session_factory = session_factory
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self.pause_ms = pause_ms
+        self._thread = None
+        self._stopping = threading.Event()
+
+        self.runs = 0
+        self.deleted = {"user_sessions": 0, "fitbit_auth_sessions": 0, "memory_sessions": 0}
+        self.last_run_at = None
+        self.last_error = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="session-sweeper", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stopping.wait(self.interval_seconds):
+            try:
+                self.run_once()
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"❌ Session sweep failed: {e}")
+
+    def run_once(self) -> dict:
+        """Sweep every session table once (blocking); returns rows deleted per table"""
+        deleted = {"memory_sessions": self.store.backend.purge_expired()}
+        db = self.session_factory()
+        try:
+            # user_sessions expiries are stored in UTC, fitbit_auth_sessions in local time
+            deleted["user_sessions"] = sweep_expired(
+                db, UserSession, datetime.utcnow(), self.batch_size, self.max_batches, self.pause_ms
+            )
+            deleted["fitbit_auth_sessions"] = sweep_expired(
+                db, FitbitAuthSession, datetime.now(), self.batch_size, self.max_batches, self.pause_ms
+            )
+        finally:
+            db.close()
+
+        for table, count in deleted.items():
+            self.deleted[table] += count
+        self.runs += 1
+        self.last_run_at = datetime.now()
+        self.last_error = None
+        if any(deleted.values()):
+            print(f"🧹 Swept expired sessions: {deleted}")
+        return deleted
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.store.backend.name,
+            "in_memory_sessions": self.store.backend.size(),
+            "running": self._thread is not None and self._thread.is_alive(),
+            "interval_seconds": self.interval_seconds,
+            "batch_size": self.batch_size,
+            "runs": self.runs,
+            "deleted": dict(self.deleted),
+            "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+            "last_error": self.last_error,
+        }
+
+
+session_store = SessionStore(
+    MemorySessionBackend() if SESSION_STORE_BACKEND == "memory" else DatabaseSessionBackend()
+)
+session_sweeper = SessionSweeper(session_store)
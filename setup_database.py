@@ -1,7 +1,7 @@
 # setup_database.py
-from database import engine, Base
-from models import User, MoodEntry, FitbitConnection, FitbitData, StressPrediction, UserSession, FitbitAuthSession
+from database import engine
+from migrations import current_version, migrate
 
-# Create all tables
-Base.metadata.create_all(bind=engine)
-print("✅ All database tables verified!")
\ No newline at end of file
+# Create or upgrade all tables; same as `python -m migrations`
+migrate(engine)
+print(f"✅ All database tables verified! (schema version {current_version(engine)})")
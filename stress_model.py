@@ -1,27 +1,141 @@
-import joblib
 import numpy as np
+from typing import Dict, List, NamedTuple
+from model_registry import stress_model_registry
+from prediction_cache import prediction_cache, lookup_tables, quantize_features, PREDICTION_CACHE_ENABLED
 
-model = joblib.load("stress_model.pkl")
+# The artifact is loaded lazily (and hot-reloaded) by the registry
+registry = stress_model_registry
 
-def predict_stress(data):
-    try:
-        features = np.array([
-            data["heart_rate"],
-            data["sleep_hours"], 
-            data["steps"]
-        ]).reshape(1, -1) 
-        
-        prediction = model.predict(features)
-        stress_level = "High" if prediction[0] == 1 else "Low"
-        
-        # Get prediction probabilities for confidence score
-        probabilities = model.predict_proba(features)[0]
-        confidence = max(probabilities)
-        
-        return {
-            "status": "success", 
-            "prediction": stress_level,
-            "confidence": round(confidence, 2)
+# Cached predictions are keyed on the model version; drop them once it changes
+registry.on_reload(lambda loaded: prediction_cache.clear())
+
+class StressResult(NamedTuple):
+    """One scored row: label, confidence and the class-probability vector"""
+    prediction: str
+    confidence: float
+    probabilities: Dict[str, float]
+
+    def to_dict(self, include_probabilities: bool = False) -> dict:
+        result = {
+            "status": "success",
+            "prediction": self.prediction,
+            "confidence": round(self.confidence, 2)
         }
+        if include_probabilities:
+            result["probabilities"] = {
+                label: round(probability, 4) for label, probability in self.probabilities.items()
+            }
+        return result
+
+# Model class -> API label
+STRESS_LABELS = {0: "Low", 1: "High"}
+
+def _stress_result(labels, row_probabilities) -> StressResult:
+    best_index = int(np.argmax(row_probabilities))
+    return StressResult(
+        prediction=labels[best_index],
+        confidence=float(row_probabilities[best_index]),
+        probabilities=dict(zip(labels, np.asarray(row_probabilities).tolist()))
+    )
+
+def _labels(loaded) -> List[str]:
+    return [STRESS_LABELS[int(label)] for label in loaded.classes_]
+
+def score_features(features, loaded=None) -> List[StressResult]:
+    """
+    Score an (n, 3) array of heart_rate, sleep_hours, steps with a single
+    predict_proba pass; label and confidence are both derived from it.
+    """
+    # Hold one model version for the whole call, even if a reload swaps it meanwhile
+    loaded = loaded or registry.get()
+    probabilities = loaded.predict_proba(features)
+    labels = _labels(loaded)
+    return [_stress_result(labels, row_probabilities) for row_probabilities in probabilities]
+
+def _cached_result(loaded, key, table, labels):
+    """Cache or lookup-table answer for a quantized row, if there is one"""
+    if PREDICTION_CACHE_ENABLED:
+        result = prediction_cache.get((loaded.version,) + key)
+        if result is not None:
+            return result
+    if table is not None:
+        row_probabilities = table.lookup(*key)
+        if row_probabilities is not None:
+            lookup_tables.hits += 1
+            return _stress_result(labels, row_probabilities)
+    return None
+
+def score_rows(rows) -> List[StressResult]:
+    """
+    Score dict rows in input order. Rows are always quantized to their stored
+    resolution, so the answer doesn't depend on whether caching is enabled;
+    repeats are served from the prediction cache or lookup table and only the
+    remaining rows go through one model pass.
+    """
+    loaded = registry.get()
+    table = lookup_tables.get(loaded)
+    labels = _labels(loaded)
+    keys = [quantize_features(row["heart_rate"], row["sleep_hours"], row["steps"]) for row in rows]
+    results = [_cached_result(loaded, key, table, labels) for key in keys]
+
+    missing = [i for i, result in enumerate(results) if result is None]
+    if missing:
+        scored = score_features(np.array([keys[i] for i in missing], dtype=float), loaded)
+        for i, result in zip(missing, scored):
+            results[i] = result
+            if PREDICTION_CACHE_ENABLED:
+                prediction_cache.put((loaded.version,) + keys[i], result)
+    return results
+
+def cached_stress_prediction(data, include_probabilities: bool = False):
+    """
+    Answer from the cache or lookup table only, without running the model.
+    Returns None on a miss or before the model has been loaded.
+    """
+    loaded = registry.peek()
+    if loaded is None:
+        return None
+    key = quantize_features(data["heart_rate"], data["sleep_hours"], data["steps"])
+    table = lookup_tables.get(loaded) if lookup_tables.ready_for(loaded) else None
+    result = _cached_result(loaded, key, table, _labels(loaded))
+    return result.to_dict(include_probabilities) if result is not None else None
+
+def remember_results(rows, results):
+    """
+    Cache results scored in a worker process (INFERENCE_EXECUTOR=process).
+    Workers fill their own caches, so without this the parent's cache fast
+    path would never hit.
+    """
+    loaded = registry.peek()
+    if loaded is None or not PREDICTION_CACHE_ENABLED:
+        return
+    labels = _labels(loaded)
+    for row, result in zip(rows, results):
+        if result.get("status") != "success" or not result.get("probabilities"):
+            continue
+        key = quantize_features(row["heart_rate"], row["sleep_hours"], row["steps"])
+        row_probabilities = [result["probabilities"][label] for label in labels]
+        prediction_cache.put((loaded.version,) + key, _stress_result(labels, row_probabilities))
+
+def predict_stress(data, include_probabilities: bool = False):
+    try:
+        result = score_rows([data])[0]
+        return result.to_dict(include_probabilities)
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+def predict_stress_batch(rows, include_probabilities: bool = False):
+    """
+    Score many rows with a single predict_proba call.
+    Results are returned in the same order as the input rows.
+    """
+    try:
+        if not rows:
+            return []
+
+        return [
+            result.to_dict(include_probabilities)
+            for result in score_rows(rows)
+        ]
     except Exception as e:
-        return {"status": "error", "message": str(e)}
\ No newline at end of file
+        return [{"status": "error", "message": str(e)} for _ in rows]
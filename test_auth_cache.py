@@ -0,0 +1,107 @@
+import asyncio
+
+from fastapi import HTTPException
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import auth_simple
+from database import Base
+from models import User
+from users import update_user_info, UserUpdate
+
+
+async def make_session_factory():
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    statements = []
+    event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    session_factory = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+    async with session_factory() as db:
+        db.add(User(name="Ada", username="ada", email="ada@example.com", password_hash=auth_simple.get_password_hash("pw")))
+        await db.commit()
+    return session_factory, statements
+
+
+async def resolve(session_factory, token):
+    async with session_factory() as db:
+        user = await auth_simple.get_current_user(token=token, db=db)
+        return user.id, user.username, user.name
+
+
+def test_second_request_skips_the_user_lookup():
+    auth_simple.principal_cache.invalidate("ada")
+
+    async def scenario():
+        session_factory, statements = await make_session_factory()
+        token = auth_simple.create_access_token({"sub": "ada"})
+
+        first = await resolve(session_factory, token)
+        selects_after_first = sum(1 for sql in statements if sql.startswith("SELECT"))
+        second = await resolve(session_factory, token)
+
+        assert first == second
+        assert sum(1 for sql in statements if sql.startswith("SELECT")) == selects_after_first
+
+    asyncio.run(scenario())
+
+
+def test_profile_update_invalidates_the_cached_principal():
+    auth_simple.principal_cache.invalidate("ada")
+
+    async def scenario():
+        session_factory, _ = await make_session_factory()
+        token = auth_simple.create_access_token({"sub": "ada"})
+        await resolve(session_factory, token)
+
+        async with session_factory() as db:
+            current_user = await auth_simple.get_current_user(token=token, db=db)
+            await update_user_info(UserUpdate(name="Ada L."), current_user=current_user, db=db)
+
+        assert (await resolve(session_factory, token))[2] == "Ada L."
+
+    asyncio.run(scenario())
+
+
+def test_password_change_checks_the_stored_hash():
+    auth_simple.principal_cache.invalidate("ada")
+
+    async def scenario():
+        session_factory, _ = await make_session_factory()
+        token = auth_simple.create_access_token({"sub": "ada"})
+        await resolve(session_factory, token)
+
+        # Another worker changes the password; this process's cache isn't invalidated
+        async with session_factory() as db:
+            user = await db.scalar(select(User).where(User.username == "ada"))
+            user.password_hash = auth_simple.get_password_hash("changed")
+            await db.commit()
+
+        async with session_factory() as db:
+            current_user = await auth_simple.get_current_user(token=token, db=db)
+            try:
+                await update_user_info(
+                    UserUpdate(current_password="pw", new_password="mine"), current_user=current_user, db=db
+                )
+                raise AssertionError("old password was accepted")
+            except HTTPException as e:
+                assert e.detail == "Current password is incorrect"
+
+        async with session_factory() as db:
+            current_user = await auth_simple.get_current_user(token=token, db=db)
+            await update_user_info(
+                UserUpdate(current_password="changed", new_password="mine"), current_user=current_user, db=db
+            )
+            stored_hash = await db.scalar(select(User.password_hash).where(User.username == "ada"))
+            assert auth_simple.verify_password("mine", stored_hash)
+
+    asyncio.run(scenario())
+
+
+if __name__ == "__main__":
+    test_second_request_skips_the_user_lookup()
+    test_profile_update_invalidates_the_cached_principal()
+    test_password_change_checks_the_stored_hash()
+    print("✅ Auth principal cache tests passed")
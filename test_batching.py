@@ -0,0 +1,57 @@
+import asyncio
+import time
+
+from batching import MicroBatcher
+from inference import BoundedExecutor, PoolSaturatedError
+
+
+def fake_predict_batch(rows):
+    return [{"status": "success", "prediction": "High" if row["heart_rate"] > 80 else "Low"} for row in rows]
+
+
+def test_concurrent_submits_are_coalesced():
+    async def scenario():
+        executor = BoundedExecutor("test", "thread", 2, 16)
+        batcher = MicroBatcher(fake_predict_batch, max_batch_size=32, max_wait_ms=20, executor=executor)
+        rows = [{"heart_rate": hr} for hr in range(60, 100)]
+        results = await asyncio.gather(*(batcher.submit(row) for row in rows))
+        await batcher.stop()
+        executor.shutdown()
+        return rows, results, batcher.metrics()
+
+    rows, results, metrics = asyncio.run(scenario())
+
+    # Every caller gets the result for its own row
+    for row, result in zip(rows, results):
+        assert result["prediction"] == ("High" if row["heart_rate"] > 80 else "Low")
+    assert metrics["rows"] == 40
+    assert metrics["batches"] < 40
+    assert metrics["max_observed_batch"] <= 32
+
+
+def test_full_queue_is_rejected():
+    async def scenario():
+        def slow_predict_batch(rows):
+            time.sleep(0.05)
+            return fake_predict_batch(rows)
+
+        executor = BoundedExecutor("test", "thread", 1, 16)
+        batcher = MicroBatcher(slow_predict_batch, max_batch_size=1, max_wait_ms=0, max_queue=2,
+                               max_concurrent_batches=1, executor=executor)
+        results = await asyncio.gather(
+            *(batcher.submit({"heart_rate": 70}) for _ in range(10)),
+            return_exceptions=True
+        )
+        await batcher.stop()
+        executor.shutdown()
+        return results
+
+    results = asyncio.run(scenario())
+    assert any(isinstance(result, PoolSaturatedError) for result in results)
+    assert any(isinstance(result, dict) for result in results)
+
+
+if __name__ == "__main__":
+    test_concurrent_submits_are_coalesced()
+    test_full_queue_is_rejected()
+    print("✅ Micro-batcher tests passed")
@@ -0,0 +1,51 @@
+import joblib
+import numpy as np
+import pandas as pd
+
+from compiled_forest import CompiledForest
+
+FEATURES = ["heart_rate", "sleep_hours", "steps"]
+
+
+def load_model_and_data():
+    model = joblib.load("stress_model.pkl")
+    df = pd.read_csv("fitbit_data.csv")
+    return model, df[FEATURES]
+
+
+def test_parity_with_sklearn_on_training_data():
+    model, X = load_model_and_data()
+    compiled = CompiledForest.from_sklearn(model)
+
+    expected = model.predict_proba(X)
+    actual = compiled.predict_proba(X.to_numpy())
+
+    np.testing.assert_allclose(actual, expected, rtol=0, atol=1e-12)
+    np.testing.assert_array_equal(compiled.predict(X.to_numpy()), model.predict(X))
+
+
+def test_parity_on_split_thresholds_and_single_rows():
+    model, X = load_model_and_data()
+    compiled = CompiledForest.from_sklearn(model)
+
+    # Rows sitting exactly on (and just around) split points exercise the <= comparison
+    rng = np.random.default_rng(0)
+    base = X.to_numpy()[rng.integers(0, len(X), 300)].astype(float)
+    for feature in range(3):
+        thresholds = np.concatenate([
+            estimator.tree_.threshold[estimator.tree_.feature == feature]
+            for estimator in model.estimators_
+        ])
+        base[:100, feature] = rng.choice(thresholds, 100)
+    edge_rows = pd.DataFrame(base, columns=FEATURES)
+
+    np.testing.assert_allclose(compiled.predict_proba(base), model.predict_proba(edge_rows), atol=1e-12)
+
+    single = edge_rows.iloc[[0]]
+    np.testing.assert_allclose(compiled.predict_proba(base[0]), model.predict_proba(single), atol=1e-12)
+
+
+if __name__ == "__main__":
+    test_parity_with_sklearn_on_training_data()
+    test_parity_on_split_thresholds_and_single_rows()
+    print("✅ Compiled forest matches sklearn predict_proba")
@@ -0,0 +1,162 @@
+import os
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import feature_store
+from feature_store import FeatureStore, compute_features, load_raw_days
+from models import FitbitData, MoodEntry, StressPrediction
+
+TODAY = date(2026, 3, 31)
+
+
+def seed(session_factory, users=(1, 2, 3), days=30):
+    db = session_factory()
+    stamp = datetime(2026, 4, 1)
+    for user_id in users:
+        for offset in range(days):
+            day = TODAY - timedelta(days=offset)
+            db.add(FitbitData(
+                user_id=user_id, data_date=day, heart_rate=60 + offset, sleep_hours=7.0,
+                steps=1000 * user_id + offset, recorded_at=stamp, is_manual_edit=False,
+            ))
+            if offset % 2 == 0:
+                db.add(MoodEntry(user_id=user_id, rating=offset % 10 + 1, entry_date=day, created_at=stamp))
+        db.add(StressPrediction(
+            user_id=user_id, prediction="High", confidence=0.8, heart_rate=90, sleep_hours=5, steps=2000,
+            created_at=datetime(2026, 3, 31, 9),
+        ))
+    db.commit()
+    db.close()
+
+
+def test_features_are_per_user_and_calendar_based(session_factory):
+    seed(session_factory, days=10)
+    db = session_factory()
+    raw = load_raw_days(db)
+    features = compute_features(raw)
+    assert len(features) == 30
+
+    last = pd.Timestamp(TODAY)
+    row = features.loc[(2, last)]
+    assert row["steps"] == 2000
+    assert row["steps_delta1"] == 2000 - 2001
+    assert np.isclose(row["steps_mean7"], np.mean([2000 + offset for offset in range(7)]))
+    assert row["mood_lag2"] == 3  # rating logged two days earlier
+    assert np.isnan(row["mood_lag1"])  # no entry the day before
+    assert row["predictions"] == 1 and row["high_stress_share"] == 1.0
+    assert row["weekday"] == TODAY.weekday()
+
+    # The first day of user 2 does not see user 1's rows
+    first = features.loc[(2, pd.Timestamp(TODAY - timedelta(days=9)))]
+    assert np.isnan(first["steps_delta1"])
+
+
+def test_incremental_refresh_matches_a_rebuild(session_factory, tmp_path, monkeypatch):
+    monkeypatch.setattr(feature_store, "FEATURE_STORE_CHANGE_OVERLAP_MINUTES", 0)
+    seed(session_factory, users=(1, 2, 1500))
+    store = FeatureStore(str(tmp_path / "incremental"), users_per_partition=1000)
+    assert store.refresh(session_factory)["mode"] == "rebuild"
+    assert store.partitions() == [0, 1]
+
+    untouched_mtime = os.stat(store.partition_path(1)).st_mtime_ns
+
+    # An edit to a past day of user 2 and a new day for user 1, past the change overlap
+    db = session_factory()
+    edited = db.query(FitbitData).filter_by(user_id=2, data_date=TODAY - timedelta(days=5)).one()
+    edited.steps, edited.recorded_at = 99999, datetime(2026, 4, 3)
+    db.add(FitbitData(user_id=1, data_date=TODAY + timedelta(days=1), heart_rate=70, sleep_hours=6.5,
+                      steps=4321, recorded_at=datetime(2026, 4, 3)))
+    db.commit()
+    db.close()
+
+    summary = store.refresh(session_factory)
+    assert summary["mode"] == "incremental" and summary["partitions_written"] == 1
+    assert os.stat(store.partition_path(1)).st_mtime_ns == untouched_mtime
+
+    rebuilt = FeatureStore(str(tmp_path / "rebuilt"), users_per_partition=1000)
+    rebuilt.refresh(session_factory)
+    pd.testing.assert_frame_equal(store.scan(), rebuilt.scan(), check_like=True)
+
+    # A refresh with nothing new writes nothing
+    assert store.refresh(session_factory)["partitions_written"] == 0
+
+
+def test_update_stamped_before_the_watermark_is_reconciled(session_factory, tmp_path, monkeypatch):
+    monkeypatch.setattr(feature_store, "FEATURE_STORE_CHANGE_OVERLAP_MINUTES", 0)
+    seed(session_factory)
+    store = FeatureStore(str(tmp_path / "incremental"), users_per_partition=2)
+    store.refresh(session_factory)
+
+    # Stamped well before the stored watermark, so the change feed can't see it
+    db = session_factory()
+    edited = db.query(FitbitData).filter_by(user_id=3, data_date=TODAY - timedelta(days=4)).one()
+    edited.steps, edited.recorded_at = 77777, datetime(2026, 3, 1)
+    db.commit()
+    db.close()
+
+    assert store.refresh(session_factory)["partitions_written"] == 0
+
+    monkeypatch.setattr(feature_store, "FEATURE_STORE_RECONCILE_INTERVAL_SECONDS", 0)
+    summary = store.refresh(session_factory)
+    assert summary["mode"] == "reconcile" and summary["partitions_written"] == 1
+    assert store.scan(columns=["steps"]).loc[(3, pd.Timestamp(TODAY - timedelta(days=4))), "steps"] == 77777
+
+    rebuilt = FeatureStore(str(tmp_path / "rebuilt"), users_per_partition=2)
+    rebuilt.refresh(session_factory)
+    pd.testing.assert_frame_equal(store.scan(), rebuilt.scan(), check_like=True)
+
+    # Nothing differs any more
+    assert store.refresh(session_factory)["partitions_written"] == 0
+
+
+def test_deleted_rows_are_dropped_from_the_store(session_factory, tmp_path, monkeypatch):
+    monkeypatch.setattr(feature_store, "FEATURE_STORE_RECONCILE_INTERVAL_SECONDS", 0)
+    seed(session_factory)
+    store = FeatureStore(str(tmp_path / "incremental"), users_per_partition=2)
+    store.refresh(session_factory)
+
+    # A day of user 1 disappears from both tables, one of user 2's mood entries goes
+    # and user 3 is removed entirely
+    gone = TODAY - timedelta(days=6)
+    db = session_factory()
+    db.query(FitbitData).filter_by(user_id=1, data_date=gone).delete()
+    db.query(MoodEntry).filter_by(user_id=1, entry_date=gone).delete()
+    db.query(MoodEntry).filter_by(user_id=2, entry_date=TODAY - timedelta(days=2)).delete()
+    for model in (FitbitData, MoodEntry, StressPrediction):
+        db.query(model).filter_by(user_id=3).delete()
+    db.commit()
+    db.close()
+
+    store.refresh(session_factory)
+    frame = store.scan()
+    assert (1, pd.Timestamp(gone)) not in frame.index
+    assert np.isnan(frame.loc[(2, pd.Timestamp(TODAY - timedelta(days=2))), "mood"])
+    assert 3 not in frame.index.get_level_values("user_id")
+    assert store.latest(3) is None
+
+    rebuilt = FeatureStore(str(tmp_path / "rebuilt"), users_per_partition=2)
+    rebuilt.refresh(session_factory)
+    pd.testing.assert_frame_equal(frame, rebuilt.scan(), check_like=True)
+
+
+def test_latest_lookup_and_scan(session_factory, tmp_path):
+    seed(session_factory)
+    store = FeatureStore(str(tmp_path), users_per_partition=2)
+    store.refresh(session_factory)
+
+    latest = store.latest(3)
+    assert latest["day"] == TODAY.isoformat()
+    assert latest["steps"] == 3000
+    assert store.latest(42) is None
+
+    frame = store.scan(columns=["steps", "mood_mean7"], user_ids=[3])
+    assert list(frame.columns) == ["steps", "mood_mean7"]
+    assert set(frame.index.get_level_values("user_id")) == {3}
+    assert len(frame) == 30
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
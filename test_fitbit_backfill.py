@@ -0,0 +1,127 @@
+import asyncio
+from datetime import date, datetime, timedelta
+
+import httpx
+import pytest
+
+import fitbit_backfill
+import fitbit_client
+import fitbit_stub
+from fitbit_backfill import FitbitBackfillService
+from fitbit_tokens import FitbitTokenManager
+from models import FitbitConnection, FitbitData
+
+
+def make_service(session_factory, chunk_days=30):
+    db = session_factory()
+    db.add(FitbitConnection(
+        user_id=1, fitbit_user_id="ABC123", access_token="token", refresh_token="refresh",
+        token_expires_at=datetime.now() + timedelta(days=1)
+    ))
+    # A day the user corrected by hand must survive the backfill
+    db.add(FitbitData(
+        user_id=1, heart_rate=99, sleep_hours=3.0, steps=123, calories_burned=5,
+        data_date=date.today() - timedelta(days=10), is_manual_edit=True, source="manual"
+    ))
+    db.commit()
+    db.close()
+    service = FitbitBackfillService(
+        session_factory=session_factory,
+        chunk_days=chunk_days,
+        token_manager=FitbitTokenManager(session_factory=session_factory)
+    )
+    return service
+
+
+def run_with_transport(handler, coroutine_fn):
+    async def scenario():
+        fitbit_client.set_http_client(httpx.AsyncClient(
+            transport=httpx.MockTransport(handler), base_url="http://fitbit-stub"
+        ))
+        try:
+            return await coroutine_fn()
+        finally:
+            await fitbit_client.close_http_client()
+
+    return asyncio.run(scenario())
+
+
+def stub_handler(calls, rate_limit_after=None):
+    stub = httpx.ASGITransport(app=fitbit_stub.app)
+
+    async def handler(request):
+        calls.append(request.url.path)
+        if rate_limit_after is not None and len(calls) > rate_limit_after:
+            return httpx.Response(429, headers={"Retry-After": "30"})
+        response = await stub.handle_async_request(request)
+        await response.aread()
+        return response
+
+    return handler
+
+
+def test_backfill_upserts_chunks_and_keeps_manual_edits(session_factory):
+    service = make_service(session_factory, chunk_days=30)
+    job = service.create_job(user_id=1, days=90)
+    calls = []
+
+    progress = run_with_transport(stub_handler(calls), lambda: service.run_job(job["job_id"]))
+
+    assert progress["status"] == "completed"
+    assert progress["days_done"] == 90 and progress["percent"] == 100.0
+    # Three range calls per 30-day chunk instead of three calls per day
+    assert len(calls) == 9
+
+    db = session_factory()
+    rows = db.query(FitbitData).filter(FitbitData.user_id == 1).all()
+    manual = [row for row in rows if row.is_manual_edit]
+    db.close()
+    assert len(rows) == 90
+    assert len(manual) == 1 and manual[0].steps == 123 and manual[0].heart_rate == 99
+
+
+def test_rate_limited_backfill_resumes_where_it_stopped(session_factory):
+    service = make_service(session_factory, chunk_days=30)
+    job = service.create_job(user_id=1, days=90)
+
+    calls = []
+    progress = run_with_transport(stub_handler(calls, rate_limit_after=3), lambda: service.run_job(job["job_id"]))
+    assert progress["status"] == "rate_limited"
+    assert progress["retry_after"] == 30
+    assert progress["days_done"] == 30
+
+    # Asking again hands back the same job, which continues from its cursor
+    assert service.create_job(user_id=1, days=90)["job_id"] == job["job_id"]
+    calls = []
+    progress = run_with_transport(stub_handler(calls), lambda: service.run_job(job["job_id"]))
+    assert progress["status"] == "completed"
+    assert len(calls) == 6
+
+    db = session_factory()
+    assert db.query(FitbitData).count() == 90
+    db.close()
+
+
+def test_failed_chunk_write_marks_the_job_failed(session_factory, monkeypatch):
+    service = make_service(session_factory, chunk_days=30)
+    job = service.create_job(user_id=1, days=90)
+    upsert = fitbit_backfill.upsert_fitbit_rows
+    writes = []
+
+    def flaky_upsert(db, user_id, rows):
+        writes.append(len(rows))
+        if len(writes) == 2:
+            raise RuntimeError("deadlock found when trying to get lock")
+        return upsert(db, user_id, rows)
+
+    monkeypatch.setattr(fitbit_backfill, "upsert_fitbit_rows", flaky_upsert)
+    progress = run_with_transport(stub_handler([]), lambda: service.run_job(job["job_id"]))
+
+    assert progress["status"] == "failed"
+    assert "deadlock" in progress["error"]
+    assert progress["days_done"] == 30
+    assert service.latest_progress(1)["status"] == "failed"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
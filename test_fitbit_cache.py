@@ -0,0 +1,86 @@
+import asyncio
+from datetime import date, timedelta
+
+import httpx
+
+import fitbit_client
+from fitbit_cache import FitbitResponseCache
+
+
+def run_with_handler(handler, coroutine_fn):
+    async def scenario():
+        fitbit_client.set_http_client(httpx.AsyncClient(
+            transport=httpx.MockTransport(handler), base_url="http://fitbit-stub"
+        ))
+        try:
+            return await coroutine_fn()
+        finally:
+            await fitbit_client.close_http_client()
+
+    return asyncio.run(scenario())
+
+
+def steps_handler(calls, etag=None):
+    def handler(request):
+        calls.append(request.headers.get("if-none-match"))
+        if etag and request.headers.get("if-none-match") == etag:
+            return httpx.Response(304, headers={"ETag": etag})
+        headers = {"ETag": etag} if etag else {}
+        return httpx.Response(200, json={"activities-steps": [{"dateTime": "x", "value": "4321"}]}, headers=headers)
+
+    return handler
+
+
+def test_closed_days_are_fetched_once():
+    closed_day = (date.today() - timedelta(days=30)).isoformat()
+    calls = []
+    hits_before = fitbit_client.fitbit_response_cache.hits
+
+    async def twice():
+        first = await fitbit_client.fetch_steps("ABC123", "token", closed_day)
+        second = await fitbit_client.fetch_steps("ABC123", "token", closed_day)
+        return first, second
+
+    assert run_with_handler(steps_handler(calls), twice) == (4321, 4321)
+    assert len(calls) == 1
+    assert fitbit_client.fitbit_response_cache.hits == hits_before + 1
+
+
+def test_expired_today_entry_is_revalidated_with_etag():
+    today = date.today().isoformat()
+    calls = []
+    revalidated_before = fitbit_client.fitbit_response_cache.revalidated
+
+    async def fetch_after_expiry():
+        await fitbit_client.fetch_steps("ABC123", "token", today)
+        for entry in fitbit_client.fitbit_response_cache._entries.values():
+            entry.expires_at = 0
+        return await fitbit_client.fetch_steps("ABC123", "token", today)
+
+    assert run_with_handler(steps_handler(calls, etag='"v1"'), fetch_after_expiry) == 4321
+    # Second call was conditional and answered 304 from the cached body
+    assert calls == [None, '"v1"']
+    assert fitbit_client.fitbit_response_cache.revalidated == revalidated_before + 1
+
+
+def test_closed_days_persist_on_disk(tmp_path):
+    closed_path = f"/1/user/ABC123/activities/steps/date/{date.today() - timedelta(days=30)}/1d.json"
+    today_path = f"/1/user/ABC123/activities/steps/date/{date.today()}/1d.json"
+
+    cache = FitbitResponseCache(cache_dir=str(tmp_path))
+    cache.put(closed_path, b'{"activities-steps": []}', "application/json")
+    cache.put(today_path, b'{"activities-steps": []}', "application/json")
+
+    restarted = FitbitResponseCache(cache_dir=str(tmp_path))
+    assert restarted.get(closed_path).body == b'{"activities-steps": []}'
+    assert restarted.get(today_path) is None
+    assert restarted.stats()["disk_hits"] == 1
+
+
+if __name__ == "__main__":
+    import tempfile, pathlib
+
+    test_closed_days_are_fetched_once()
+    test_expired_today_entry_is_revalidated_with_etag()
+    test_closed_days_persist_on_disk(pathlib.Path(tempfile.mkdtemp()))
+    print("✅ Fitbit cache tests passed")
@@ -0,0 +1,79 @@
+import asyncio
+import warnings
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.exc import SAWarning
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+import fitbit
+from database import Base
+from models import FitbitAuthSession, FitbitConnection, User
+
+TOKEN_RESPONSE = {
+    "user_id": "ABC123", "access_token": "access", "refresh_token": "refresh", "expires_in": 28800,
+}
+
+
+def run_callback(monkeypatch, create_job):
+    async def token_request(data):
+        return SimpleNamespace(status_code=200, json=lambda: TOKEN_RESPONSE)
+
+    monkeypatch.setattr(fitbit, "fitbit_token_request", token_request)
+    monkeypatch.setattr(fitbit, "FITBIT_BACKFILL_ON_CONNECT", True)
+    monkeypatch.setattr(fitbit.fitbit_backfill_service, "create_job", create_job)
+    monkeypatch.setattr(fitbit.fitbit_backfill_service, "start", lambda job_id: None)
+    monkeypatch.setattr(fitbit.fitbit_token_manager, "store", lambda *args: None)
+
+    async def scenario():
+        engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session_factory = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+        try:
+            async with session_factory() as db:
+                db.add(User(id=1, name="Sam", username="sam", email="sam@example.com", password_hash="x"))
+                db.add(FitbitAuthSession(user_id=1, state_token="state", expires_at=datetime.now() + timedelta(minutes=10)))
+                await db.commit()
+
+            # Deleting the already-consumed auth session again only warns about a 0-row DELETE
+            async with session_factory() as db:
+                with warnings.catch_warnings():
+                    warnings.simplefilter("error", SAWarning)
+                    response = await fitbit.fitbit_callback(code="code", state="state", error=None, db=db)
+
+            async with session_factory() as db:
+                sessions = await db.scalar(select(func.count()).select_from(FitbitAuthSession))
+                connection = await db.scalar(select(FitbitConnection))
+            return response.body.decode(), sessions, connection
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(scenario())
+
+
+def test_callback_saves_connection_and_consumes_auth_session(monkeypatch):
+    body, sessions, connection = run_callback(monkeypatch, lambda user_id: {"job_id": "job-1"})
+
+    assert "Fitbit Connected Successfully" in body
+    assert sessions == 0
+    assert connection.fitbit_user_id == "ABC123"
+
+
+def test_failure_after_commit_reports_original_error(monkeypatch):
+    def create_job(user_id):
+        raise RuntimeError("backfill queue unavailable")
+
+    body, sessions, connection = run_callback(monkeypatch, create_job)
+
+    # The auth session was already consumed by the commit; cleanup must not mask the real error
+    assert "backfill queue unavailable" in body
+    assert sessions == 0
+    assert connection.access_token == "access"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
@@ -0,0 +1,68 @@
+import asyncio
+import time
+
+import httpx
+
+import fitbit_client
+import fitbit_stub
+
+
+def test_daily_summary_calls_run_concurrently():
+    async def scenario():
+        fitbit_stub.app.state.latency_ms = 200
+        fitbit_client.set_http_client(httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=fitbit_stub.app), base_url="http://fitbit-stub"
+        ))
+        try:
+            started = time.perf_counter()
+            summary = await fitbit_client.fetch_daily_summary("ABC123", "token", "2026-10-17")
+            return summary, time.perf_counter() - started
+        finally:
+            await fitbit_client.close_http_client()
+            fitbit_stub.app.state.latency_ms = 0
+
+    summary, elapsed = asyncio.run(scenario())
+
+    assert summary == {"steps": 8421, "sleep_hours": 7.3, "heart_rate": 64}
+    # Three 200 ms calls in parallel take about as long as the slowest one
+    assert elapsed < 0.45
+
+
+def fetch_summary_with_response(response):
+    async def scenario():
+        fitbit_client.set_http_client(httpx.AsyncClient(
+            transport=httpx.MockTransport(lambda request: response), base_url="http://fitbit-stub"
+        ))
+        try:
+            return await fitbit_client.fetch_daily_summary("ABC123", "token", "2026-10-17")
+        finally:
+            await fitbit_client.close_http_client()
+
+    # Retry failed calls without the real backoff delays
+    backoff_delay = fitbit_client.backoff_delay
+    fitbit_client.backoff_delay = lambda attempt: 0
+    try:
+        return asyncio.run(scenario())
+    finally:
+        fitbit_client.backoff_delay = backoff_delay
+
+
+def test_failed_calls_fall_back_to_zero():
+    summary = fetch_summary_with_response(httpx.Response(500))
+    assert summary == {"steps": 0, "sleep_hours": 0.0, "heart_rate": 0}
+
+
+def test_rate_limited_calls_raise_with_retry_after():
+    try:
+        fetch_summary_with_response(httpx.Response(429, headers={"Fitbit-Rate-Limit-Reset": "1200"}))
+    except fitbit_client.FitbitRateLimitError as e:
+        assert e.retry_after == 1200
+    else:
+        raise AssertionError("429 should raise FitbitRateLimitError")
+
+
+if __name__ == "__main__":
+    test_daily_summary_calls_run_concurrently()
+    test_failed_calls_fall_back_to_zero()
+    test_rate_limited_calls_raise_with_retry_after()
+    print("✅ Fitbit client tests passed")
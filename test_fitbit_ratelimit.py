@@ -0,0 +1,74 @@
+import asyncio
+
+import httpx
+
+import fitbit_client
+from fitbit_ratelimit import FitbitRateLimiter, FitbitRateLimitError, BACKGROUND, FOREGROUND
+
+PATH = "/1/user/ABC123/activities/steps/date/2026-10-17/1d.json"
+
+
+def test_exhausted_quota_from_headers_sheds_calls():
+    limiter = FitbitRateLimiter()
+    limiter.observe(PATH, {
+        "Fitbit-Rate-Limit-Limit": "150",
+        "Fitbit-Rate-Limit-Remaining": "0",
+        "Fitbit-Rate-Limit-Reset": "900",
+    })
+
+    try:
+        asyncio.run(limiter.acquire(PATH, FOREGROUND, max_wait=1))
+    except FitbitRateLimitError as e:
+        assert e.retry_after > 800
+    else:
+        raise AssertionError("an exhausted quota should shed the call")
+    assert limiter.shed[FOREGROUND] == 1
+
+
+def test_background_calls_leave_the_foreground_reserve():
+    limiter = FitbitRateLimiter(per_user_hourly=10, foreground_reserve=0.2)
+
+    async def take_until_shed(priority):
+        taken = 0
+        while True:
+            try:
+                await limiter.acquire(PATH, priority, max_wait=0)
+            except FitbitRateLimitError:
+                return taken
+            taken += 1
+
+    assert asyncio.run(take_until_shed(BACKGROUND)) == 8
+    assert asyncio.run(take_until_shed(FOREGROUND)) == 2
+
+
+def test_server_errors_and_short_rate_limits_are_retried():
+    responses = [
+        httpx.Response(503),
+        httpx.Response(429, headers={"Retry-After": "0"}),
+        httpx.Response(200, json={"activities-steps": [{"dateTime": "2026-10-17", "value": "777"}]}),
+    ]
+
+    async def scenario():
+        fitbit_client.set_http_client(httpx.AsyncClient(
+            transport=httpx.MockTransport(lambda request: responses.pop(0)), base_url="http://fitbit-stub"
+        ))
+        try:
+            return await fitbit_client.fetch_steps("ABC123", "token", "2026-10-17")
+        finally:
+            await fitbit_client.close_http_client()
+
+    retries_before = fitbit_client.fitbit_rate_limiter.retries
+    backoff_delay = fitbit_client.backoff_delay
+    fitbit_client.backoff_delay = lambda attempt: 0
+    try:
+        assert asyncio.run(scenario()) == 777
+    finally:
+        fitbit_client.backoff_delay = backoff_delay
+    assert fitbit_client.fitbit_rate_limiter.retries == retries_before + 2
+
+
+if __name__ == "__main__":
+    test_exhausted_quota_from_headers_sheds_calls()
+    test_background_calls_leave_the_foreground_reserve()
+    test_server_errors_and_short_rate_limits_are_retried()
+    print("✅ Fitbit rate limiter tests passed")
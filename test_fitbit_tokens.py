@@ -0,0 +1,120 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+import fitbit_client
+import fitbit_stub
+import users
+from database import Base
+from fitbit_tokens import FitbitTokenManager
+from models import FitbitConnection
+
+
+def make_manager(session_factory, expires_in):
+    db = session_factory()
+    db.add(FitbitConnection(
+        user_id=1, fitbit_user_id="ABC123", access_token="old-access", refresh_token="old-refresh",
+        token_expires_at=datetime.now() + expires_in
+    ))
+    db.commit()
+    db.close()
+    return FitbitTokenManager(session_factory=session_factory, refresh_margin_seconds=300)
+
+
+def run_against_stub(coroutine_fn, latency_ms=0):
+    async def scenario():
+        fitbit_stub.app.state.token_refreshes = 0
+        fitbit_stub.app.state.latency_ms = latency_ms
+        fitbit_client.set_http_client(httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=fitbit_stub.app), base_url="http://fitbit-stub"
+        ))
+        try:
+            return await coroutine_fn()
+        finally:
+            await fitbit_client.close_http_client()
+            fitbit_stub.app.state.latency_ms = 0
+
+    return asyncio.run(scenario())
+
+
+def test_concurrent_callers_share_one_proactive_refresh(session_factory):
+    # Still valid for two minutes, but inside the five-minute refresh margin
+    manager = make_manager(session_factory, timedelta(minutes=2))
+
+    async def many_callers():
+        return await asyncio.gather(*(manager.get_token(1) for _ in range(20)))
+
+    tokens = run_against_stub(many_callers, latency_ms=50)
+
+    assert fitbit_stub.app.state.token_refreshes == 1
+    assert {token.access_token for token in tokens} == {"stub-access-1"}
+
+    db = session_factory()
+    connection = db.query(FitbitConnection).filter(FitbitConnection.user_id == 1).first()
+    db.close()
+    assert connection.access_token == "stub-access-1"
+    assert connection.refresh_token == "stub-refresh-1"
+    assert connection.token_expires_at > datetime.now() + timedelta(hours=7)
+
+
+def test_fresh_token_is_served_from_cache(session_factory):
+    manager = make_manager(session_factory, timedelta(hours=8))
+
+    async def twice():
+        await manager.get_token(1)
+        return await manager.get_token(1)
+
+    token = run_against_stub(twice)
+
+    assert token.access_token == "old-access"
+    assert fitbit_stub.app.state.token_refreshes == 0
+    assert manager.stats()["loads"] == 1 and manager.stats()["hits"] == 1
+
+
+def test_rejected_token_is_refreshed_and_call_retried(session_factory):
+    manager = make_manager(session_factory, timedelta(hours=8))
+    seen = []
+
+    async def fetch(fitbit_user_id, access_token):
+        seen.append(access_token)
+        if access_token == "old-access":
+            raise fitbit_client.FitbitAuthError("expired")
+        return "ok"
+
+    assert run_against_stub(lambda: manager.call(1, fetch)) == "ok"
+    assert seen == ["old-access", "stub-access-1"]
+
+
+def test_disconnect_drops_the_cached_tokens(session_factory, monkeypatch):
+    manager = make_manager(session_factory, timedelta(hours=8))
+    monkeypatch.setattr(users, "fitbit_token_manager", manager)
+
+    async def scenario():
+        await manager.get_token(1)
+        assert manager.stats()["cached_users"] == 1
+
+        engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+            async with async_sessionmaker(engine, expire_on_commit=False)() as db:
+                db.add(FitbitConnection(
+                    user_id=1, fitbit_user_id="ABC123", access_token="old-access", refresh_token="old-refresh",
+                    token_expires_at=datetime.now() + timedelta(hours=8)
+                ))
+                await db.commit()
+                await users.disconnect_fitbit(current_user=SimpleNamespace(id=1), db=db)
+        finally:
+            await engine.dispose()
+
+    asyncio.run(scenario())
+    assert manager.stats()["cached_users"] == 0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
@@ -0,0 +1,70 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+import forecasting
+from models import FitbitData, MoodDailyRollup, StressForecast
+
+AS_OF = date(2026, 3, 31)
+
+
+def seed(session_factory, users=12, days=60):
+    rng = np.random.default_rng(7)
+    db = session_factory()
+    for user_id in range(1, users + 1):
+        for offset in range(days):
+            day = AS_OF - timedelta(days=offset)
+            if rng.random() < 0.1:
+                continue  # missing days
+            db.add(FitbitData(
+                user_id=user_id, data_date=day, heart_rate=int(rng.integers(60, 120)),
+                sleep_hours=float(rng.uniform(4, 9)), steps=int(rng.integers(1000, 12000)),
+            ))
+            if offset % 3 == 0:
+                db.add(MoodDailyRollup(user_id=user_id, entry_date=day, rating_sum=int(rng.integers(1, 11)), rating_count=1))
+    db.commit()
+    db.close()
+
+
+def test_panel_and_features_cover_every_user_and_day(session_factory):
+    seed(session_factory, users=3, days=20)
+    db = session_factory()
+    panel = forecasting.load_daily_panel(db, AS_OF, history_days=30)
+    assert len(panel) == 3 * 30
+    assert panel["stress"].between(0, 1).sum() == panel[forecasting.WEARABLE_COLUMNS].notna().all(axis=1).sum()
+
+    features = forecasting.build_features(panel)
+    assert features.index.equals(panel.index)
+    # Per-user lags and windows, never spilling over from the previous user
+    np.testing.assert_array_equal(features.loc[2, "steps_lag1"].to_numpy()[1:], panel.loc[2, "steps"].to_numpy()[:-1])
+    assert np.isnan(features.loc[2, "steps_lag1"].iloc[0])
+    assert np.isclose(features.loc[2, "stress_mean3"].iloc[-1], panel.loc[2, "stress"].iloc[-3:].mean())
+
+
+def test_forecasts_are_stored_for_every_user_and_horizon(session_factory):
+    seed(session_factory)
+    summary = forecasting.run_forecast(session_factory, as_of=AS_OF, horizon_days=5)
+    assert summary["method"] == "model"
+    assert summary["users"] == 12 and summary["rows"] == 60
+
+    db = session_factory()
+    rows = db.query(StressForecast).all()
+    assert len(rows) == 60
+    assert {row.forecast_date for row in rows} == {AS_OF + timedelta(days=h) for h in range(1, 6)}
+    assert all(0 <= row.stress_probability <= 1 for row in rows)
+
+    # A second run replaces the rows rather than adding to them
+    forecasting.run_forecast(session_factory, as_of=AS_OF, horizon_days=5)
+    assert db.query(StressForecast).count() == 60
+
+
+def test_short_history_falls_back_to_rolling_mean(session_factory):
+    seed(session_factory, users=2, days=3)
+    summary = forecasting.run_forecast(session_factory, as_of=AS_OF, horizon_days=3)
+    assert summary["method"] == "rolling_mean"
+    assert summary["rows"] == 6
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta
+
+from jose import JWTError, jwt
+
+from jwt_keys import JWTKeyRing
+
+
+def issue(ring, subject="ada"):
+    kid, secret = ring.signing_key()
+    return jwt.encode(
+        {"sub": subject, "exp": datetime.utcnow() + timedelta(minutes=5)},
+        secret, algorithm="HS256", headers={"kid": kid}
+    )
+
+
+def validate(ring, token):
+    return jwt.decode(token, ring.key_for(token), algorithms=["HS256"])["sub"]
+
+
+def test_tokens_validate_on_every_worker_with_the_same_config():
+    worker_a = JWTKeyRing({"k1": "secret-one"})
+    worker_b = JWTKeyRing({"k1": "secret-one"})
+    assert validate(worker_b, issue(worker_a)) == "ada"
+
+
+def test_rotation_keeps_tokens_signed_with_the_previous_key_valid():
+    before = JWTKeyRing({"k1": "secret-one"})
+    old_token = issue(before)
+
+    after = JWTKeyRing({"k2": "secret-two", "k1": "secret-one"}, active_kid="k2")
+    assert jwt.get_unverified_header(issue(after))["kid"] == "k2"
+    assert validate(after, old_token) == "ada"
+
+    retired = JWTKeyRing({"k2": "secret-two"})
+    try:
+        validate(retired, old_token)
+    except JWTError:
+        pass
+    else:
+        raise AssertionError("a token signed with a removed key must be rejected")
+
+
+if __name__ == "__main__":
+    test_tokens_validate_on_every_worker_with_the_same_config()
+    test_rotation_keeps_tokens_signed_with_the_previous_key_valid()
+    print("✅ JWT key ring tests passed")
@@ -0,0 +1,92 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+import migrations
+from migrations import LATEST_VERSION, SchemaVersionError, check_schema_version, current_version, migrate
+
+# fitbit_data and fitbit_auth_sessions as shipped in CalmCast.sql: no source column, no expiry index
+DUMP_SCHEMA = [
+    """CREATE TABLE fitbit_data (
+        id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, heart_rate INTEGER, sleep_hours DECIMAL(3, 1),
+        steps INTEGER, calories_burned INTEGER, data_date DATE NOT NULL,
+        recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, is_manual_edit BOOLEAN NOT NULL DEFAULT 0,
+        CONSTRAINT user_date UNIQUE (user_id, data_date))""",
+    """CREATE TABLE fitbit_auth_sessions (
+        id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, state_token VARCHAR(255) NOT NULL UNIQUE,
+        created_at DATETIME, expires_at DATETIME NOT NULL)""",
+    """CREATE TABLE mood_entries (
+        id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, rating INTEGER NOT NULL,
+        notes TEXT, entry_date DATE NOT NULL, created_at DATETIME)""",
+]
+
+
+def make_engine(tmp_path):
+    return create_engine(f"sqlite:///{tmp_path / 'calmcast.db'}")
+
+
+def test_fresh_database_is_migrated_once(tmp_path):
+    engine = make_engine(tmp_path)
+    assert current_version(engine) == 0
+    with pytest.raises(SchemaVersionError):
+        check_schema_version(engine)
+
+    assert migrate(engine) == [version for version, _ in migrations.MIGRATIONS]
+    assert check_schema_version(engine) == LATEST_VERSION
+    assert {"users", "fitbit_data", "fitbit_backfill_jobs", "mood_daily_rollup"} <= set(inspect(engine).get_table_names())
+
+    assert migrate(engine) == []
+
+
+def test_dump_database_is_brought_up_to_date(tmp_path):
+    engine = make_engine(tmp_path)
+    with engine.begin() as connection:
+        for ddl in DUMP_SCHEMA:
+            connection.exec_driver_sql(ddl)
+        for row_id in range(1, 8):
+            connection.execute(text(
+                "INSERT INTO fitbit_data (id, user_id, data_date, is_manual_edit) VALUES (:id, 1, :day, 0)"
+            ), {"id": row_id, "day": date(2026, 1, row_id)})
+        connection.exec_driver_sql(
+            "INSERT INTO mood_entries (user_id, rating, entry_date) VALUES (1, 4, '2026-01-01'), "
+            "(1, 6, '2026-01-01'), (900, 5, '2026-01-02')"
+        )
+
+    # Small batches so the backfills take several ranges
+    migrations.MIGRATION_BATCH_SIZE = 3
+    try:
+        migrate(engine)
+    finally:
+        migrations.MIGRATION_BATCH_SIZE = 5000
+
+    inspector = inspect(engine)
+    assert "source" in {column["name"] for column in inspector.get_columns("fitbit_data")}
+    fitbit_indexes = {index["name"] for index in inspector.get_indexes("fitbit_data")}
+    assert {"ix_fitbit_data_user_manual_date", "ix_fitbit_data_recorded_at"} <= fitbit_indexes
+    assert ["expires_at"] in [index["column_names"] for index in inspector.get_indexes("fitbit_auth_sessions")]
+    with engine.connect() as connection:
+        assert connection.scalar(text("SELECT COUNT(*) FROM fitbit_data WHERE source = 'fitbit'")) == 7
+        rollup = connection.execute(text(
+            "SELECT user_id, rating_sum, rating_count FROM mood_daily_rollup ORDER BY user_id"
+        )).all()
+    assert [tuple(row) for row in rollup] == [(1, 10, 2), (900, 5, 1)]
+
+
+def test_partial_migration_fails_the_version_check(tmp_path):
+    engine = make_engine(tmp_path)
+    assert migrate(engine, target=2) == [1, 2]
+    with pytest.raises(SchemaVersionError):
+        check_schema_version(engine)
+    assert migrate(engine) == list(range(3, LATEST_VERSION + 1))
+
+
+if __name__ == "__main__":
+    import pathlib
+    import tempfile
+
+    for test in (test_fresh_database_is_migrated_once, test_dump_database_is_brought_up_to_date,
+                 test_partial_migration_fails_the_version_check):
+        with tempfile.TemporaryDirectory() as tmp:
+            test(pathlib.Path(tmp))
+    print("✅ Migration tests passed")
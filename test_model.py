@@ -1,4 +1,6 @@
-from stress_model import predict_stress
+import numpy as np
+
+from stress_model import STRESS_LABELS, predict_stress, registry, score_features
 
 test_data = {
     "heart_rate": 80,
@@ -7,4 +9,29 @@ test_data = {
     "calories_burned": 1800
 }
 
-print(predict_stress(test_data))
+FIXED_INPUTS = np.array([
+    [80, 6.0, 5000],
+    [62, 8.5, 11000],
+    [118, 4.2, 1200],
+    [95, 7.0, 300],
+    [55, 9.0, 20000],
+], dtype=float)
+
+
+def test_single_pass_matches_predict_and_predict_proba():
+    loaded = registry.get()
+    forest = loaded.model
+    labels = forest.predict(FIXED_INPUTS)
+    probabilities = forest.predict_proba(FIXED_INPUTS)
+
+    results = score_features(FIXED_INPUTS, loaded)
+    for label, row_probabilities, result in zip(labels, probabilities, results):
+        assert result.prediction == STRESS_LABELS[int(label)]
+        assert result.confidence == float(np.max(row_probabilities))
+        assert list(result.probabilities.values()) == row_probabilities.tolist()
+
+
+if __name__ == "__main__":
+    print(predict_stress(test_data))
+    test_single_pass_matches_predict_and_predict_proba()
+    print("✅ Model tests passed")
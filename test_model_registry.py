@@ -0,0 +1,159 @@
+import os
+import time
+
+import joblib
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+import stress_model
+from model_registry import LoadedModel, ModelRegistry
+from prediction_cache import prediction_cache
+
+ROWS = np.array([[80, 6.0, 5000], [118, 4.2, 1200], [55, 9.0, 20000]], dtype=float)
+
+
+def train_forest(seed):
+    rng = np.random.default_rng(seed)
+    X = np.column_stack([
+        rng.uniform(50, 130, 400),
+        rng.uniform(3, 10, 400),
+        rng.uniform(0, 20000, 400),
+    ])
+    y = (X[:, 0] > 90).astype(int)
+    return RandomForestClassifier(n_estimators=5, max_depth=4, random_state=seed).fit(X, y)
+
+
+def write_artifact(path, seed, mtime=None):
+    joblib.dump(train_forest(seed), path)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+@pytest.fixture
+def artifact(tmp_path):
+    path = str(tmp_path / "stress_model.pkl")
+    write_artifact(path, seed=1)
+    return path
+
+
+def test_model_is_loaded_on_first_get(artifact):
+    registry = ModelRegistry(artifact)
+    assert registry.peek() is None
+    assert registry.status()["loaded"] is False
+
+    loaded = registry.get()
+    assert isinstance(loaded, LoadedModel)
+    assert registry.peek() is loaded
+    assert registry.get() is loaded
+    assert registry.reloads == 0
+
+
+def test_reload_swaps_while_old_model_keeps_serving(artifact):
+    registry = ModelRegistry(artifact)
+    old = registry.get()
+    old_probabilities = old.predict_proba(ROWS)
+
+    # Unchanged file: reload is a no-op unless forced
+    assert registry.reload() is old
+
+    write_artifact(artifact, seed=2, mtime=old.mtime + 10)
+    new = registry.reload()
+    assert new is not old
+    assert new.version != old.version
+    assert registry.get() is new
+    assert registry.reloads == 1
+
+    # A prediction that grabbed the old LoadedModel before the swap finishes on it
+    assert np.array_equal(old.predict_proba(ROWS), old_probabilities)
+    assert np.array_equal(new.predict_proba(ROWS), new.model.predict_proba(ROWS))
+
+
+def test_failed_reload_keeps_current_model(artifact):
+    registry = ModelRegistry(artifact)
+    current = registry.get()
+    with open(artifact, "wb") as f:
+        f.write(b"not a pickle")
+
+    with pytest.raises(Exception):
+        registry.reload(force=True)
+    assert registry.get() is current
+    assert registry.status()["last_error"]
+
+
+def test_watcher_reloads_when_mtime_changes(artifact):
+    registry = ModelRegistry(artifact, watch_interval=0.05)
+    try:
+        old = registry.get()
+        assert registry.status()["watching"] is True
+
+        write_artifact(artifact, seed=2, mtime=old.mtime + 10)
+        deadline = time.monotonic() + 5
+        while registry.reloads == 0 and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        assert registry.reloads == 1
+        assert registry.get().version != old.version
+    finally:
+        registry.stop_watcher()
+
+
+def test_reload_callbacks_receive_the_new_model(artifact):
+    registry = ModelRegistry(artifact)
+    seen = []
+    registry.on_reload(seen.append)
+    registry.on_reload(lambda loaded: 1 / 0)  # a failing callback doesn't stop the swap
+
+    loaded = registry.reload(force=True)
+    assert seen == [loaded]
+    assert registry.get() is loaded
+
+
+def test_reload_clears_prediction_cache():
+    stress_model.predict_stress({"heart_rate": 80, "sleep_hours": 6, "steps": 5000})
+    prediction_cache.put(("stale",), "entry")
+    assert prediction_cache.stats()["size"] > 0
+
+    stress_model.registry.reload(force=True)
+    assert prediction_cache.stats()["size"] == 0
+
+
+def test_compiled_engine_memory_maps_sidecar(artifact):
+    registry = ModelRegistry(artifact, engine="compiled", mmap_mode="r")
+    loaded = registry.get()
+
+    sidecar = f"{artifact}.{loaded.version}.compiled"
+    assert os.path.exists(sidecar)
+    assert isinstance(loaded.compiled.threshold, np.memmap)
+    assert np.allclose(loaded.predict_proba(ROWS), loaded.model.predict_proba(ROWS))
+
+    # A second process (or reload) reuses the sidecar instead of rewriting it
+    written_at = os.path.getmtime(sidecar)
+    again = ModelRegistry(artifact, engine="compiled", mmap_mode="r").get()
+    assert os.path.getmtime(sidecar) == written_at
+    assert np.array_equal(again.compiled.threshold, loaded.compiled.threshold)
+
+
+def test_status_reports_footprint(artifact):
+    registry = ModelRegistry(artifact, engine="compiled")
+    registry.get()
+    status = registry.status()
+
+    loaded = registry.peek()
+    forest_bytes = sum(
+        estimator.tree_.__getstate__()["nodes"].nbytes + estimator.tree_.__getstate__()["values"].nbytes
+        for estimator in loaded.model.estimators_
+    )
+    assert status["loaded"] is True
+    assert status["engine"] == "compiled"
+    assert status["version"] == loaded.version
+    assert status["load_seconds"] >= 0
+    assert status["loaded_at"] == loaded.loaded_at.isoformat()
+    assert status["memory_bytes"] == forest_bytes + loaded.compiled.nbytes
+    assert status["reloads"] == 0
+    assert status["watching"] is False
+    assert status["last_error"] is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
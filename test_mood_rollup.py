@@ -0,0 +1,89 @@
+import asyncio
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database import Base
+from models import User, MoodEntry, MoodDailyRollup
+from mood import MoodRating, add_mood_rating, get_weekly_mood_data, get_average_mood
+from mood_rollup import add_to_rollup, rebuild_mood_rollup
+
+
+def rollup(db):
+    return {
+        (row.user_id, row.entry_date): (row.rating_sum, row.rating_count)
+        for row in db.query(MoodDailyRollup).all()
+    }
+
+
+def test_incremental_rollup_matches_a_rebuild(session_factory):
+    db = session_factory()
+    today = date.today()
+    ratings = [(1, today, 7), (1, today, 3), (1, today - timedelta(days=1), 5), (2, today, 9)]
+    for user_id, day, rating in ratings:
+        db.add(MoodEntry(user_id=user_id, rating=rating, entry_date=day))
+        add_to_rollup(db, user_id, day, rating)
+    db.commit()
+
+    incremental = rollup(db)
+    assert incremental[(1, today)] == (10, 2)
+    assert incremental[(2, today)] == (9, 1)
+
+    rebuild_mood_rollup(db)
+    db.commit()
+    assert rollup(db) == incremental
+
+    # A rebuild for one user leaves the others alone
+    db.add(MoodEntry(user_id=1, rating=1, entry_date=today))
+    rebuild_mood_rollup(db, user_id=1)
+    db.commit()
+    assert rollup(db)[(1, today)] == (11, 3)
+    assert rollup(db)[(2, today)] == (9, 1)
+
+
+def test_rebuild_for_a_range_of_users(session_factory):
+    db = session_factory()
+    for user_id in (1, 2, 3):
+        db.add(MoodEntry(user_id=user_id, rating=user_id, entry_date=date.today()))
+    db.commit()
+
+    assert rebuild_mood_rollup(db, user_ids=(2, 4)) == 2
+    db.commit()
+    assert rollup(db) == {(2, date.today()): (2, 1), (3, date.today()): (3, 1)}
+
+
+def test_mood_endpoints_read_the_rollup():
+    async def scenario():
+        engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        statements = []
+        event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+        session_factory = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+        async with session_factory() as db:
+            user = User(name="Ada", username="ada", email="ada@example.com", password_hash="x")
+            db.add(user)
+            await db.commit()
+            for rating in (6, 9):
+                await add_mood_rating(MoodRating(rating=rating), current_user=user, db=db)
+
+            statements.clear()
+            weekly = await get_weekly_mood_data(current_user=user, db=db)
+            average = await get_average_mood(days=30, current_user=user, db=db)
+        await engine.dispose()
+        return weekly, average, statements
+
+    weekly, average, statements = asyncio.run(scenario())
+    assert len(weekly) == 7
+    assert weekly[-1] == {"date": date.today().strftime("%a"), "rating": 7.5}
+    assert all(day["rating"] is None for day in weekly[:-1])
+    assert average == {"average_mood": 7.5, "total_entries": 2}
+    assert not any("mood_entries" in sql for sql in statements)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
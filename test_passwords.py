@@ -0,0 +1,63 @@
+import asyncio
+import hashlib
+import time
+
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import auth_simple
+from database import Base
+from models import User
+
+
+async def make_session_factory(password_hash):
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+    async with session_factory() as db:
+        db.add(User(name="Ada", username="ada", email="ada@example.com", password_hash=password_hash))
+        await db.commit()
+    return session_factory
+
+
+def test_legacy_sha256_hash_is_upgraded_on_login():
+    async def scenario():
+        session_factory = await make_session_factory(hashlib.sha256(b"pw").hexdigest())
+        async with session_factory() as db:
+            assert await auth_simple.authenticate_user(db, "ada", "wrong") is False
+            user = await auth_simple.authenticate_user(db, "ada", "pw")
+        return user
+
+    user = asyncio.run(scenario())
+    assert user and user.password_hash.startswith("$2b$")
+    assert auth_simple.verify_password("pw", user.password_hash)
+
+
+def test_hashing_runs_off_the_event_loop():
+    async def scenario():
+        session_factory = await make_session_factory(auth_simple.get_password_hash("pw"))
+        ticks = []
+
+        async def ticker():
+            while True:
+                ticks.append(time.perf_counter())
+                await asyncio.sleep(0.005)
+
+        async def login():
+            async with session_factory() as db:
+                return await auth_simple.authenticate_user(db, "ada", "pw")
+
+        task = asyncio.create_task(ticker())
+        await asyncio.gather(login(), login())
+        task.cancel()
+        return max(b - a for a, b in zip(ticks, ticks[1:]))
+
+    # A bcrypt check takes well over 50 ms; the loop must keep ticking meanwhile
+    assert asyncio.run(scenario()) < 0.05
+
+
+if __name__ == "__main__":
+    test_legacy_sha256_hash_is_upgraded_on_login()
+    test_hashing_runs_off_the_event_loop()
+    print("✅ Password hashing tests passed")
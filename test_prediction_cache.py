@@ -0,0 +1,81 @@
+import time
+
+import joblib
+import numpy as np
+
+import stress_model
+from compiled_forest import CompiledForest
+from prediction_cache import PredictionCache, StressLookupTable, quantize_features
+
+
+def test_lru_eviction_and_counters():
+    cache = PredictionCache(max_size=2, ttl=60)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)  # evicts "b", the least recently used
+
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"]) == (2, 1, 1)
+
+
+def test_ttl_expiry_and_invalidation():
+    cache = PredictionCache(max_size=10, ttl=0.01)
+    cache.put("a", 1)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+    cache.ttl = 60
+    cache.put("a", 1)
+    cache.clear()
+    assert cache.get("a") is None
+
+
+def test_quantize_features_matches_storage_resolution():
+    assert quantize_features(72.4, 7.26, 8000.6) == (72, 7.3, 8001)
+
+
+def test_lookup_table_matches_forest_on_quantized_domain():
+    forest = CompiledForest.from_sklearn(joblib.load("stress_model.pkl"))
+    table = StressLookupTable(forest, "test")
+
+    rng = np.random.default_rng(7)
+    rows = np.column_stack([
+        rng.integers(40, 121, 5000),
+        rng.integers(0, 241, 5000) / 10,
+        rng.integers(0, 50001, 5000),
+    ])
+    expected = forest.predict_proba(rows)
+    actual = np.array([table.lookup(int(hr), sleep, int(steps)) for hr, sleep, steps in rows])
+
+    np.testing.assert_allclose(actual, expected, atol=1e-12)
+    assert table.lookup(200, 7.0, 5000) is None
+
+
+def test_prediction_does_not_depend_on_cache_setting():
+    # Sleep values just off the 0.1 h grid used to flip between configurations
+    rows = [
+        {"heart_rate": 80.4, "sleep_hours": hours, "steps": 5000.3}
+        for hours in np.arange(3.0, 9.0, 0.0137)
+    ]
+    stress_model.prediction_cache.clear()
+    cached = stress_model.score_rows(rows)
+
+    stress_model.PREDICTION_CACHE_ENABLED = False
+    try:
+        uncached = stress_model.score_rows(rows)
+    finally:
+        stress_model.PREDICTION_CACHE_ENABLED = True
+    assert uncached == cached
+
+
+if __name__ == "__main__":
+    test_lru_eviction_and_counters()
+    test_ttl_expiry_and_invalidation()
+    test_quantize_features_matches_storage_resolution()
+    test_lookup_table_matches_forest_on_quantized_domain()
+    test_prediction_does_not_depend_on_cache_setting()
+    print("✅ Prediction cache tests passed")
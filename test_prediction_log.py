@@ -0,0 +1,43 @@
+import asyncio
+import threading
+
+from prediction_log import PredictionLogWriter
+
+
+def test_rows_are_flushed_in_bulk_and_on_stop():
+    flushed = []
+    writer = PredictionLogWriter(write_fn=flushed.append, flush_rows=50, flush_ms=1000)
+
+    assert writer.enqueue_nowait([{"n": i} for i in range(120)]) == []
+    writer.stop()
+
+    assert [len(batch) for batch in flushed][:2] == [50, 50]
+    assert sum(len(batch) for batch in flushed) == 120
+    assert writer.stats()["written"] == 120
+
+
+def test_full_buffer_falls_back_to_direct_write():
+    release = threading.Event()
+    written = []
+
+    def slow_write(records):
+        release.wait(5)
+        written.extend(records)
+
+    writer = PredictionLogWriter(write_fn=slow_write, flush_rows=1, flush_ms=0, max_queue=2, backpressure_ms=20)
+
+    async def scenario():
+        asyncio.get_running_loop().call_later(0.1, release.set)
+        await writer.submit([{"n": i} for i in range(6)])
+
+    asyncio.run(scenario())
+    writer.stop()
+
+    assert writer.overflow_writes == 1
+    assert sorted(record["n"] for record in written) == list(range(6))
+
+
+if __name__ == "__main__":
+    test_rows_are_flushed_in_bulk_and_on_stop()
+    test_full_buffer_falls_back_to_direct_write()
+    print("✅ Prediction log writer tests passed")
@@ -0,0 +1,106 @@
+"""
+Query-plan regression test: drive the routers against SQLite, then run
+EXPLAIN QUERY PLAN on every SELECT/UPDATE/DELETE they issued and fail on any
+full table scan.
+"""
+import asyncio
+from datetime import date, datetime, timedelta
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from auth_simple import router as auth_router
+from database import Base, get_async_db
+from fitbit import router as fitbit_router
+from models import FitbitConnection
+from mood import router as mood_router
+from users import router as users_router
+
+# The routers as app.py mounts them
+api = FastAPI()
+api.include_router(auth_router, prefix="/api")
+api.include_router(users_router, prefix="/api/users")
+api.include_router(mood_router, prefix="/api")
+api.include_router(fitbit_router, prefix="/api")
+
+
+async def exercise_routers(session_factory):
+    async def override_db():
+        async with session_factory() as db:
+            yield db
+
+    api.dependency_overrides[get_async_db] = override_db
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=api), base_url="http://test") as client:
+            await client.post("/api/users/register", json={
+                "username": "ada", "email": "ada@example.com", "password": "pw", "name": "Ada"
+            })
+            login = (await client.post("/api/token", params={"username": "ada", "password": "pw"})).json()
+            headers = {"Authorization": f"Bearer {login['access_token']}"}
+
+            async with session_factory() as db:
+                db.add(FitbitConnection(
+                    user_id=login["user"]["id"], fitbit_user_id="ABC123", access_token="a", refresh_token="r",
+                    token_expires_at=datetime.now() + timedelta(hours=8), last_sync_at=datetime.now()
+                ))
+                await db.commit()
+
+            requests = [
+                ("GET", "/api/users/me", None),
+                ("PUT", "/api/users/me", {"name": "Ada L.", "email": "ada@example.org"}),
+                ("GET", "/api/users/me/fitbit-status", None),
+                ("POST", "/api/mood", {"rating": 7}),
+                ("GET", "/api/mood", None),
+                ("GET", "/api/mood/weekly", None),
+                ("GET", "/api/mood/average", None),
+                ("POST", "/api/fitbit/manual-data", {"sleep_hours": 7, "steps": 5000, "heart_rate": 70}),
+                ("GET", "/api/fitbit/data", None),
+                ("GET", "/api/fitbit/current-data", None),
+                ("GET", "/api/fitbit/manual-data/history", None),
+                ("GET", f"/api/fitbit/historical/{date.today().isoformat()}", None),
+                ("DELETE", "/api/fitbit/manual-data/today", None),
+                ("DELETE", "/api/users/me/fitbit-connection", None),
+            ]
+            for method, path, body in requests:
+                response = await client.request(method, path, json=body, headers=headers)
+                assert response.status_code == 200, (path, response.text)
+            await client.post("/api/logout", params={"session_token": login["session_token"]})
+    finally:
+        api.dependency_overrides.pop(get_async_db, None)
+
+
+def test_router_queries_use_indexes(tmp_path):
+    url = f"sqlite:///{tmp_path / 'plans.db'}"
+    Base.metadata.create_all(bind=create_engine(url))
+
+    async_engine = create_async_engine(url.replace("sqlite", "sqlite+aiosqlite", 1))
+    statements = []
+
+    @event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().split(" ", 1)[0].upper() in ("SELECT", "UPDATE", "DELETE"):
+            statements.append((statement, parameters))
+
+    asyncio.run(exercise_routers(async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)))
+    asyncio.run(async_engine.dispose())
+    assert len(statements) > 15
+
+    full_scans = []
+    with create_engine(url).connect() as connection:
+        for statement, parameters in statements:
+            plan = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+            scans = [row[-1] for row in plan if row[-1].startswith("SCAN ")]
+            if scans:
+                full_scans.append((statement, scans))
+    assert not full_scans, "Full table scans:\n" + "\n".join(f"{plan}: {sql}" for sql, plan in full_scans)
+
+
+if __name__ == "__main__":
+    import pathlib
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as directory:
+        test_router_queries_use_indexes(pathlib.Path(directory))
+    print("✅ Query plan tests passed")
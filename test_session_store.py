@@ -0,0 +1,87 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+import auth_simple
+from database import Base
+from models import User, UserSession, FitbitAuthSession
+from session_store import SessionStore, SessionSweeper, DatabaseSessionBackend, MemorySessionBackend
+
+
+def test_sweeper_deletes_expired_rows_in_batches(session_factory):
+    db = session_factory()
+    past, future = datetime.utcnow() - timedelta(days=1), datetime.utcnow() + timedelta(days=1)
+    db.add_all([UserSession(user_id=1, session_token=f"old-{i}", expires_at=past) for i in range(25)])
+    db.add_all([UserSession(user_id=1, session_token=f"live-{i}", expires_at=future) for i in range(3)])
+    db.add_all([
+        FitbitAuthSession(user_id=1, state_token=f"state-{i}", expires_at=datetime.now() - timedelta(minutes=5))
+        for i in range(4)
+    ])
+    db.commit()
+    db.close()
+
+    store = SessionStore(DatabaseSessionBackend(session_factory))
+    sweeper = SessionSweeper(store, session_factory, batch_size=10, max_batches=2, pause_ms=0)
+
+    # Two batches of ten per run, so the last five wait for the next run
+    assert sweeper.run_once() == {"memory_sessions": 0, "user_sessions": 20, "fitbit_auth_sessions": 4}
+    assert sweeper.run_once()["user_sessions"] == 5
+
+    db = session_factory()
+    assert sorted(row.session_token for row in db.query(UserSession).all()) == ["live-0", "live-1", "live-2"]
+    assert db.query(FitbitAuthSession).count() == 0
+    db.close()
+
+
+def test_database_and_memory_backends_resolve_and_revoke_tokens(session_factory):
+    for backend in (DatabaseSessionBackend(session_factory), MemorySessionBackend()):
+        store = SessionStore(backend)
+        token, _ = store.create(42)
+        assert store.get_user_id(token) == 42
+        store.revoke(token)
+        assert store.get_user_id(token) is None
+
+        expired = SessionStore(backend, ttl=timedelta(seconds=-1))
+        token, _ = expired.create(42)
+        assert store.get_user_id(token) is None
+
+
+def test_logout_revokes_the_access_token():
+    auth_simple.principal_cache.invalidate("ada")
+
+    async def scenario():
+        engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+            session_factory = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+            async with session_factory() as db:
+                db.add(User(name="Ada", username="ada", email="ada@example.com",
+                            password_hash=auth_simple.get_password_hash("pw")))
+                await db.commit()
+
+            async with session_factory() as db:
+                login = await auth_simple.login_for_access_token("ada", "pw", db=db)
+            async with session_factory() as db:
+                user = await auth_simple.get_current_user(token=login["access_token"], db=db)
+                assert user.username == "ada"
+
+            async with session_factory() as db:
+                await auth_simple.logout(login["session_token"], db=db)
+            # Still a cached principal, but its session is gone
+            async with session_factory() as db:
+                with pytest.raises(HTTPException) as rejected:
+                    await auth_simple.get_current_user(token=login["access_token"], db=db)
+                assert rejected.value.status_code == 401
+        finally:
+            await engine.dispose()
+
+    asyncio.run(scenario())
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
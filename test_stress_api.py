@@ -0,0 +1,126 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+import app as calmcast
+from auth_simple import get_current_user
+from inference import BoundedExecutor, PoolSaturatedError
+from prediction_log import PredictionLogWriter
+from stress_model import predict_stress, prediction_cache
+
+ROWS = [
+    {"heart_rate": 62, "sleep_hours": 8.5, "steps": 11000},
+    {"heart_rate": 118, "sleep_hours": 4.2, "steps": 1200},
+    {"heart_rate": 75, "sleep_hours": 6.0, "steps": 6400},
+    {"heart_rate": 101, "sleep_hours": 5.1, "steps": 3000},
+]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Calls app.py's routes as user 7, with prediction log flushes captured instead of written"""
+    flushed = []
+    writer = PredictionLogWriter(write_fn=flushed.append, flush_rows=10_000, flush_ms=500)
+    monkeypatch.setattr(calmcast, "prediction_log_writer", writer)
+    calmcast.app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(id=7)
+
+    def call(method, path, **kwargs):
+        async def send():
+            transport = httpx.ASGITransport(app=calmcast.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+                return await http.request(method, path, **kwargs)
+        return asyncio.run(send())
+
+    call.flush_log = lambda: (writer.stop(), flushed)[1]
+    yield call
+    writer.stop()
+    calmcast.app.dependency_overrides.clear()
+
+
+def test_batch_results_come_back_in_input_order(client):
+    response = client("POST", "/api/stress/predict/batch", json={"rows": ROWS})
+    assert response.status_code == 200
+    results = response.json()["results"]
+
+    assert len(results) == len(ROWS)
+    for row, result in zip(ROWS, results):
+        expected = predict_stress(row)
+        assert (result["prediction"], result["confidence"]) == (expected["prediction"], expected["confidence"])
+        assert result["method"] == "ml_model"
+
+
+def test_batch_is_logged_with_one_bulk_insert(client):
+    client("POST", "/api/stress/predict/batch", json={"rows": ROWS * 25})
+
+    flushed = client.flush_log()
+    assert len(flushed) == 1
+    assert len(flushed[0]) == 100
+    assert {record["user_id"] for record in flushed[0]} == {7}
+    assert [record["heart_rate"] for record in flushed[0][:4]] == [row["heart_rate"] for row in ROWS]
+
+
+def test_oversized_batch_is_rejected(client, monkeypatch):
+    monkeypatch.setattr(calmcast, "STRESS_BATCH_MAX_ROWS", 3)
+    response = client("POST", "/api/stress/predict/batch", json={"rows": ROWS})
+    assert response.status_code == 400
+    assert "max 3" in response.json()["detail"]
+    assert client.flush_log() == []
+
+
+def test_empty_batch(client):
+    response = client("POST", "/api/stress/predict/batch", json={"rows": []})
+    assert response.status_code == 200
+    assert response.json() == {"status": "success", "results": []}
+    assert client.flush_log() == []
+
+
+def test_busy_pool_rejects_new_work():
+    async def scenario():
+        pool = BoundedExecutor("test", "thread", 1, 1)
+        release = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        running = asyncio.create_task(pool.run(lambda: asyncio.run_coroutine_threadsafe(release.wait(), loop).result()))
+        await asyncio.sleep(0.01)
+        with pytest.raises(PoolSaturatedError):
+            await pool.run(sum, [1, 2])
+        release.set()
+        await running
+        pool.shutdown()
+        return pool.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["rejected"] == 1 and stats["completed"] == 1
+
+
+def test_saturated_inference_pool_returns_503(client, monkeypatch):
+    monkeypatch.setattr(calmcast, "inference_pool", BoundedExecutor("inference", "thread", 1, 0))
+    monkeypatch.setattr(calmcast, "MICRO_BATCH_ENABLED", False)
+    monkeypatch.setattr(calmcast, "cached_stress_prediction", lambda *args, **kwargs: None)
+
+    for path, body in (("/api/stress/predict", ROWS[0]), ("/api/stress/predict/batch", {"rows": ROWS})):
+        response = client("POST", path, json=body)
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+    assert calmcast.inference_pool.stats()["rejected"] == 2
+
+
+def test_process_pool_results_fill_the_parent_cache(client, monkeypatch):
+    pool = BoundedExecutor("inference", "process", 1, 4)
+    monkeypatch.setattr(calmcast, "inference_pool", pool)
+    monkeypatch.setattr(calmcast, "MICRO_BATCH_ENABLED", False)
+    calmcast.model_registry.get()  # startup loads the parent's copy in process mode
+    prediction_cache.clear()
+    try:
+        first = client("POST", "/api/stress/predict", json=ROWS[1]).json()
+        second = client("POST", "/api/stress/predict", json=ROWS[1]).json()
+    finally:
+        pool.shutdown()
+
+    assert first == second
+    assert pool.stats()["completed"] == 1  # the repeat was answered from the parent's cache
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
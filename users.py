@@ -1,11 +1,14 @@
 # users.py - COMPLETE FILE
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
 from models import User, FitbitConnection
-from auth_simple import get_current_user, get_password_hash
+from auth_simple import get_current_user, hash_password, check_password, principal_cache
+from fitbit_tokens import fitbit_token_manager
 from pydantic import BaseModel
 from datetime import datetime
+import asyncio
 
 router = APIRouter()
 
@@ -23,16 +26,16 @@ class UserUpdate(BaseModel):
     new_password: str = None
 
 @router.post("/register")
-async def register(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register(user_data: UserCreate, db: AsyncSession = Depends(get_async_db)):
     # Check if user exists
-    if db.query(User).filter(User.username == user_data.username).first():
+    if await db.scalar(select(User.id).where(User.username == user_data.username)):
         raise HTTPException(status_code=400, detail="Username already registered")
     
-    if db.query(User).filter(User.email == user_data.email).first():
+    if await db.scalar(select(User.id).where(User.email == user_data.email)):
         raise HTTPException(status_code=400, detail="Email already registered")
     
     # Create user (NO FAKE DATA)
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await hash_password(user_data.password)
     user = User(
         username=user_data.username,
         email=user_data.email,
@@ -41,15 +44,14 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
     )
     
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
     
     return {"message": "User created successfully", "user_id": user.id}
 
 @router.get("/me")
-async def get_current_user_info(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def get_current_user_info(current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
     # Check if user has Fitbit connected
-    fitbit_connection = db.query(FitbitConnection).filter(FitbitConnection.user_id == current_user.id).first()
+    fitbit_connection = await db.scalar(select(FitbitConnection).where(FitbitConnection.user_id == current_user.id))
     fitbit_connected = fitbit_connection is not None
     
     # Get last sync time if connected
@@ -77,23 +79,25 @@ async def get_current_user_info(current_user: User = Depends(get_current_user),
 async def update_user_info(
     user_data: UserUpdate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Verify current password if changing password
     if user_data.new_password and not user_data.current_password:
         raise HTTPException(status_code=400, detail="Current password required to set new password")
     
+    previous_username = current_user.username
+    
     # Update fields
     if user_data.username:
         # Check if username is taken
-        existing = db.query(User).filter(User.username == user_data.username, User.id != current_user.id).first()
+        existing = await db.scalar(select(User.id).where(User.username == user_data.username, User.id != current_user.id))
         if existing:
             raise HTTPException(status_code=400, detail="Username already taken")
         current_user.username = user_data.username
     
     if user_data.email:
         # Check if email is taken
-        existing = db.query(User).filter(User.email == user_data.email, User.id != current_user.id).first()
+        existing = await db.scalar(select(User.id).where(User.email == user_data.email, User.id != current_user.id))
         if existing:
             raise HTTPException(status_code=400, detail="Email already taken")
         current_user.email = user_data.email
@@ -102,15 +106,19 @@ async def update_user_info(
         current_user.name = user_data.name
     
     if user_data.new_password:
-        from auth_simple import verify_password
-        if not verify_password(user_data.current_password, current_user.password_hash):
+        # Not the cached principal's copy: another worker may have changed it since
+        stored_hash = await db.scalar(select(User.password_hash).where(User.id == current_user.id))
+        matches, _ = await check_password(user_data.current_password, stored_hash)
+        if not matches:
             raise HTTPException(status_code=400, detail="Current password is incorrect")
-        current_user.password_hash = get_password_hash(user_data.new_password)
+        current_user.password_hash = await hash_password(user_data.new_password)
     
-    db.commit()
+    await db.commit()
+    # Tokens are keyed by username, so drop the cached principal under both names
+    principal_cache.invalidate(previous_username, current_user.username)
     
     # Return updated user info including Fitbit status
-    fitbit_connection = db.query(FitbitConnection).filter(FitbitConnection.user_id == current_user.id).first()
+    fitbit_connection = await db.scalar(select(FitbitConnection).where(FitbitConnection.user_id == current_user.id))
     fitbit_connected = fitbit_connection is not None
     fitbit_last_sync = None
     if fitbit_connection and fitbit_connection.last_sync_at:
@@ -131,8 +139,8 @@ async def update_user_info(
 
 # Optional: Add endpoint to check Fitbit connection status specifically
 @router.get("/me/fitbit-status")
-async def get_fitbit_status(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    fitbit_connection = db.query(FitbitConnection).filter(FitbitConnection.user_id == current_user.id).first()
+async def get_fitbit_status(current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    fitbit_connection = await db.scalar(select(FitbitConnection).where(FitbitConnection.user_id == current_user.id))
     
     if not fitbit_connection:
         return {
@@ -149,26 +157,28 @@ async def get_fitbit_status(current_user: User = Depends(get_current_user), db:
 
 # Optional: Add endpoint to disconnect Fitbit
 @router.delete("/me/fitbit-connection")
-async def disconnect_fitbit(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    fitbit_connection = db.query(FitbitConnection).filter(FitbitConnection.user_id == current_user.id).first()
+async def disconnect_fitbit(current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    fitbit_connection = await db.scalar(select(FitbitConnection).where(FitbitConnection.user_id == current_user.id))
     
     if not fitbit_connection:
         raise HTTPException(status_code=400, detail="Fitbit not connected")
     
-    db.delete(fitbit_connection)
-    db.commit()
+    await db.delete(fitbit_connection)
+    await db.commit()
+    # Stop background sync and backfill from calling Fitbit with the cached tokens
+    fitbit_token_manager.invalidate(current_user.id)
     
     return {"message": "Fitbit disconnected successfully"}
 
 @router.post("/create-demo-users")
-async def create_demo_users_endpoint(db: Session = Depends(get_db)):
+async def create_demo_users_endpoint():
     """
     Create demo users for testing
     """
     try:
         # Import and run the demo creation
         from demo_data import create_demo_users
-        create_demo_users()
+        await asyncio.to_thread(create_demo_users)
         return {"message": "Demo users created successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating demo users: {str(e)}")
\ No newline at end of file